@@ -0,0 +1,386 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+
+import psutil
+
+import SSniffer_capture
+import SSniffer_classifier
+import SSniffer_functions
+import SSniffer_index
+
+# Benchmark suite: generates synthetic captures with a known mix of flows, payload sizes and readable/encrypted
+# payloads, times SSniffer's hot paths on them and writes the results as JSON, so runs on different commits can be
+# compared (--compare old.json reports what got slower).
+#   python SSniffer_benchmark.py --scenario mixed --output results.json
+# Every benchmark runs once for its time and, unless --no-memory, once more under tracemalloc for its peak
+# Python allocation (tracing slows the code down too much to time it at the same run).
+# Startup is measured apart from the scenarios: each of STARTUP_MODULES is imported in a fresh interpreter under
+# -X importtime, and the result keeps the slowest imports it pulled in.
+
+RESULTS_VERSION = 1
+REGRESSION_THRESHOLD = 0.10  # A result this much slower than the baseline counts as a regression
+STARTUP_MODULES = ('SSniffer_functions', 'SSniffer_gui')  # The headless CLI and the GUI entry points
+STARTUP_RUNS = 3  # Fresh interpreters per module, the fastest counts (the first one may warm up the disk cache)
+
+Scenario = namedtuple('Scenario', ['packets', 'flows', 'payload_min', 'payload_max', 'readable_ratio', 'udp_ratio',
+                                   'seed'])
+SCENARIOS = {
+    'small': Scenario(5000, 100, 0, 1400, 0.5, 0.3, 1),
+    'mixed': Scenario(50000, 500, 0, 1400, 0.5, 0.3, 1),
+    'many_flows': Scenario(50000, 20000, 0, 200, 0.5, 0.3, 2),
+    'encrypted': Scenario(50000, 500, 200, 1400, 0.1, 0.3, 3),
+    'readable': Scenario(50000, 500, 20, 600, 0.9, 0.3, 4),
+}
+
+TEXT = (b"GET /index.html HTTP/1.1\r\nHost: example.com\r\nUser-Agent: SSniffer\r\nAccept: text/html\r\n\r\n"
+        b"<html><body>Hello, this is a plain readable page, nothing to hide here.</body></html>\r\n") * 16
+
+
+def _frame(src, dst, src_port, dst_port, payload, udp, seq=0):
+    if udp:
+        transport = struct.pack("!HHHH", src_port, dst_port, 8 + len(payload), 0) + payload
+        proto = 17
+    else:
+        transport = struct.pack("!HHIIBBHHH", src_port, dst_port, seq, 0, 5 << 4, 0x18, 65535, 0, 0) + payload
+        proto = 6
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(transport), 0, 0, 64, proto, 0, socket.inet_aton(src),
+                     socket.inet_aton(dst))
+    return b"\x02\x00\x00\x00\x00\x01\x02\x00\x00\x00\x00\x02\x08\x00" + ip + transport
+
+
+def generate_pcap(file_path, scenario):
+    # Same scenario, same file: everything comes from one seeded generator
+    rng = random.Random(scenario.seed)
+    flows = []
+    for number in range(scenario.flows):
+        src = f"10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}"
+        dst = f"192.168.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+        flows.append((src, dst, 1024 + rng.randrange(60000), rng.choice((80, 443, 53, 8080, 22)),
+                      rng.random() < scenario.udp_ratio))
+    # Every TCP flow's segments follow on from each other, so the reassembler sees streams rather than one segment
+    # retransmitted. The first sequence numbers don't come from rng, the payloads stay what they always were.
+    seqs = [number * 2654435761 % (1 << 32) for number in range(scenario.flows)]
+    writer = SSniffer_capture.PcapWriter(file_path)
+    timestamp = 1700000000.0
+    try:
+        for _ in range(scenario.packets):
+            number = rng.randrange(len(flows))
+            src, dst, src_port, dst_port, udp = flows[number]
+            size = rng.randint(scenario.payload_min, scenario.payload_max)
+            if rng.random() < scenario.readable_ratio:
+                start = rng.randrange(len(TEXT) - size) if size < len(TEXT) else 0
+                payload = TEXT[start:start + size]
+            else:
+                payload = rng.randbytes(size)
+            timestamp += rng.expovariate(10000)
+            writer.write(_frame(src, dst, src_port, dst_port, payload, udp, seqs[number]), timestamp)
+            seqs[number] = (seqs[number] + len(payload)) % (1 << 32)
+    finally:
+        writer.close()
+    return file_path
+
+
+def _decoded_packets(file_path):
+    return [packet for _, _, packet, _ in SSniffer_functions.load_from_pcap_file(file_path)]
+
+
+def _payloads(packets):
+    return [payload for payload in (SSniffer_functions.packet_payload(packet) for packet in packets if 'IP' in packet)
+            if payload is not None]
+
+
+def _remove_index(file_path):
+    try:
+        os.remove(SSniffer_index.index_path(file_path))
+    except FileNotFoundError:
+        pass
+
+
+# Each benchmark takes the capture path and returns (setup, work): setup prepares the input and isn't timed,
+# work(input) is timed and returns how many items it handled
+
+def bench_is_payload_readable(file_path):
+    # The per payload check on pyshark style hex strings
+    def setup():
+        return [payload.hex(":") for payload in _payloads(_decoded_packets(file_path))]
+
+    def work(payloads):
+        for payload in payloads:
+            SSniffer_functions.is_payload_readable(payload)
+        return len(payloads)
+    return setup, work
+
+
+def bench_classify_batch(file_path):
+    def setup():
+        return _payloads(_decoded_packets(file_path))
+
+    def work(payloads):
+        SSniffer_classifier.classify_batch(payloads)
+        return len(payloads)
+    return setup, work
+
+
+def bench_decode(file_path):
+    def work(_):
+        return sum(1 for _ in SSniffer_functions.load_from_pcap_file(file_path))
+    return (lambda: None), work
+
+
+def bench_convert_packet_format(file_path):
+    def work(packets):
+        SSniffer_functions.convert_packet_format(packets)
+        return len(packets)
+    return (lambda: _decoded_packets(file_path)), work
+
+
+def bench_sort_by_ip(file_path):
+    # sort_by_ip became the flow table's grouping index: the groups of every source address
+    def setup():
+        return SSniffer_functions.convert_packet_format(_decoded_packets(file_path))
+
+    def work(packet_details):
+        for group_by in ('src', 'host'):
+            packet_details.group(group_by)
+        return len(packet_details)
+    return setup, work
+
+
+def bench_load_packet_details(file_path):
+    def setup():
+        _remove_index(file_path)
+
+    def work(_):
+        packet_details = SSniffer_functions.load_packet_details(file_path)
+        return len(packet_details.packet_source)
+    return setup, work
+
+
+def bench_load_indexed(file_path):
+    # Reopening a capture that was loaded before
+    def setup():
+        _remove_index(file_path)
+        SSniffer_functions.load_packet_details(file_path)
+
+    def work(_):
+        packet_details = SSniffer_functions.load_packet_details(file_path)
+        return len(packet_details.packet_source)
+    return setup, work
+
+
+def bench_gui_summary(file_path):
+    # Builds the summary screen for the whole capture on an offscreen Qt platform
+    def setup():
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication
+        import SSniffer_gui
+        app = QApplication.instance() or QApplication([sys.argv[0]])
+        window = SSniffer_gui.SniffWindow()
+        packet_details = SSniffer_functions.stream_packet_details(file_path)
+        return app, window, packet_details
+
+    def work(inputs):
+        app, window, packet_details = inputs
+        window.display_loaded_packet_details(packet_details)
+        window.grab()  # Lays the screen out and paints it once
+        app.processEvents()
+        return len(packet_details)
+    return setup, work
+
+
+BENCHMARKS = {
+    'is_payload_readable': (bench_is_payload_readable, "payloads"),
+    'classify_batch': (bench_classify_batch, "payloads"),
+    'decode': (bench_decode, "packets"),
+    'convert_packet_format': (bench_convert_packet_format, "packets"),
+    'sort_by_ip': (bench_sort_by_ip, "flows"),
+    'load_packet_details': (bench_load_packet_details, "packets"),
+    'load_indexed': (bench_load_indexed, "packets"),
+    'gui_summary': (bench_gui_summary, "flows"),
+}
+
+
+def run_benchmark(name, scenario_name, file_path, memory=True):
+    make, unit = BENCHMARKS[name]
+    setup, work = make(file_path)
+    inputs = setup()
+    gc.collect()
+    start = time.perf_counter()
+    items = work(inputs)
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        inputs = setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            work(inputs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    del inputs
+    return {
+        'benchmark': name,
+        'scenario': scenario_name,
+        'unit': unit,
+        'items': items,
+        'seconds': seconds,
+        'items_per_second': items / seconds if seconds > 0 else None,
+        'peak_python_bytes': peak,
+        'rss_bytes': psutil.Process().memory_info().rss,
+    }
+
+
+def _import_times(module):
+    # [(depth, module, self seconds, cumulative seconds)] from one fresh interpreter's -X importtime report
+    report = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, timeout=120, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if report.returncode != 0:
+        raise RuntimeError(f"importing {module} failed: {report.stderr.strip().splitlines()[-1:]}")
+    imports = []
+    for line in report.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not own.strip().isdigit():
+            continue  # The column titles
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((depth, name.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return imports
+
+
+def run_startup(module, runs=STARTUP_RUNS, slowest=10):
+    best = None
+    for _ in range(runs):
+        # A module is reported after everything it imported, so its direct imports are the depth 1 lines since
+        # the previous top level one
+        children = []
+        for depth, name, _, cumulative in _import_times(module):
+            if depth == 1:
+                children.append((name, cumulative))
+            elif depth == 0:
+                if name == module and (best is None or cumulative < best[0]):
+                    best = (cumulative, children)
+                children = []
+    seconds, children = best
+    direct = sorted(children, key=lambda item: item[1], reverse=True)
+    return {
+        'benchmark': f"import {module}",
+        'scenario': 'startup',
+        'unit': "imports",
+        'items': 1,
+        'seconds': seconds,
+        'items_per_second': 1 / seconds if seconds > 0 else None,
+        'peak_python_bytes': None,
+        'rss_bytes': None,
+        'slowest_imports': direct[:slowest],
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': SSniffer_classifier.numpy_tables()[0] is not None,
+    }
+
+
+def run(scenarios, benchmarks, pcap_dir=None, memory=True, packets=None, startup=True):
+    temporary_dir = None
+    if pcap_dir is None:
+        pcap_dir = temporary_dir = tempfile.mkdtemp(prefix="ssniffer-bench-")
+    os.makedirs(pcap_dir, exist_ok=True)
+    results = {'version': RESULTS_VERSION, 'started': time.time(), 'environment': environment(),
+               'scenarios': {}, 'results': []}
+    try:
+        for module in STARTUP_MODULES if startup else ():
+            result = run_startup(module)
+            results['results'].append(result)
+            print(f"{'startup':>12} {result['benchmark']:<22} {1000 * result['seconds']:>11.1f} ms   slowest: "
+                  + ", ".join(f"{name} {1000 * seconds:.0f} ms" for name, seconds in result['slowest_imports'][:3]))
+        for scenario_name in scenarios:
+            scenario = SCENARIOS[scenario_name]
+            if packets is not None:
+                scenario = scenario._replace(packets=packets)
+            results['scenarios'][scenario_name] = scenario._asdict()
+            file_path = os.path.join(pcap_dir, f"{scenario_name}-{scenario.packets}-{scenario.seed}.pcap")
+            if not os.path.exists(file_path):
+                generate_pcap(file_path, scenario)
+            for name in benchmarks:
+                result = run_benchmark(name, scenario_name, file_path, memory)
+                results['results'].append(result)
+                peak = result['peak_python_bytes']
+                print(f"{scenario_name:>12} {name:<22} {result['items_per_second'] or 0:>14,.0f} {result['unit']}/s"
+                      + (f" {peak / (1024 * 1024):>9.1f} MB peak" if peak is not None else ""))
+    finally:
+        if temporary_dir is not None:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # Returns the (benchmark, scenario, ratio) of every result that got slower than the threshold allows
+    before = {(result['benchmark'], result['scenario']): result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        old = before.get((result['benchmark'], result['scenario']))
+        if not old or not old['items_per_second'] or not result['items_per_second']:
+            continue
+        ratio = result['items_per_second'] / old['items_per_second']
+        flag = "  REGRESSION" if ratio < 1 - threshold else ""
+        print(f"{result['scenario']:>12} {result['benchmark']:<22} {ratio:6.2f}x the baseline{flag}")
+        if flag:
+            regressions.append((result['benchmark'], result['scenario'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SSniffer benchmark suite")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="scenario to run, can be repeated (default: small)")
+    parser.add_argument('--benchmark', action='append', choices=list(BENCHMARKS),
+                        help="benchmark to run, can be repeated (default: all)")
+    parser.add_argument('--packets', type=int, help="override the number of packets of the scenarios")
+    parser.add_argument('--output', default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument('--compare', help="earlier results to compare with; exits with 1 on a regression")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown that counts as a regression (default: %(default)s)")
+    parser.add_argument('--pcap-dir', help="keep the generated captures here instead of a temporary directory")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc runs")
+    parser.add_argument('--no-startup', action='store_true', help="skip the -X importtime startup measurements")
+    args = parser.parse_args(argv)
+
+    results = run(args.scenario or ['small'], args.benchmark or list(BENCHMARKS), args.pcap_dir,
+                  not args.no_memory, args.packets, not args.no_startup)
+    with open(args.output, 'w', encoding='utf-8') as output_file:
+        json.dump(results, output_file, indent=1)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as baseline_file:
+            if compare(results, json.load(baseline_file), args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
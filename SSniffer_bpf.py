@@ -0,0 +1,303 @@
+import ctypes
+import ipaddress
+import re
+import socket
+import struct
+
+import SSniffer_capture
+
+# Capture filters in tcpdump syntax, compiled to classic BPF so the kernel (or libpcap) throws away unwanted
+# frames before Python ever sees them. libpcap's compiler is used when it is installed; otherwise a built-in
+# compiler handles the common subset for Ethernet frames:
+#   ip, ip6, arp, tcp, udp, icmp, [src|dst] host ADDR, [src|dst] net ADDR/LEN, [tcp|udp] [src|dst] port N,
+#   combined with and/&&, or/||, not/! and parentheses.
+
+SO_ATTACH_FILTER = 26
+
+# Classic BPF opcodes used by the built-in compiler
+LD_W_ABS = 0x20
+LD_H_ABS = 0x28
+LD_B_ABS = 0x30
+LD_H_IND = 0x48
+LDX_B_MSH = 0xb1
+ALU_AND_K = 0x54
+JMP_JEQ_K = 0x15
+JMP_JSET_K = 0x45
+RET_K = 0x06
+
+ETHERTYPE_IP = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPE_ARP = 0x0806
+PROTOCOL_NUMBERS = {'tcp': 6, 'udp': 17, 'icmp': 1}
+
+
+class FilterError(ValueError):
+    pass
+
+
+class _BpfInsn(ctypes.Structure):
+    _fields_ = [("code", ctypes.c_ushort), ("jt", ctypes.c_ubyte), ("jf", ctypes.c_ubyte), ("k", ctypes.c_uint32)]
+
+
+class _BpfProgram(ctypes.Structure):
+    _fields_ = [("bf_len", ctypes.c_uint), ("bf_insns", ctypes.POINTER(_BpfInsn))]
+
+
+def compile_filter(expression, linktype=SSniffer_capture.LINKTYPE_ETHERNET):
+    # Returns the program as a list of (code, jt, jf, k), or None for an empty expression
+    expression = (expression or "").strip()
+    if not expression:
+        return None
+    try:
+        lib = SSniffer_capture.load_libpcap()
+    except OSError:
+        lib = None
+    if lib is not None:
+        return _compile_with_libpcap(lib, expression, linktype)
+    if linktype != SSniffer_capture.LINKTYPE_ETHERNET:
+        raise FilterError("without libpcap capture filters only work on Ethernet interfaces")
+    return _Compiler(expression).compile()
+
+
+def _compile_with_libpcap(lib, expression, linktype):
+    lib.pcap_open_dead.restype = ctypes.c_void_p
+    lib.pcap_open_dead.argtypes = [ctypes.c_int, ctypes.c_int]
+    lib.pcap_compile.argtypes = [ctypes.c_void_p, ctypes.POINTER(_BpfProgram), ctypes.c_char_p, ctypes.c_int,
+                                 ctypes.c_uint32]
+    lib.pcap_geterr.restype = ctypes.c_char_p
+    lib.pcap_geterr.argtypes = [ctypes.c_void_p]
+    lib.pcap_freecode.argtypes = [ctypes.POINTER(_BpfProgram)]
+    lib.pcap_close.argtypes = [ctypes.c_void_p]
+
+    handle = lib.pcap_open_dead(linktype, SSniffer_capture.SNAPLEN)
+    program = _BpfProgram()
+    try:
+        if lib.pcap_compile(handle, ctypes.byref(program), expression.encode(), 1, 0xffffffff) != 0:
+            raise FilterError(lib.pcap_geterr(handle).decode(errors='replace'))
+        instructions = [(insn.code, insn.jt, insn.jf, insn.k) for insn in program.bf_insns[:program.bf_len]]
+        lib.pcap_freecode(ctypes.byref(program))
+        return instructions
+    finally:
+        lib.pcap_close(handle)
+
+
+def attach_filter(sock, program):
+    # SO_ATTACH_FILTER on a Linux packet socket; the kernel drops everything the program returns 0 for
+    data = b"".join(struct.pack("HBBI", *instruction) for instruction in program)
+    instructions = ctypes.create_string_buffer(data, len(data))
+    fprog = struct.pack("HP", len(program), ctypes.addressof(instructions))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def set_libpcap_filter(lib, handle, expression):
+    # Live libpcap handles compile and install the filter themselves, with the full tcpdump syntax
+    lib.pcap_compile.argtypes = [ctypes.c_void_p, ctypes.POINTER(_BpfProgram), ctypes.c_char_p, ctypes.c_int,
+                                 ctypes.c_uint32]
+    lib.pcap_setfilter.argtypes = [ctypes.c_void_p, ctypes.POINTER(_BpfProgram)]
+    lib.pcap_geterr.restype = ctypes.c_char_p
+    lib.pcap_geterr.argtypes = [ctypes.c_void_p]
+    lib.pcap_freecode.argtypes = [ctypes.POINTER(_BpfProgram)]
+    program = _BpfProgram()
+    if lib.pcap_compile(handle, ctypes.byref(program), expression.encode(), 1, 0xffffffff) != 0:
+        raise FilterError(lib.pcap_geterr(handle).decode(errors='replace'))
+    try:
+        if lib.pcap_setfilter(handle, ctypes.byref(program)) != 0:
+            raise FilterError(lib.pcap_geterr(handle).decode(errors='replace'))
+    finally:
+        lib.pcap_freecode(ctypes.byref(program))
+
+
+# Filter expressions are parsed into a tree of these, And/Or/Not over single comparisons
+class _Test:
+    def __init__(self, loads, jump, k):
+        self.loads = loads  # Instructions that leave the value to compare in A
+        self.jump = jump
+        self.k = k
+
+
+class _And:
+    def __init__(self, *parts):
+        self.parts = parts
+
+
+class _Or:
+    def __init__(self, *parts):
+        self.parts = parts
+
+
+class _Not:
+    def __init__(self, part):
+        self.part = part
+
+
+def _ethertype(value):
+    return _Test([(LD_H_ABS, 0, 0, 12)], JMP_JEQ_K, value)
+
+
+def _ip_protocol(number):
+    return _Or(_And(_ethertype(ETHERTYPE_IP), _Test([(LD_B_ABS, 0, 0, 23)], JMP_JEQ_K, number)),
+               _And(_ethertype(ETHERTYPE_IPV6), _Test([(LD_B_ABS, 0, 0, 20)], JMP_JEQ_K, number)))
+
+
+def _port(number, direction, protocols):
+    # IPv4 ports sit after a variable length header and only in the first fragment; IPv6 without extension headers
+    offsets = {'src': (0,), 'dst': (2,), None: (0, 2)}[direction]
+    ipv4_ports = _Or(*[_Test([(LDX_B_MSH, 0, 0, 14), (LD_H_IND, 0, 0, 14 + offset)], JMP_JEQ_K, number)
+                       for offset in offsets])
+    ipv6_ports = _Or(*[_Test([(LD_H_ABS, 0, 0, 54 + offset)], JMP_JEQ_K, number) for offset in offsets])
+    ipv4_protocols = _Or(*[_Test([(LD_B_ABS, 0, 0, 23)], JMP_JEQ_K, PROTOCOL_NUMBERS[name]) for name in protocols])
+    ipv6_protocols = _Or(*[_Test([(LD_B_ABS, 0, 0, 20)], JMP_JEQ_K, PROTOCOL_NUMBERS[name]) for name in protocols])
+    first_fragment = _Not(_Test([(LD_H_ABS, 0, 0, 20)], JMP_JSET_K, 0x1fff))
+    return _Or(_And(_ethertype(ETHERTYPE_IP), ipv4_protocols, first_fragment, ipv4_ports),
+               _And(_ethertype(ETHERTYPE_IPV6), ipv6_protocols, ipv6_ports))
+
+
+def _address(network, direction):
+    directions = {'src': ('src',), 'dst': ('dst',), None: ('src', 'dst')}[direction]
+    if network.version == 4:
+        offsets = {'src': 26, 'dst': 30}
+        mask = int(network.netmask)
+        tests = []
+        for name in directions:
+            loads = [(LD_W_ABS, 0, 0, offsets[name])]
+            if mask != 0xffffffff:
+                loads.append((ALU_AND_K, 0, 0, mask))
+            tests.append(_Test(loads, JMP_JEQ_K, int(network.network_address)))
+        return _And(_ethertype(ETHERTYPE_IP), _Or(*tests))
+    if network.prefixlen != 128:
+        raise FilterError("IPv6 networks need libpcap, only single IPv6 hosts are supported")
+    offsets = {'src': 22, 'dst': 38}
+    words = struct.unpack("!IIII", network.network_address.packed)
+    tests = [_And(*[_Test([(LD_W_ABS, 0, 0, offsets[name] + 4 * index)], JMP_JEQ_K, word)
+                    for index, word in enumerate(words)]) for name in directions]
+    return _And(_ethertype(ETHERTYPE_IPV6), _Or(*tests))
+
+
+class _Compiler:
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = re.findall(r"\(|\)|&&|\|\||!|[^\s()!]+", expression)
+        self.position = 0
+        self.code = []  # Instructions, jump targets are label numbers until they are resolved
+        self.labels = {}  # label -> index in self.code
+        self.label_count = 0
+
+    def compile(self):
+        tree = self._expression()
+        if self.position != len(self.tokens):
+            raise FilterError(f"unexpected '{self.tokens[self.position]}' in filter")
+        accept, reject = self._label(), self._label()
+        self._emit(tree, accept, reject)
+        self._place(accept)
+        self.code.append((RET_K, 0, 0, SSniffer_capture.SNAPLEN))
+        self._place(reject)
+        self.code.append((RET_K, 0, 0, 0))
+        return self._resolve()
+
+    # Parser
+    def _peek(self):
+        return self.tokens[self.position].lower() if self.position < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise FilterError(f"filter ends too early: {self.expression}")
+        self.position += 1
+        return token
+
+    def _expression(self):
+        parts = [self._term()]
+        while self._peek() in ('or', '||'):
+            self._next()
+            parts.append(self._term())
+        return parts[0] if len(parts) == 1 else _Or(*parts)
+
+    def _term(self):
+        parts = [self._factor()]
+        while self._peek() in ('and', '&&'):
+            self._next()
+            parts.append(self._factor())
+        return parts[0] if len(parts) == 1 else _And(*parts)
+
+    def _factor(self):
+        token = self._next()
+        if token in ('not', '!'):
+            return _Not(self._factor())
+        if token == '(':
+            tree = self._expression()
+            if self._next() != ')':
+                raise FilterError("missing ')' in filter")
+            return tree
+        return self._primitive(token)
+
+    def _primitive(self, token):
+        protocols = ('tcp', 'udp')
+        if token in protocols and self._peek() in ('src', 'dst', 'port'):
+            protocols = (token,)
+            token = self._next()
+        direction = None
+        if token in ('src', 'dst'):
+            direction = token
+            token = self._next()
+        if token == 'port':
+            value = self._next()
+            if not value.isdigit() or int(value) > 65535:
+                raise FilterError(f"bad port '{value}'")
+            return _port(int(value), direction, protocols)
+        if token in ('host', 'net'):
+            value = self._next()
+            try:
+                network = ipaddress.ip_network(value, strict=False) if token == 'net' else \
+                    ipaddress.ip_network(ipaddress.ip_address(value))
+            except ValueError:
+                raise FilterError(f"bad address '{value}' (host names need libpcap)")
+            return _address(network, direction)
+        if direction is not None:
+            raise FilterError(f"'{direction}' has to be followed by host, net or port")
+        if token == 'ip':
+            return _ethertype(ETHERTYPE_IP)
+        if token == 'ip6':
+            return _ethertype(ETHERTYPE_IPV6)
+        if token == 'arp':
+            return _ethertype(ETHERTYPE_ARP)
+        if token in PROTOCOL_NUMBERS:
+            return _ip_protocol(PROTOCOL_NUMBERS[token])
+        raise FilterError(f"'{token}' is not supported without libpcap")
+
+    # Code generation: every node jumps to its true or false label
+    def _label(self):
+        self.label_count += 1
+        return self.label_count
+
+    def _place(self, label):
+        self.labels[label] = len(self.code)
+
+    def _emit(self, node, if_true, if_false):
+        if isinstance(node, _Test):
+            self.code.extend(node.loads)
+            self.code.append((node.jump, if_true, if_false, node.k))
+        elif isinstance(node, _Not):
+            self._emit(node.part, if_false, if_true)
+        elif isinstance(node, _And):
+            for part in node.parts[:-1]:
+                next_part = self._label()
+                self._emit(part, next_part, if_false)
+                self._place(next_part)
+            self._emit(node.parts[-1], if_true, if_false)
+        else:
+            for part in node.parts[:-1]:
+                next_part = self._label()
+                self._emit(part, if_true, next_part)
+                self._place(next_part)
+            self._emit(node.parts[-1], if_true, if_false)
+
+    def _resolve(self):
+        program = []
+        for index, (code, jt, jf, k) in enumerate(self.code):
+            if code in (JMP_JEQ_K, JMP_JSET_K):
+                jt = self.labels[jt] - index - 1
+                jf = self.labels[jf] - index - 1
+                if jt > 255 or jf > 255:
+                    raise FilterError("filter is too long, install libpcap for bigger filters")
+            program.append((code, jt, jf, k))
+        return program
@@ -0,0 +1,569 @@
+import ctypes
+import ctypes.util
+import os
+import socket
+import struct
+import sys
+import time
+
+# Native capture engine: reads raw frames straight from the kernel (AF_PACKET on Linux, libpcap/Npcap elsewhere)
+# and decodes only the Ethernet/IPv4/IPv6/TCP/UDP headers and the payload slice SSniffer actually uses.
+# The packets it produces answer the same questions as pyshark packets ('IP' in packet, packet.ip.src,
+# packet.tcp.payload, ...) so the rest of the program does not care which engine captured them.
+
+ETH_P_ALL = 0x0003
+PACKET_OUTGOING = 4
+ARPHRD_ETHER = 1
+ARPHRD_LOOPBACK = 772  # Linux gives loopback frames an all zero Ethernet header
+SIOCGIFHWADDR = 0x8927
+SNAPLEN = 262144
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+PCAP_MAGIC = 0xa1b2c3d4
+PCAP_MAGIC_NANO = 0xa1b23c4d
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_INTERFACE_DESCRIPTION = 0x00000001
+PCAPNG_PACKET = 0x00000002
+PCAPNG_SIMPLE_PACKET = 0x00000003
+PCAPNG_ENHANCED_PACKET = 0x00000006
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+IPV6_FRAGMENT_HEADER = 44
+
+PCAP_GLOBAL_HEADER = struct.Struct("<IHHiIII")
+PCAP_RECORD_HEADER = struct.Struct("<IIII")
+
+
+class RawLayer:
+    __slots__ = ('layer_name', 'fields', 'payload_bytes')
+
+    def __init__(self, layer_name, fields, payload_bytes=b""):
+        self.layer_name = layer_name
+        self.fields = fields
+        self.payload_bytes = payload_bytes
+
+    def __getattr__(self, item):
+        if item == 'payload':
+            # pyshark only has a payload field when there is one, and shows it as colon separated hex
+            if self.payload_bytes:
+                return self.payload_bytes.hex(":")
+            raise AttributeError(item)
+        try:
+            return self.fields[item]
+        except KeyError:
+            raise AttributeError(item) from None
+
+    def __repr__(self):
+        return f"<{self.layer_name.upper()} Layer>"
+
+
+class RawPacket:
+    __slots__ = ('layers', 'number', 'length', 'sniff_timestamp', 'interface_captured', 'file_offset')
+
+    def __init__(self, layers, number, length, sniff_timestamp, interface_captured=None):
+        self.layers = layers
+        self.number = number
+        self.length = length
+        self.sniff_timestamp = sniff_timestamp
+        self.interface_captured = interface_captured
+        self.file_offset = None  # Where the capture wrote the packet, when it was written by SSniffer itself
+
+    def __getitem__(self, item):
+        if isinstance(item, int):
+            return self.layers[item]
+        item = item.lower()
+        for layer in self.layers:
+            if layer.layer_name == item:
+                return layer
+        raise KeyError('Layer does not exist in packet')
+
+    def __contains__(self, item):
+        item = item.lower()
+        return any(layer.layer_name == item for layer in self.layers)
+
+    def __getattr__(self, item):
+        # Allows layers to be retrieved like in pyshark, for instance packet.ip
+        item = item.lower()
+        for layer in object.__getattribute__(self, 'layers'):
+            if layer.layer_name == item:
+                return layer
+        raise AttributeError(f"No attribute named {item}")
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def transport_layer(self):
+        for layer in self.layers:
+            if layer.layer_name in ('tcp', 'udp'):
+                return layer.layer_name.upper()
+        return None
+
+    @property
+    def highest_layer(self):
+        last = self.layers[-1]
+        if last.layer_name in ('tcp', 'udp') and last.payload_bytes:
+            return 'DATA'
+        return last.layer_name.upper()
+
+    def __repr__(self):
+        return f"<{self.highest_layer} Packet>"
+
+
+def _link_header(frame, linktype):
+    # Returns (ethertype, offset of the network header) for the link layers we know
+    if linktype == LINKTYPE_ETHERNET:
+        if len(frame) < 14:
+            return None, 0
+        ethertype, offset = struct.unpack_from("!H", frame, 12)[0], 14
+        while ethertype in ETHERTYPE_VLAN and len(frame) >= offset + 4:
+            ethertype = struct.unpack_from("!H", frame, offset + 2)[0]
+            offset += 4
+        return ethertype, offset
+    if linktype == LINKTYPE_LINUX_SLL:
+        return (struct.unpack_from("!H", frame, 14)[0], 16) if len(frame) >= 16 else (None, 0)
+    if linktype == LINKTYPE_NULL:
+        if len(frame) < 4:
+            return None, 0
+        family = struct.unpack_from("=I", frame, 0)[0]
+        return (ETHERTYPE_IPV4 if family == socket.AF_INET else ETHERTYPE_IPV6), 4
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6) and frame:
+        return (ETHERTYPE_IPV4 if frame[0] >> 4 == 4 else ETHERTYPE_IPV6), 0
+    return None, 0
+
+
+def decode_frame(frame, timestamp=None, number=None, length=None, interface=None, linktype=LINKTYPE_ETHERNET):
+    # Decode a captured frame into a RawPacket; anything we can't understand keeps only the layers we got to
+    if timestamp is None:
+        timestamp = time.time()
+    if length is None:
+        length = len(frame)
+    layers = []
+    packet = RawPacket(layers, number, length, timestamp, interface)
+
+    ethertype, offset = _link_header(frame, linktype)
+    if ethertype is None:
+        return packet
+    layers.append(RawLayer('eth' if linktype == LINKTYPE_ETHERNET else 'sll', {'type': ethertype}))
+
+    if ethertype == ETHERTYPE_IPV4:
+        if len(frame) < offset + 20:
+            return packet
+        version_ihl, total_length, flags_fragment, proto = (frame[offset], struct.unpack_from("!H", frame, offset + 2)[0],
+                                                            struct.unpack_from("!H", frame, offset + 6)[0],
+                                                            frame[offset + 9])
+        header_length = (version_ihl & 0x0F) * 4
+        layers.append(RawLayer('ip', {
+            'src': socket.inet_ntoa(frame[offset + 12:offset + 16]),
+            'dst': socket.inet_ntoa(frame[offset + 12 + 4:offset + 20]),
+            'proto': proto,
+            'len': total_length,
+        }))
+        # Only the first fragment carries the transport header
+        if flags_fragment & 0x1FFF:
+            return packet
+        # The IP total length tells us where Ethernet padding starts
+        end = min(len(frame), offset + total_length) if total_length else len(frame)
+        offset += header_length
+    elif ethertype == ETHERTYPE_IPV6:
+        if len(frame) < offset + 40:
+            return packet
+        payload_length = struct.unpack_from("!H", frame, offset + 4)[0]
+        proto = frame[offset + 6]
+        layers.append(RawLayer('ipv6', {
+            'src': socket.inet_ntop(socket.AF_INET6, frame[offset + 8:offset + 24]),
+            'dst': socket.inet_ntop(socket.AF_INET6, frame[offset + 24:offset + 40]),
+            'nxt': proto,
+            'plen': payload_length,
+        }))
+        end = min(len(frame), offset + 40 + payload_length) if payload_length else len(frame)
+        offset += 40
+        # Walk past the extension headers we know how to skip
+        while proto in IPV6_EXTENSION_HEADERS or proto == IPV6_FRAGMENT_HEADER:
+            if end < offset + 8:
+                return packet
+            if proto == IPV6_FRAGMENT_HEADER:
+                if struct.unpack_from("!H", frame, offset + 2)[0] & 0xFFF8:
+                    return packet
+                proto = frame[offset]
+                offset += 8
+            else:
+                proto, ext_length = frame[offset], frame[offset + 1]
+                offset += (ext_length + 1) * 8
+    else:
+        return packet
+
+    if proto == IPPROTO_TCP and end >= offset + 20:
+        src_port, dst_port, seq, ack, data_offset, flags = struct.unpack_from("!HHIIBB", frame, offset)
+        payload_start = offset + (data_offset >> 4) * 4
+        layers.append(RawLayer('tcp', {
+            'srcport': src_port,
+            'dstport': dst_port,
+            'seq_raw': seq,
+            'ack_raw': ack,
+            'flags': f"0x{flags:04x}",
+        }, bytes(frame[payload_start:end])))
+    elif proto == IPPROTO_UDP and end >= offset + 8:
+        src_port, dst_port, udp_length = struct.unpack_from("!HHH", frame, offset)
+        layers.append(RawLayer('udp', {
+            'srcport': src_port,
+            'dstport': dst_port,
+            'length': udp_length,
+        }, bytes(frame[offset + 8:end])))
+    return packet
+
+
+class PcapWriter:
+    # Writes classic libpcap files, the same format tshark produces with "-F pcap"
+    def __init__(self, file_path, linktype=LINKTYPE_ETHERNET, snaplen=SNAPLEN):
+        self.file_path = file_path
+        self.linktype = linktype
+        self.file = open(file_path, 'wb')
+        self.file.write(PCAP_GLOBAL_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, snaplen, linktype))
+        self.packet_count = 0
+        self.flush_interval = 1.0  # Seconds, so packets dropped from memory can be read back from disk soon
+        self.last_flush = time.monotonic()
+
+    def write(self, frame, timestamp, original_length=None):
+        # Returns the byte offset of the record so callers can find the packet again later
+        offset = self.file.tell()
+        seconds = int(timestamp)
+        microseconds = int((timestamp - seconds) * 1000000)
+        if original_length is None:
+            original_length = len(frame)
+        self.file.write(PCAP_RECORD_HEADER.pack(seconds, microseconds, len(frame), original_length))
+        self.file.write(frame)
+        self.packet_count += 1
+        if time.monotonic() - self.last_flush > self.flush_interval:
+            self.flush()
+        return offset
+
+    def flush(self):
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class PcapReader:
+    # Reads classic pcap and pcapng files record by record. Records are addressed by their byte offset, which
+    # is what lets SSniffer drop packets from memory and decode them again from disk when they are needed.
+    def __init__(self, file_path, file=None):
+        # file: an already open binary file to read instead of opening file_path
+        self.file_path = file_path
+        self.file = file if file is not None else open(file_path, 'rb')
+        self.linktypes = []
+        self.tsresol = []
+        self.endian = "<"
+        self.pcapng = False
+        self.data_start = self._read_header()
+
+    def _read_header(self):
+        header = self.file.read(24)
+        if len(header) < 24:
+            raise ValueError(f"{self.file_path} is not a pcap file (too short)")
+        magic_le = struct.unpack_from("<I", header)[0]
+        magic_be = struct.unpack_from(">I", header)[0]
+        if magic_le == PCAPNG_SECTION_HEADER:
+            self.pcapng = True
+            # Read the section and interface headers up front so any packet block can be decoded on its own
+            first = self.read_record(0)
+            return first[0] if first else 0
+        for endian, magic in (("<", magic_le), (">", magic_be)):
+            if magic in (PCAP_MAGIC, PCAP_MAGIC_NANO):
+                self.endian = endian
+                self.linktypes = [struct.unpack_from(endian + "I", header, 20)[0] & 0x0FFFFFFF]
+                self.tsresol = [1e-9 if magic == PCAP_MAGIC_NANO else 1e-6]
+                return 24
+        raise ValueError(f"{self.file_path} is not a pcap or pcapng file")
+
+    @property
+    def linktype(self):
+        return self.linktypes[0] if self.linktypes else LINKTYPE_ETHERNET
+
+    def size(self):
+        return os.fstat(self.file.fileno()).st_size
+
+    def read_record(self, offset):
+        # Returns (record offset, timestamp, frame, original length, linktype, next offset), or None at the end
+        # of the file (or when the writer hasn't finished the record yet). In pcapng files header blocks are
+        # skipped, so the record offset can be past the one asked for.
+        while True:
+            self.file.seek(offset)
+            if not self.pcapng:
+                header = self.file.read(16)
+                if len(header) < 16:
+                    return None
+                seconds, fraction, caplen, original_length = struct.unpack(self.endian + "IIII", header)
+                frame = self.file.read(caplen)
+                if len(frame) < caplen:
+                    return None
+                return (offset, seconds + fraction * self.tsresol[0], frame, original_length, self.linktypes[0],
+                        offset + 16 + caplen)
+
+            header = self.file.read(8)
+            if len(header) < 8:
+                return None
+            block_type, block_length = struct.unpack(self.endian + "II", header)
+            if block_type == PCAPNG_SECTION_HEADER:
+                # The byte order magic right after the header decides how the rest of the section is read
+                magic = self.file.read(4)
+                if len(magic) < 4:
+                    return None
+                self.endian = "<" if struct.unpack("<I", magic)[0] == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                block_length = struct.unpack(self.endian + "I", header[4:])[0]
+                self.linktypes = []
+                self.tsresol = []
+                offset += block_length
+                continue
+            body = self.file.read(block_length - 8)
+            if block_length < 12 or len(body) < block_length - 8:
+                return None
+            next_offset = offset + block_length
+            if block_type == PCAPNG_INTERFACE_DESCRIPTION:
+                self.linktypes.append(struct.unpack_from(self.endian + "H", body, 0)[0])
+                self.tsresol.append(self._interface_tsresol(body[8:-4]))
+            elif block_type in (PCAPNG_ENHANCED_PACKET, PCAPNG_PACKET):
+                if block_type == PCAPNG_ENHANCED_PACKET:
+                    interface_id, ts_high, ts_low, caplen, original_length = struct.unpack_from(self.endian + "IIIII",
+                                                                                                body, 0)
+                else:
+                    interface_id, _, ts_high, ts_low, caplen, original_length = struct.unpack_from(
+                        self.endian + "HHIIII", body, 0)
+                resolution = self.tsresol[interface_id] if interface_id < len(self.tsresol) else 1e-6
+                linktype = self.linktypes[interface_id] if interface_id < len(self.linktypes) else LINKTYPE_ETHERNET
+                frame = body[20:20 + caplen]
+                return offset, (ts_high << 32 | ts_low) * resolution, frame, original_length, linktype, next_offset
+            elif block_type == PCAPNG_SIMPLE_PACKET:
+                original_length = struct.unpack_from(self.endian + "I", body, 0)[0]
+                frame = body[4:4 + min(original_length, len(body) - 8)]
+                return offset, 0.0, frame, original_length, self.linktype, next_offset
+            offset = next_offset
+
+    def _interface_tsresol(self, options):
+        position = 0
+        while position + 4 <= len(options):
+            code, length = struct.unpack_from(self.endian + "HH", options, position)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                value = options[position + 4]
+                return 2 ** -(value & 0x7F) if value & 0x80 else 10 ** -value
+            position += 4 + (length + 3) // 4 * 4
+        return 1e-6
+
+    def read_packet(self, offset, number=None):
+        record = self.read_record(offset)
+        if record is None:
+            return None
+        _, timestamp, frame, original_length, linktype, _ = record
+        return decode_frame(frame, timestamp, number, original_length, linktype=linktype)
+
+    def records(self, offset=None):
+        # Yields (offset, timestamp, frame, original length, linktype) for every record from offset onwards
+        offset = self.data_start if offset is None else offset
+        while True:
+            record = self.read_record(offset)
+            if record is None:
+                return
+            yield record[:5]
+            offset = record[5]
+
+    def record_offsets(self, offset=None):
+        # Like records() but only reads record headers, for splitting a file up without decoding it
+        offset = self.data_start if offset is None else offset
+        file_size = self.size()
+        while True:
+            self.file.seek(offset)
+            if not self.pcapng:
+                header = self.file.read(16)
+                if len(header) < 16:
+                    return
+                next_offset = offset + 16 + struct.unpack_from(self.endian + "I", header, 8)[0]
+            else:
+                header = self.file.read(8)
+                if len(header) < 8:
+                    return
+                block_type, block_length = struct.unpack(self.endian + "II", header)
+                if block_type not in (PCAPNG_ENHANCED_PACKET, PCAPNG_PACKET, PCAPNG_SIMPLE_PACKET):
+                    # Section and interface headers change how packets are read, let read_record handle them
+                    record = self.read_record(offset)
+                    if record is None:
+                        return
+                    offset, next_offset = record[0], record[5]
+                else:
+                    next_offset = offset + block_length
+            if next_offset > file_size:
+                return
+            yield offset
+            offset = next_offset
+
+    def close(self):
+        self.file.close()
+
+
+class AfPacketSource:
+    # Linux only: one raw socket bound to the interface, receiving every frame in both directions (or only the
+    # ones the BPF filter lets through, the kernel drops the rest)
+    def __init__(self, interface, timeout=0.5, bpf_filter=None):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        # Frames are written as LINKTYPE_ETHERNET and the filter is compiled for Ethernet offsets, so anything else
+        # (tun/VPN, PPP, IP-only interfaces) is refused like LibpcapSource does. Checked before binding, no frame
+        # of the wrong kind is ever queued.
+        try:
+            hardware_type = self.hardware_type(interface)
+        except OSError:
+            self.close()
+            raise
+        if hardware_type not in (ARPHRD_ETHER, ARPHRD_LOOPBACK):
+            self.close()
+            raise OSError(f"Interface {interface} is not an Ethernet interface")
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        if bpf_filter:
+            import SSniffer_bpf
+            SSniffer_bpf.attach_filter(self.sock, SSniffer_bpf.compile_filter(bpf_filter))
+        self.sock.bind((interface, 0))
+        self.sock.settimeout(timeout)
+
+    def next_frame(self):
+        try:
+            frame, address = self.sock.recvfrom(SNAPLEN)
+        except socket.timeout:
+            return None
+        # On loopback every packet is seen twice, once going out and once coming in (libpcap drops the same copy)
+        if address[2] == PACKET_OUTGOING and address[3] == ARPHRD_LOOPBACK:
+            return None
+        return frame, time.time(), len(frame)
+
+    def hardware_type(self, interface):
+        # ARPHRD_* of the interface: the family of the hardware address in the ifreq SIOCGIFHWADDR fills in
+        import fcntl
+        request = struct.pack("16s16s", interface.encode()[:15], b"")
+        return struct.unpack_from("H", fcntl.ioctl(self.sock.fileno(), SIOCGIFHWADDR, request), 16)[0]
+
+    def close(self):
+        self.sock.close()
+
+
+class _Timeval(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_usec", ctypes.c_long)]
+
+
+class _PcapPkthdr(ctypes.Structure):
+    _fields_ = [("ts", _Timeval), ("caplen", ctypes.c_uint32), ("len", ctypes.c_uint32)]
+
+
+def load_libpcap():
+    # Npcap installs wpcap.dll on Windows, everywhere else it is libpcap
+    for name in ('pcap', 'wpcap'):
+        path = ctypes.util.find_library(name)
+        if path:
+            lib = ctypes.CDLL(path)
+            lib.pcap_open_live.restype = ctypes.c_void_p
+            lib.pcap_open_live.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                           ctypes.c_char_p]
+            lib.pcap_next_ex.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.POINTER(_PcapPkthdr)),
+                                         ctypes.POINTER(ctypes.POINTER(ctypes.c_ubyte))]
+            lib.pcap_datalink.argtypes = [ctypes.c_void_p]
+            lib.pcap_close.argtypes = [ctypes.c_void_p]
+            return lib
+    raise OSError("libpcap (or Npcap on Windows) was not found")
+
+
+class LibpcapSource:
+    def __init__(self, interface, timeout=0.5, bpf_filter=None):
+        self.lib = load_libpcap()
+        errbuf = ctypes.create_string_buffer(256)
+        self.handle = self.lib.pcap_open_live(interface.encode(), SNAPLEN, 1, int(timeout * 1000), errbuf)
+        if not self.handle:
+            raise OSError(f"pcap_open_live failed: {errbuf.value.decode(errors='replace')}")
+        if self.lib.pcap_datalink(self.handle) != LINKTYPE_ETHERNET:
+            self.close()
+            raise OSError(f"Interface {interface} is not an Ethernet interface")
+        if bpf_filter:
+            import SSniffer_bpf
+            try:
+                SSniffer_bpf.set_libpcap_filter(self.lib, self.handle, bpf_filter)
+            except SSniffer_bpf.FilterError:
+                self.close()
+                raise
+
+    def next_frame(self):
+        header = ctypes.POINTER(_PcapPkthdr)()
+        data = ctypes.POINTER(ctypes.c_ubyte)()
+        result = self.lib.pcap_next_ex(self.handle, ctypes.byref(header), ctypes.byref(data))
+        if result == 0:
+            return None
+        if result < 0:
+            raise OSError("pcap_next_ex failed")
+        header = header.contents
+        frame = ctypes.string_at(data, header.caplen)
+        return frame, header.ts.tv_sec + header.ts.tv_usec / 1000000, header.len
+
+    def close(self):
+        if self.handle:
+            self.lib.pcap_close(self.handle)
+            self.handle = None
+
+
+def open_frame_source(interface, bpf_filter=None):
+    if sys.platform.startswith('linux'):
+        return AfPacketSource(interface, bpf_filter=bpf_filter)
+    return LibpcapSource(interface, bpf_filter=bpf_filter)
+
+
+class RawCapture:
+    # Drop-in replacement for pyshark.LiveCapture for the parts SSniffer uses
+    def __init__(self, interface, output_file=None, bpf_filter=None, rotation=None, stop_event=None):
+        # rotation: an SSniffer_segments.Rotation to write output_file as a ring of segments (output_file is then
+        # the ring's catalog). stop_event ends sniffing even while no packets arrive.
+        self.interface = interface
+        self.output_file = output_file
+        self.bpf_filter = bpf_filter
+        self.rotation = rotation
+        self.stop_event = stop_event
+
+    def _open_writer(self):
+        if not self.output_file:
+            return None
+        if self.rotation is not None:
+            import SSniffer_segments
+            return SSniffer_segments.SegmentedPcapWriter(self.output_file, self.rotation)
+        return PcapWriter(self.output_file)
+
+    def sniff_continuously(self, packet_count=None):
+        source = open_frame_source(self.interface, self.bpf_filter)
+        writer = self._open_writer()
+        number = 0
+        try:
+            while packet_count is None or number < packet_count:
+                result = source.next_frame()
+                if result is None:
+                    if self.stop_event is not None and self.stop_event.is_set():
+                        return
+                    continue
+                frame, timestamp, original_length = result
+                number += 1
+                offset = writer.write(frame, timestamp, original_length) if writer else None
+                packet = decode_frame(frame, timestamp, number, original_length, self.interface)
+                packet.file_offset = offset
+                yield packet
+        finally:
+            source.close()
+            if writer:
+                writer.close()
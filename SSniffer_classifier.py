@@ -0,0 +1,180 @@
+import math
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+
+# Decides whether a payload is readable text, encrypted or some other (e.g. compressed) binary data.
+# Works on raw payload bytes through a byte lookup table instead of decoding hex strings and running a regex
+# over every character, and can score whole batches at once with NumPy when it is installed.
+
+READABLE_THRESHOLD = 0.7  # Same threshold is_payload_readable always used
+# Binary payloads whose entropy is at least this share of what random bytes of the same length would have look
+# encrypted (well compressed data looks the same), anything lower is structured binary
+ENCRYPTED_ENTROPY_RATIO = 0.95
+MIN_ENTROPY_SAMPLE = 16  # Shorter payloads can't be told apart from random, so they count as encrypted
+
+LEGACY_READABLE_PATTERN = r'[a-zA-Z0-9\s,.!?;:]'
+
+# Build the table from the old regex so both give exactly the same verdicts. Bytes above 0x7F were decoded
+# to U+FFFD by hex_to_ascii, which the regex never matched, so they are never readable.
+READABLE_BYTES = bytes(b for b in range(128) if re.match(LEGACY_READABLE_PATTERN, chr(b)))
+NOT_READABLE_BYTES = bytes(b for b in range(256) if b not in READABLE_BYTES)
+
+
+@lru_cache(maxsize=None)
+def numpy_tables():
+    # (numpy, readable table) or (None, None) without NumPy; loaded by the first batch, not on import
+    try:
+        import numpy as np
+    except ImportError:
+        return None, None
+    readable_table = np.zeros(256, dtype=np.int64)
+    readable_table[list(READABLE_BYTES)] = 1
+    return np, readable_table
+
+
+READABLE = "readable"
+ENCRYPTED = "encrypted"
+BINARY = "binary"
+
+
+def readable_ratio(payload):
+    if not payload:
+        return 0.0
+    return len(payload.translate(None, NOT_READABLE_BYTES)) / len(payload)
+
+
+def is_readable(payload):
+    return readable_ratio(payload) > READABLE_THRESHOLD
+
+
+def shannon_entropy(payload):
+    # Bits per byte, between 0 and 8
+    if not payload:
+        return 0.0
+    length = len(payload)
+    entropy = 0.0
+    for count in Counter(payload).values():
+        p = count / length
+        entropy -= p * math.log2(p)
+    return entropy
+
+
+@lru_cache(maxsize=4096)
+def random_entropy(length):
+    # Expected entropy of `length` random bytes. Short samples can't reach 8 bits, so the encrypted verdict
+    # compares against this instead of a fixed number
+    if length <= 0:
+        return 0.0
+    if length >= 4096:
+        return 8.0 - 255 / (2 * length * math.log(2))
+    # Every byte value appears Binomial(length, 1/256) times
+    p = 1 / 256
+    entropy = 0.0
+    for k in range(1, min(length, int(length * p + 12 * math.sqrt(length * p) + 20)) + 1):
+        log_pmf = (math.lgamma(length + 1) - math.lgamma(k + 1) - math.lgamma(length - k + 1)
+                   + k * math.log(p) + (length - k) * math.log1p(-p))
+        entropy -= 256 * math.exp(log_pmf) * (k / length) * math.log2(k / length)
+    return entropy
+
+
+def payload_kind(ratio, entropy, length):
+    if ratio > READABLE_THRESHOLD:
+        return READABLE
+    if length < MIN_ENTROPY_SAMPLE or entropy >= ENCRYPTED_ENTROPY_RATIO * random_entropy(length):
+        return ENCRYPTED
+    return BINARY
+
+
+def classify(payload):
+    # Returns (kind, readable ratio, entropy) for one payload
+    ratio = readable_ratio(payload)
+    entropy = shannon_entropy(payload)
+    return payload_kind(ratio, entropy, len(payload)), ratio, entropy
+
+
+def classify_batch(payloads):
+    # Same as calling classify on each payload, but with NumPy the whole batch is scored in a few vector operations
+    payloads = list(payloads)
+    np, readable_table = numpy_tables() if payloads else (None, None)
+    if np is None:
+        return [classify(payload) for payload in payloads]
+
+    lengths = np.fromiter((len(payload) for payload in payloads), dtype=np.int64, count=len(payloads))
+    data = np.frombuffer(b"".join(payloads), dtype=np.uint8)
+    owners = np.repeat(np.arange(len(payloads)), lengths)
+
+    readable_counts = np.bincount(owners, weights=readable_table[data], minlength=len(payloads))
+    histograms = np.bincount(owners * 256 + data, minlength=len(payloads) * 256).reshape(len(payloads), 256)
+
+    safe_lengths = np.maximum(lengths, 1)
+    probabilities = histograms / safe_lengths[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropies = -np.where(histograms > 0, probabilities * np.log2(probabilities), 0.0).sum(axis=1)
+    ratios = readable_counts / safe_lengths
+
+    results = []
+    for ratio, entropy, length in zip(ratios.tolist(), entropies.tolist(), lengths.tolist()):
+        results.append((payload_kind(ratio, entropy, length), ratio, entropy))
+    return results
+
+
+def _legacy_is_payload_readable(payload):
+    # The hex -> ASCII -> regex check is_payload_readable used before this module, kept for the benchmark
+    try:
+        ascii_payload = bytes.fromhex(payload.replace(":", "")).decode("ascii", errors="replace")
+        readable_text_ratio = len(re.findall(LEGACY_READABLE_PATTERN, ascii_payload)) / len(ascii_payload)
+        return readable_text_ratio > READABLE_THRESHOLD
+    except Exception:
+        return False
+
+
+def benchmark(count=20000, seed=1):
+    import os
+    import random
+    import zlib
+
+    rng = random.Random(seed)
+    text = b"GET /index.html HTTP/1.1\r\nHost: example.com\r\nUser-Agent: SSniffer\r\n\r\n" * 20
+    payloads = []
+    for i in range(count):
+        size = rng.randint(1, 1400)
+        kind = i % 3
+        if kind == 0:
+            start = rng.randint(0, len(text) - 1)
+            payloads.append(text[start:start + size])
+        elif kind == 1:
+            payloads.append(os.urandom(size))
+        else:
+            payloads.append(zlib.compress(text[:size]))
+    hex_payloads = [payload.hex(":") for payload in payloads]
+
+    start = time.perf_counter()
+    legacy = [_legacy_is_payload_readable(payload) for payload in hex_payloads]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [is_readable(payload) for payload in payloads]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scored = [classify(payload) for payload in payloads]
+    scored_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = classify_batch(payloads)
+    batch_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b, (c, _, _), (d, _, _) in zip(legacy, single, scored, batch)
+                     if not a == b == (c == READABLE) == (d == READABLE))
+    print(f"{count} payloads, {mismatches} verdicts differ from the regex classifier")
+    print(f"regex on hex strings: {count / legacy_time:,.0f} payloads/s")
+    print(f"lookup table:         {count / single_time:,.0f} payloads/s")
+    print(f"with entropy:         {count / scored_time:,.0f} payloads/s")
+    print(f"batched{' (numpy)' if numpy_tables()[0] is not None else ''}:      {count / batch_time:,.0f} payloads/s (with entropy)")
+    return mismatches
+
+
+if __name__ == '__main__':
+    benchmark()
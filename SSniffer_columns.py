@@ -0,0 +1,255 @@
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import zipfile
+from array import array
+
+# Columnar export of packet headers and flow summaries for offline analysis. Every column is its own NumPy .npy
+# file in a directory (<capture>.columns), appended to a chunk at a time while the capture or load runs, so
+# millions of rows cost one chunk of memory. The .npy headers always hold the current row count, so the files can
+# be opened at any time with numpy.load (or load_columns below), in one read or memory mapped.
+# Writing needs nothing but the standard library; reading the columns back needs NumPy.
+
+COLUMNS_SUFFIX = ".columns"
+CHUNK_ROWS = 65536  # Rows kept in memory per column before they are appended to the files
+NPY_HEADER_SIZE = 128  # Fixed, so the row count can be rewritten in place
+
+# (name, array typecode, NumPy dtype). Addresses are 16 bytes: IPv6 as is, IPv4 in the first 4 bytes.
+PACKET_COLUMNS = (
+    ('position', 'Q', '<u8'),  # Packet number in the capture, starting at 0
+    ('timestamp', 'd', '<f8'),
+    ('family', 'B', '|u1'),  # 4 or 6
+    ('src', None, '|S16'),
+    ('dst', None, '|S16'),
+    ('src_port', 'H', '<u2'),
+    ('dst_port', 'H', '<u2'),
+    ('proto', 'B', '|u1'),  # IP protocol number
+    ('length', 'I', '<u4'),
+    ('readable', 'B', '|u1'),
+    ('entropy', 'f', '<f4'),  # Shannon entropy of the payload in bits per byte
+    ('flow', 'I', '<u4'),  # Row in the flows table
+    ('interface', 'H', '<u2'),  # Index into the interfaces list of columns.json
+)
+FLOW_COLUMNS = (
+    ('flow', 'I', '<u4'),
+    ('family', 'B', '|u1'),
+    ('src', None, '|S16'),
+    ('dst', None, '|S16'),
+    ('src_port', 'H', '<u2'),
+    ('dst_port', 'H', '<u2'),
+    ('proto', 'B', '|u1'),
+    ('packets', 'Q', '<u8'),
+    ('bytes', 'Q', '<u8'),
+    ('readable', 'Q', '<u8'),
+    ('encrypted', 'Q', '<u8'),
+    ('first_seen', 'd', '<f8'),
+    ('last_seen', 'd', '<f8'),
+)
+TABLES = {'packets': PACKET_COLUMNS, 'flows': FLOW_COLUMNS}
+
+PROTOCOLS = {'TCP': 6, 'UDP': 17}
+NO_INTERFACE = 0xFFFF
+
+
+def columns_path(capture_path):
+    for suffix in (".segments.json", ".pcapng", ".pcap"):
+        if capture_path.endswith(suffix):
+            return capture_path[:-len(suffix)] + COLUMNS_SUFFIX
+    return capture_path + COLUMNS_SUFFIX
+
+
+def pack_address(ip):
+    if ":" in ip:
+        return 6, socket.inet_pton(socket.AF_INET6, ip)
+    return 4, socket.inet_aton(ip) + b"\0" * 12
+
+
+def format_address(family, packed):
+    # Turns a family and a 16 byte address from the columns back into text
+    if family == 6:
+        return socket.inet_ntop(socket.AF_INET6, bytes(packed).ljust(16, b"\0"))
+    return socket.inet_ntoa(bytes(packed)[:4])
+
+
+def _npy_header(descr, rows):
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (descr, rows)
+    # Magic, version 1.0 and the header length, then the header padded with spaces up to a fixed size
+    prefix = b"\x93NUMPY\x01\x00" + struct.pack("<H", NPY_HEADER_SIZE - 10)
+    return prefix + header.ljust(NPY_HEADER_SIZE - 11).encode('latin1') + b"\n"
+
+
+class ColumnFile:
+    # One .npy file that grows at the end
+    def __init__(self, path, typecode, descr):
+        self.path = path
+        self.typecode = typecode
+        self.descr = descr
+        self.rows = 0
+        self.pending = array(typecode) if typecode else bytearray()
+        self.file = open(path, 'wb')
+        self.file.write(_npy_header(descr, 0))
+
+    def append(self, value):
+        if self.typecode:
+            self.pending.append(value)
+        else:
+            self.pending += value
+
+    def flush(self):
+        pending = self.pending
+        if self.typecode:
+            rows = len(pending)
+            if rows and sys.byteorder == 'big':
+                pending.byteswap()
+            data = pending.tobytes()
+            self.pending = array(self.typecode)
+        else:
+            rows = len(pending) // int(self.descr[2:])
+            data = bytes(pending)
+            self.pending = bytearray()
+        if not rows:
+            return
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(data)
+        self.rows += rows
+        # The header is rewritten after the data, so a reader never sees more rows than there are
+        self.file.seek(0)
+        self.file.write(_npy_header(self.descr, self.rows))
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class ColumnTable:
+    def __init__(self, directory, name, columns):
+        self.columns = [ColumnFile(os.path.join(directory, f"{name}.{column}.npy"), typecode, descr)
+                        for column, typecode, descr in columns]
+        self.pending_rows = 0
+
+    def append(self, values):
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self.pending_rows += 1
+
+    @property
+    def rows(self):
+        return self.columns[0].rows + self.pending_rows
+
+    def flush(self):
+        for column in self.columns:
+            column.flush()
+        self.pending_rows = 0
+
+    def close(self):
+        for column in self.columns:
+            column.close()
+        self.pending_rows = 0
+
+
+class ColumnWriter:
+    # Packet rows are added while packets are classified (by the capture pipeline or the loader); the flow rows
+    # are written from the finished flow table by close
+    def __init__(self, directory, chunk_rows=CHUNK_ROWS):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+        self.packets = ColumnTable(directory, 'packets', PACKET_COLUMNS)
+        self.flows = None
+        self.flows_seen = {}  # FlowKey -> (row in the flows table, family, packed src, packed dst, protocol number)
+        self.interfaces = {}  # Interface name -> index
+        self.lock = threading.Lock()
+        self.closed = False
+        self._save_schema()
+
+    def add_packets(self, rows):
+        # rows: (position, FlowKey, length, timestamp, readable, entropy, interface) tuples
+        with self.lock:
+            if self.closed:
+                return
+            packets = self.packets
+            for position, key, length, timestamp, readable, entropy, interface in rows:
+                flow, family, src, dst, proto = self._flow(key)
+                if interface is None:
+                    interface_index = NO_INTERFACE
+                else:
+                    interface_index = self.interfaces.setdefault(interface, len(self.interfaces))
+                packets.append((position, timestamp, family, src, dst, key.src_port, key.dst_port, proto, length,
+                                1 if readable else 0, entropy, flow, interface_index))
+            if packets.pending_rows >= self.chunk_rows:
+                packets.flush()
+                self._save_schema()
+
+    def close(self, packet_details=None):
+        # Writes the flow summaries of packet_details (if given) and finishes the files
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.packets.close()
+            if packet_details is not None:
+                self.flows = ColumnTable(self.directory, 'flows', FLOW_COLUMNS)
+                # In flow id order, so a packet's flow column is the row of its flow
+                for key, record in sorted(packet_details.items(), key=lambda item: self._flow(item[0])[0]):
+                    flow, family, src, dst, proto = self._flow(key)
+                    first_seen = float('nan') if record.first_seen is None else record.first_seen
+                    last_seen = float('nan') if record.last_seen is None else record.last_seen
+                    self.flows.append((flow, family, src, dst, key.src_port, key.dst_port, proto, record.packets,
+                                       record.bytes, record.readable, record.encrypted, first_seen, last_seen))
+                    if self.flows.pending_rows >= self.chunk_rows:
+                        self.flows.flush()
+                self.flows.close()
+            self._save_schema()
+
+    def _flow(self, key):
+        # Addresses are packed once per flow, not once per packet
+        seen = self.flows_seen.get(key)
+        if seen is None:
+            family, src = pack_address(key.src)
+            _, dst = pack_address(key.dst)
+            seen = self.flows_seen[key] = (len(self.flows_seen), family, src, dst, PROTOCOLS.get(key.proto, 0))
+        return seen
+
+    def stats(self):
+        with self.lock:
+            return {'packet_rows': self.packets.rows, 'flows': len(self.flows_seen)}
+
+    def _save_schema(self):
+        schema = {'version': 1, 'interfaces': sorted(self.interfaces, key=self.interfaces.get),
+                  'tables': {name: [column for column, _, _ in columns] for name, columns in TABLES.items()}}
+        temporary_path = os.path.join(self.directory, "columns.json.tmp")
+        with open(temporary_path, 'w', encoding='utf-8') as schema_file:
+            json.dump(schema, schema_file, indent=1)
+        os.replace(temporary_path, os.path.join(self.directory, "columns.json"))
+
+
+def load_columns(directory, table='packets', mmap=False):
+    # {column: NumPy array} for one table; every column is a single read (or a memory map)
+    import numpy as np
+    columns = {}
+    for column, _, _ in TABLES[table]:
+        path = os.path.join(directory, f"{table}.{column}.npy")
+        if os.path.exists(path):
+            columns[column] = np.load(path, mmap_mode='r' if mmap else None)
+    # Columns can be one chunk apart while a capture is still writing them
+    rows = min((len(values) for values in columns.values()), default=0)
+    return {column: values[:rows] for column, values in columns.items()}
+
+
+def load_interfaces(directory):
+    with open(os.path.join(directory, "columns.json"), 'r', encoding='utf-8') as schema_file:
+        return json.load(schema_file)['interfaces']
+
+
+def to_npz(directory, npz_path):
+    # Packs the column files into one .npz (numpy.load gives back every column under "<table>.<column>")
+    with zipfile.ZipFile(npz_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as npz:
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".npy"):
+                npz.write(os.path.join(directory, name), name)
+    return npz_path
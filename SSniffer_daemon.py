@@ -0,0 +1,259 @@
+import argparse
+import json
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+
+import SSniffer_bpf
+import SSniffer_columns
+import SSniffer_flows
+import SSniffer_functions
+import SSniffer_metrics
+import SSniffer_pipeline
+import SSniffer_profiling
+import SSniffer_segments
+import SSniffer_store
+import SSniffer_timeline
+
+# Headless capture for sensor boxes: no input() and no Qt. Every --interval seconds the flows that changed are
+# written out as JSON lines or FLOW_RECORD binary records; status messages go to stderr.
+
+# Record type, address family, src and dst address (IPv4 in the first 4 bytes), src and dst port, IP protocol,
+# packets, bytes, readable, encrypted, first and last seen (NaN when unknown)
+FLOW_RECORD = struct.Struct("<BB16s16sHHBQQQQdd")
+RECORD_FLOW = 1
+DEFAULT_INTERVAL = 1.0  # Seconds between flow updates
+DEFAULT_STATS_INTERVAL = 10.0  # Seconds between stats lines, 0 for none
+
+
+def encode_json_flow(key, counters, interfaces):
+    flow = {'type': 'flow', 'time': time.time(), 'src': key.src, 'dst': key.dst, 'src_port': key.src_port,
+            'dst_port': key.dst_port, 'proto': key.proto, **counters._asdict()}
+    if interfaces:
+        flow['interfaces'] = interfaces
+    return json.dumps(flow, separators=(',', ':')).encode('utf-8') + b"\n"
+
+
+def encode_binary_flow(key, counters, interfaces):
+    family, src = SSniffer_columns.pack_address(key.src)
+    _, dst = SSniffer_columns.pack_address(key.dst)
+    nan = float('nan')
+    return FLOW_RECORD.pack(RECORD_FLOW, family, src, dst, key.src_port, key.dst_port,
+                            SSniffer_columns.PROTOCOLS.get(key.proto, 0), counters.packets, counters.bytes,
+                            counters.readable, counters.encrypted,
+                            nan if counters.first_seen is None else counters.first_seen,
+                            nan if counters.last_seen is None else counters.last_seen)
+
+
+def encode_json_event(kind, values):
+    # 'stats' every --stats-interval seconds, 'end' once the capture has stopped
+    return json.dumps({'type': kind, 'time': time.time(), **values}, separators=(',', ':')).encode('utf-8') + b"\n"
+
+
+# Format -> (flow encoder, event encoder or None when the format only carries flows)
+FORMATS = {'json': (encode_json_flow, encode_json_event), 'binary': (encode_binary_flow, None)}
+
+
+def open_output(target, stdout):
+    # '-' is stdout, tcp://HOST:PORT and unix:///PATH connect to a listening collector, anything else is a file
+    if target == '-':
+        return stdout
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].rpartition(":")
+        return socket.create_connection((host.strip("[]"), int(port))).makefile('wb')
+    if target.startswith("unix://"):
+        unix_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        unix_socket.connect(target[len("unix://"):])
+        return unix_socket.makefile('wb')
+    return open(target, 'wb')
+
+
+class FlowStreamer:
+    # Collects flow changes from the capture and writes them out in batches
+    def __init__(self, packet_details, output, output_format='json', flow_filter=None):
+        self.packet_details = packet_details
+        self.output = output
+        self.encode_flow, self.encode_event = FORMATS[output_format]
+        self.flow_filter = flow_filter
+        self.changed = set()
+        self.lock = threading.Lock()
+        self.flows_written = 0
+        packet_details.add_listener(self.record)
+
+    def record(self, key, new):
+        # FlowTable listener, runs on the aggregator thread for every packet
+        with self.lock:
+            self.changed.add(key)
+
+    def flush(self):
+        with self.lock:
+            changed, self.changed = self.changed, set()
+        rows = []
+        packet_details = self.packet_details
+        # Copied under the table's lock so every flow is as of the same batch
+        with packet_details.lock:
+            for key in changed:
+                record = packet_details.get(key)
+                if record is None or (self.flow_filter is not None and not self.flow_filter(key, record)):
+                    continue
+                rows.append((key, SSniffer_flows.FlowCounters(record.packets, record.bytes, record.readable,
+                                                              record.encrypted, record.first_seen,
+                                                              record.last_seen),
+                             list(record.interfaces) if record.interfaces else None))
+        if rows:
+            self.output.write(b"".join(self.encode_flow(*row) for row in rows))
+            self.flows_written += len(rows)
+        self.output.flush()
+
+    def event(self, kind, values):
+        if self.encode_event is not None:
+            self.output.write(self.encode_event(kind, values))
+            self.output.flush()
+
+    def close(self):
+        self.packet_details.remove_listener(self.record)
+
+
+def capture_stats(pipeline, packet_source, multi_capture):
+    stats = {'pipeline': pipeline.stats(), 'store': packet_source.stats()}
+    if pipeline.reassembler is not None:
+        stats['reassembly'] = pipeline.reassembler.stats()
+    if multi_capture is not None:
+        stats['interfaces'] = multi_capture.stats()
+    return stats
+
+
+def run(args, stdout):
+    if args.pcap:
+        SSniffer_functions.CAPTURE_FILE = args.pcap
+    if args.no_rotation:
+        SSniffer_functions.ROTATION = None
+    flow_filter = SSniffer_flows.parse_flow_filter(args.flow_filter or "")
+    memory_budget = args.memory_budget * 1024 * 1024
+    engine = args.engine
+
+    column_writer = None
+    if args.columns:
+        column_writer = SSniffer_columns.ColumnWriter(SSniffer_columns.columns_path(
+            SSniffer_functions.capture_file(engine=engine)))
+    multi_capture = None
+    stop_event = threading.Event()
+    if len(args.interface) == 1:
+        packet_source = SSniffer_store.PacketStore(SSniffer_functions.capture_file(engine=engine), memory_budget,
+                                                   SSniffer_store.PACKET_OVERHEAD[engine])
+        packet_details = SSniffer_flows.FlowTable(packet_source)
+        pipeline = SSniffer_pipeline.CapturePipeline(packet_details, column_writer=column_writer)
+        capture_thread = threading.Thread(target=SSniffer_functions.capture_packets, name="capture",
+                                          args=(args.interface[0], packet_details, stop_event, packet_source,
+                                                engine, pipeline, args.filter))
+    else:
+        packet_details = SSniffer_flows.FlowTable()
+        pipeline = SSniffer_pipeline.CapturePipeline(packet_details, column_writer=column_writer)
+        multi_capture = SSniffer_timeline.MultiCapture(args.interface, packet_details, stop_event, engine,
+                                                       memory_budget, pipeline, args.filter)
+        packet_source = multi_capture.packet_source
+        capture_thread = threading.Thread(target=multi_capture.run, name="capture")
+
+    output = open_output(args.output, stdout)
+    streamer = FlowStreamer(packet_details, output, args.format, flow_filter)
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda number, frame: stop_event.set())
+
+    started = time.monotonic()
+    next_stats = started + args.stats_interval if args.stats_interval else None
+    capture_thread.start()
+    try:
+        streamer.event('start', {'interfaces': args.interface, 'engine': engine, 'filter': args.filter,
+                                 'capture_file': packet_source.file_path if multi_capture is None else None})
+        while capture_thread.is_alive():
+            capture_thread.join(args.interval)
+            now = time.monotonic()
+            if args.duration is not None and now - started >= args.duration:
+                stop_event.set()
+            streamer.flush()
+            if next_stats is not None and now >= next_stats:
+                streamer.event('stats', capture_stats(pipeline, packet_source, multi_capture))
+                next_stats = now + args.stats_interval
+        # The pipeline has finished, the last flows and the totals go out
+        streamer.flush()
+        streamer.event('end', {'flows': len(packet_details), 'flows_written': streamer.flows_written,
+                               'seconds': time.monotonic() - started,
+                               **capture_stats(pipeline, packet_source, multi_capture)})
+    except (BrokenPipeError, ConnectionError) as e:
+        print(f"The output went away ({e}), stopping the capture", file=sys.stderr)
+        stop_event.set()
+        capture_thread.join()
+        return 1
+    finally:
+        streamer.close()
+        if output is not stdout:
+            try:
+                output.close()
+            except OSError:
+                pass
+    if multi_capture is None and not SSniffer_segments.is_catalog(packet_source.file_path):
+        SSniffer_functions.save_capture_index(packet_source.file_path, packet_details)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Headless SSniffer capture that streams flow updates",
+        epilog='e.g. python SSniffer_daemon.py -i eth0 --engine raw -f "tcp port 443" --duration 3600 '
+               '--output tcp://collector:9000')
+    parser.add_argument('-i', '--interface', action='append', required=True,
+                        help="interface to capture on, can be repeated to capture several at once")
+    parser.add_argument('-f', '--filter', help="capture filter (BPF), e.g. 'tcp port 80 or udp port 53'")
+    parser.add_argument('--flow-filter', help="only stream flows matching these terms, e.g. 'readable port 80'")
+    parser.add_argument('-d', '--duration', type=float, help="seconds to capture (default: until interrupted)")
+    parser.add_argument('--engine', choices=SSniffer_functions.CAPTURE_ENGINES,
+                        default=SSniffer_functions.CAPTURE_ENGINES[0],
+                        help="capture engine, raw is much faster (default: %(default)s)")
+    parser.add_argument('--pcap', help=f"capture file (default: {SSniffer_functions.CAPTURE_FILE})")
+    parser.add_argument('--no-rotation', action='store_true',
+                        help="write the capture as one file instead of a ring of segments")
+    parser.add_argument('-o', '--output', default='-',
+                        help="where to stream to: - (stdout), a file, tcp://HOST:PORT or unix:///PATH")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='json', help="stream format (default: json)")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between flow updates (default: %(default)s)")
+    parser.add_argument('--stats-interval', type=float, default=DEFAULT_STATS_INTERVAL,
+                        help="seconds between stats lines, 0 for none (default: %(default)s)")
+    parser.add_argument('--memory-budget', type=int, default=SSniffer_store.DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+                        help="MB of packets kept in memory (default: %(default)s)")
+    parser.add_argument('--columns', action='store_true', help="also write packet and flow columns (SSniffer_columns)")
+    parser.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument('--metrics-file', help="write Prometheus metrics to this file")
+    parser.add_argument('--profile', action='store_true', help="profile the capture (SSniffer_profiling)")
+    args = parser.parse_args(argv)
+    try:
+        SSniffer_flows.parse_flow_filter(args.flow_filter or "")
+        if args.filter and args.engine == "raw":
+            # pyshark hands the filter to tshark, which reports its own errors; ours are checked up front
+            SSniffer_bpf.compile_filter(args.filter)
+    except (ValueError, SSniffer_bpf.FilterError, OSError) as e:
+        parser.error(str(e))
+
+    stdout = sys.stdout.buffer
+    if args.output == '-':
+        sys.stdout = sys.stderr  # print() from the capture code would end up in the middle of the stream
+    metrics_writer = None
+    if args.metrics_port is not None:
+        SSniffer_metrics.serve(args.metrics_port)
+    if args.metrics_file:
+        metrics_writer = SSniffer_metrics.MetricsFileWriter(args.metrics_file).start()
+    if args.profile:
+        SSniffer_profiling.profiler.start()
+    try:
+        return run(args, stdout)
+    finally:
+        if metrics_writer is not None:
+            metrics_writer.stop()
+        SSniffer_profiling.profiler.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
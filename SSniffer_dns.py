@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import SSniffer_metrics
+
+# Background reverse-DNS service. Lookups are queued and answered by a small pool of workers, so the capture
+# loop never waits on a DNS timeout. Answers are cached for as long as their TTL says, failures only for a
+# short while, and the cache drops the least recently used names once it is full. dnspython is only imported
+# by the workers, when the first lookup runs.
+
+UNKNOWN = 'Unknown'
+
+METRICS = {
+    'hits': (SSniffer_metrics.COUNTER, "Reverse lookups answered from the cache"),
+    'misses': (SSniffer_metrics.COUNTER, "Reverse lookups that had to ask DNS"),
+    'failures': (SSniffer_metrics.COUNTER, "Reverse lookups without an answer"),
+    'evictions': (SSniffer_metrics.COUNTER, "Names dropped from the full cache"),
+    'cached': (SSniffer_metrics.GAUGE, "Names in the cache"),
+    'pending': (SSniffer_metrics.GAUGE, "Reverse lookups waiting for DNS"),
+    'hit_ratio': (SSniffer_metrics.GAUGE, "Share of reverse lookups answered from the cache",
+                  lambda stats: SSniffer_metrics.ratio(stats['hits'], stats['misses'])),
+}
+
+
+class ReverseResolver:
+    def __init__(self, max_workers=8, cache_size=4096, timeout=2.0, negative_ttl=60, min_ttl=30, max_ttl=86400,
+                 batch_size=32, nameservers=None, port=53):
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.batch_size = batch_size
+        self.nameservers = nameservers
+        self.port = port
+
+        self.cache = OrderedDict()  # ip -> (hostname, expires at)
+        self.pending = {}  # ip -> threading.Event set once the answer is in the cache
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.slots = threading.BoundedSemaphore(max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dns")
+        self.listeners = []
+        self.dispatcher = None
+        self.local = threading.local()  # Each worker's dnspython resolver, built on its first lookup
+
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.evictions = 0
+
+    def add_listener(self, callback):
+        # callback(ip, hostname) runs on a resolver thread whenever an answer arrives
+        self.listeners.append(callback)
+
+    def lookup(self, ip):
+        # Never blocks: the cached hostname, or None after queueing a lookup
+        with self.lock:
+            hostname = self._cached(ip)
+            if hostname is not None:
+                self.hits += 1
+                return hostname
+            self.misses += 1
+            self._schedule(ip)
+        return None
+
+    def prefetch(self, ip):
+        with self.lock:
+            if self._cached(ip) is None:
+                self._schedule(ip)
+
+    def resolve(self, ip, timeout=None):
+        # Blocking lookup for callers that can afford to wait (detail views, the CLI)
+        hostname = self.lookup(ip)
+        if hostname is not None:
+            return hostname
+        with self.lock:
+            event = self.pending.get(ip)
+        if event is not None:
+            event.wait(self.timeout * 2 if timeout is None else timeout)
+        with self.lock:
+            hostname = self._cached(ip)
+        return UNKNOWN if hostname is None else hostname
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'failures': self.failures,
+                    'evictions': self.evictions, 'cached': len(self.cache), 'pending': len(self.pending)}
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def _cached(self, ip):
+        entry = self.cache.get(ip)
+        if entry is None:
+            return None
+        hostname, expires = entry
+        if expires < time.monotonic():
+            del self.cache[ip]
+            return None
+        self.cache.move_to_end(ip)
+        return hostname
+
+    def _schedule(self, ip):
+        if ip in self.pending:
+            return
+        self.pending[ip] = threading.Event()
+        self.requests.put(ip)
+        if self.dispatcher is None:
+            self.dispatcher = threading.Thread(target=self._dispatch, name="dns-dispatcher", daemon=True)
+            self.dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            # Take whatever piled up (up to a batch) and hand it to the pool, never more than max_workers at once
+            batch = [self.requests.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            for ip in batch:
+                self.slots.acquire()
+                try:
+                    self.executor.submit(self._resolve_one, ip)
+                except RuntimeError:
+                    return  # The interpreter is shutting down
+
+    def _resolver(self):
+        # Reading the system's resolver configuration costs more than many lookups, so each worker does it once
+        resolver = getattr(self.local, 'resolver', None)
+        if resolver is None:
+            import dns.resolver
+            resolver = dns.resolver.Resolver(configure=self.nameservers is None)
+            if self.nameservers is not None:
+                resolver.nameservers = list(self.nameservers)
+            resolver.port = self.port
+            resolver.lifetime = self.timeout
+            self.local.resolver = resolver
+        return resolver
+
+    def _resolve_one(self, ip):
+        try:
+            hostname, ttl = UNKNOWN, self.negative_ttl
+            started = time.perf_counter()
+            try:
+                import dns.exception
+                import dns.resolver
+                import dns.reversename
+                answer = self._resolver().resolve(dns.reversename.from_address(ip), "PTR")
+                hostname, ttl = str(answer[0])[:-1], min(max(answer.rrset.ttl, self.min_ttl), self.max_ttl)
+            except ImportError as e:
+                print(f"An error occurred: {e}")
+            except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.resolver.NoNameservers,
+                    dns.exception.Timeout):
+                pass
+            except Exception as e:
+                print(f"An error occurred: {e}")
+            finally:
+                # Whatever went wrong, the ip gets an answer (Unknown for a while) instead of staying pending
+                SSniffer_metrics.STAGE_SECONDS.observe('dns', time.perf_counter() - started)
+                self._store(ip, hostname, ttl)
+            for callback in self.listeners:
+                try:
+                    callback(ip, hostname)
+                except Exception as e:
+                    print(f"DNS listener failed: {e}")
+        finally:
+            self.slots.release()
+
+    def _store(self, ip, hostname, ttl):
+        with self.lock:
+            if hostname == UNKNOWN:
+                self.failures += 1
+            self.cache[ip] = (hostname, time.monotonic() + ttl)
+            self.cache.move_to_end(ip)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+            event = self.pending.pop(ip, None)
+        if event is not None:
+            event.set()
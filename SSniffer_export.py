@@ -0,0 +1,193 @@
+import os
+import struct
+
+import SSniffer_capture
+import SSniffer_flows
+import SSniffer_segments
+
+# Copying captures out of SSniffer without holding them in memory. A whole capture is copied inside the kernel
+# (copy_file_range, or sendfile on older systems), and exporting flows copies their packet records straight out of
+# the capture at the offsets the packet source already knows, so nothing is dissected again. A capture ring (see
+# SSniffer_segments) is exported by time range, copying whole segments where it can.
+
+COPY_CHUNK_SIZE = 1024 * 1024  # Bytes per read/write when the kernel can't copy for us
+PCAP_RECORD_HEADER = 16
+
+
+def _copy_range_chunked(src_fd, dst_fd, offset, length):
+    while length > 0:
+        data = os.pread(src_fd, min(COPY_CHUNK_SIZE, length), offset)
+        if not data:
+            raise EOFError("the capture file ended before the copy did")
+        os.write(dst_fd, data)
+        offset += len(data)
+        length -= len(data)
+
+
+def copy_range(src_fd, dst_fd, offset, length):
+    # Copies length bytes at offset of src_fd to the current position of dst_fd
+    for copy in (_copy_file_range, _sendfile):
+        copied = copy(src_fd, dst_fd, offset, length)
+        offset += copied
+        length -= copied
+        if length <= 0:
+            return
+    _copy_range_chunked(src_fd, dst_fd, offset, length)
+
+
+def _copy_file_range(src_fd, dst_fd, offset, length):
+    if not hasattr(os, 'copy_file_range'):
+        return 0
+    copied = 0
+    while copied < length:
+        try:
+            count = os.copy_file_range(src_fd, dst_fd, length - copied, offset + copied)
+        except OSError:
+            break  # Not supported for these files (other file system, old kernel...), the next way takes over
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def _sendfile(src_fd, dst_fd, offset, length):
+    if not hasattr(os, 'sendfile'):
+        return 0
+    copied = 0
+    while copied < length:
+        try:
+            count = os.sendfile(dst_fd, src_fd, offset + copied, length - copied)
+        except OSError:
+            break  # Not supported for these files (other file system, old kernel...), the next way takes over
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def copy_file(src_file_path, dest_file_path):
+    with open(src_file_path, 'rb') as src_file, open(dest_file_path, 'wb') as dest_file:
+        copy_range(src_file.fileno(), dest_file.fileno(), 0, os.fstat(src_file.fileno()).st_size)
+    return dest_file_path
+
+
+def source_file(packet_source):
+    # The pcap a packet source reads from, None when its packets are spread over several files
+    return getattr(packet_source, 'file_path', None) or getattr(packet_source, 'pcap_path', None)
+
+
+def flow_positions(packet_details, keys):
+    # Capture positions of every packet of the given flows, in capture order
+    positions = set()
+    for key in keys:
+        record = packet_details.get(key)
+        if record is None:
+            continue
+        positions.update(record.positions(SSniffer_flows.READABLE))
+        positions.update(record.positions(SSniffer_flows.ENCRYPTED))
+    return sorted(positions)
+
+
+def _record_ranges(reader, offsets):
+    # Joins records that follow each other in the file into one (offset, length) range
+    endian = reader.endian
+    ranges = []
+    for offset in offsets:
+        reader.file.seek(offset + 8)
+        caplen = struct.unpack(endian + "I", reader.file.read(4))[0]
+        length = PCAP_RECORD_HEADER + caplen
+        if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+            ranges[-1][1] += length
+        else:
+            ranges.append([offset, length])
+    return ranges
+
+
+def export_flows(packet_details, keys, dest_file_path):
+    # Writes the packets of the given flows to a new pcap. Returns the number of packets written.
+    packet_source = packet_details.packet_source
+    src_file_path = source_file(packet_source)
+    if src_file_path is None or not hasattr(packet_source, 'offset'):
+        raise ValueError("these packets are spread over several capture files, export them per interface")
+    offsets = []
+    for position in flow_positions(packet_details, keys):
+        offset = packet_source.offset(position)
+        if offset is None:
+            break  # The capture hasn't written this packet (or any later one) to the file yet
+        offsets.append(offset)
+
+    reader = SSniffer_segments.open_reader(src_file_path)
+    try:
+        if reader.pcapng or SSniffer_segments.is_catalog(src_file_path):
+            return _export_records(reader, offsets, dest_file_path)
+        # Classic pcap: the file header followed by the flows' records, byte for byte
+        with open(dest_file_path, 'wb') as dest_file:
+            src_fd, dst_fd = reader.file.fileno(), dest_file.fileno()
+            copy_range(src_fd, dst_fd, 0, reader.data_start)
+            for offset, length in _record_ranges(reader, offsets):
+                copy_range(src_fd, dst_fd, offset, length)
+        return len(offsets)
+    finally:
+        reader.close()
+
+
+def _export_records(reader, offsets, dest_file_path):
+    # pcapng records depend on the interface blocks in front of them and a ring's records are spread over several
+    # (maybe compressed) files, so these are written out record by record as a classic pcap
+    writer = None
+    written = 0
+    try:
+        for offset in offsets:
+            record = reader.read_record(offset)
+            if record is None:
+                break
+            _, timestamp, frame, original_length, linktype, _ = record
+            if writer is None:
+                writer = SSniffer_capture.PcapWriter(dest_file_path, linktype)
+            writer.write(frame, timestamp, original_length)
+            written += 1
+        if writer is None:
+            writer = SSniffer_capture.PcapWriter(dest_file_path, reader.linktype)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def _same_format(reader, writer):
+    # Whether the reader's records can be copied into the writer's file as they are
+    return (not reader.pcapng and reader.endian == "<" and reader.tsresol == [1e-6]
+            and reader.linktype == writer.linktype)
+
+
+def export_time_range(catalog_path, dest_file_path, start=None, end=None):
+    # Writes the packets of a capture ring from start to end (seconds since the epoch, None is open ended) to one
+    # pcap. Segments outside the range are never opened, plain segments that lie wholly inside it are copied
+    # in one piece. Returns the number of packets written.
+    reader = SSniffer_segments.SegmentedReader(catalog_path, start, end)
+    writer = None
+    written = 0
+    try:
+        for segment, segment_reader in reader.segment_files():
+            if writer is None:
+                writer = SSniffer_capture.PcapWriter(dest_file_path, segment_reader.linktype)
+            inside = ((start is None or (segment['first_ts'] is not None and segment['first_ts'] >= start))
+                      and (end is None or (segment['last_ts'] is not None and segment['last_ts'] <= end)))
+            if inside and segment['closed'] and segment['compression'] is None and _same_format(segment_reader, writer):
+                writer.flush()
+                copy_range(segment_reader.file.fileno(), writer.file.fileno(), segment['data_start'],
+                           segment['size'] - segment['data_start'])
+                writer.file.seek(0, os.SEEK_END)  # The copy went around the buffered file object
+                written += segment['packets']
+                continue
+            for _, timestamp, frame, original_length, _ in segment_reader.records():
+                if (start is None or timestamp >= start) and (end is None or timestamp <= end):
+                    writer.write(frame, timestamp, original_length)
+                    written += 1
+        if writer is None:
+            writer = SSniffer_capture.PcapWriter(dest_file_path)
+    finally:
+        reader.close()
+        if writer is not None:
+            writer.close()
+    return written
@@ -0,0 +1,265 @@
+import threading
+from array import array
+from collections import namedtuple
+
+# Flow table keyed by the 5-tuple. A record only keeps counters and the positions of its packets in the
+# capture, the packets themselves stay in the capture's packet source and are fetched when a view needs them.
+
+FlowKey = namedtuple('FlowKey', ['src', 'dst', 'src_port', 'dst_port', 'proto'])
+# A flow's counters at one moment, handed out by FlowTable.snapshot
+FlowCounters = namedtuple('FlowCounters', ['packets', 'bytes', 'readable', 'encrypted', 'first_seen', 'last_seen'])
+
+READABLE = 'readable'
+ENCRYPTED = 'encrypted'
+
+# What flows can be grouped by: source host, destination host, either endpoint, either port, protocol
+GROUP_BY = ('src', 'dst', 'host', 'port', 'proto')
+
+
+class FlowRecord:
+    __slots__ = ('key', 'packets', 'bytes', 'readable', 'encrypted', 'first_seen', 'last_seen',
+                 'readable_positions', 'encrypted_positions', 'interfaces')
+
+    def __init__(self, key):
+        self.key = key
+        self.packets = 0
+        self.bytes = 0
+        self.readable = 0
+        self.encrypted = 0
+        self.first_seen = None
+        self.last_seen = None
+        self.readable_positions = array('I')
+        self.encrypted_positions = array('I')
+        self.interfaces = None  # Interfaces the flow was seen on, when the capture watches more than one
+
+    def add(self, position, length, timestamp, readable, interface=None):
+        if interface is not None:
+            if self.interfaces is None:
+                self.interfaces = {}
+            self.interfaces[interface] = None
+        self.packets += 1
+        self.bytes += length
+        if self.first_seen is None or timestamp < self.first_seen:
+            self.first_seen = timestamp
+        if self.last_seen is None or timestamp > self.last_seen:
+            self.last_seen = timestamp
+        if readable:
+            self.readable += 1
+            self.readable_positions.append(position)
+        else:
+            self.encrypted += 1
+            self.encrypted_positions.append(position)
+
+    def merge(self, other):
+        # Folds in the record of the same flow from a later part of the capture (shards are merged in order)
+        self.packets += other.packets
+        self.bytes += other.bytes
+        self.readable += other.readable
+        self.encrypted += other.encrypted
+        if other.first_seen is not None and (self.first_seen is None or other.first_seen < self.first_seen):
+            self.first_seen = other.first_seen
+        if other.last_seen is not None and (self.last_seen is None or other.last_seen > self.last_seen):
+            self.last_seen = other.last_seen
+        self.readable_positions.extend(other.readable_positions)
+        self.encrypted_positions.extend(other.encrypted_positions)
+        if other.interfaces is not None:
+            self.interfaces = {**(self.interfaces or {}), **other.interfaces}
+
+    def positions(self, kind):
+        return self.readable_positions if kind == READABLE else self.encrypted_positions
+
+    def __repr__(self):
+        return f"<FlowRecord {self.key} {self.readable} readable, {self.encrypted} encrypted>"
+
+
+def group_values(key, group_by):
+    # The groups a flow belongs to; a flow between two hosts is in both of their 'host' groups
+    if group_by == 'src':
+        return (key.src,)
+    if group_by == 'dst':
+        return (key.dst,)
+    if group_by == 'host':
+        return (key.src,) if key.src == key.dst else (key.src, key.dst)
+    if group_by == 'port':
+        return (key.src_port,) if key.src_port == key.dst_port else (key.src_port, key.dst_port)
+    if group_by == 'proto':
+        return (key.proto,)
+    raise ValueError(f"can't group flows by {group_by!r}")
+
+
+def parse_flow_filter(text, describe=None):
+    # Post-capture filter on flow attributes, every term has to match ("not" or "!" negates the next one):
+    #   host ADDR|NAME, src ADDR, dst ADDR, port N, tcp, udp, proto NAME, iface NAME, readable, encrypted
+    # Any other word is looked for in describe(key) (the flow's display text) or in its addresses.
+    # Returns a predicate(key, record), or None when the text is empty.
+    words = text.lower().split()
+    if not words:
+        return None
+    tests = []
+    negate = False
+    position = 0
+
+    def argument():
+        nonlocal position
+        if position >= len(words):
+            raise ValueError(f"'{words[position - 1]}' needs a value")
+        position += 1
+        return words[position - 1]
+
+    def contains(key, value):
+        if describe is not None:
+            return value in describe(key).lower()
+        return value in f"{key.src} {key.src_port} {key.dst} {key.dst_port} {key.proto}".lower()
+
+    while position < len(words):
+        word = argument()
+        if word in ('not', '!'):
+            negate = not negate
+            continue
+        if word == 'host':
+            value = argument()
+            test = lambda key, record, value=value: value in (key.src, key.dst) or contains(key, value)
+        elif word in ('src', 'dst'):
+            value = argument()
+            test = lambda key, record, value=value, field=word: getattr(key, field) == value
+        elif word == 'port':
+            value = argument()
+            if not value.isdigit():
+                raise ValueError(f"bad port '{value}'")
+            test = lambda key, record, value=int(value): value in (key.src_port, key.dst_port)
+        elif word in ('tcp', 'udp', 'proto'):
+            value = word if word != 'proto' else argument()
+            test = lambda key, record, value=value: key.proto.lower() == value
+        elif word in ('iface', 'interface'):
+            value = argument()
+            test = lambda key, record, value=value: bool(record.interfaces) and value in record.interfaces
+        elif word in (READABLE, ENCRYPTED):
+            test = lambda key, record, kind=word: getattr(record, kind) > 0
+        else:
+            test = lambda key, record, value=word: contains(key, value)
+        if negate:
+            test = lambda key, record, test=test: not test(key, record)
+            negate = False
+        tests.append(test)
+    return lambda key, record: all(test(key, record) for test in tests)
+
+
+class FlowGroups:
+    # Grouping index kept up to date as flows are added, one dict per grouping:
+    # group value -> the flow keys in it (a dict used as an insertion ordered set)
+    def __init__(self):
+        self.groups = {group_by: {} for group_by in GROUP_BY}
+
+    def add(self, key):
+        for group_by, groups in self.groups.items():
+            for value in group_values(key, group_by):
+                members = groups.get(value)
+                if members is None:
+                    members = groups[value] = {}
+                members[key] = None
+
+    def get(self, group_by):
+        # [(value, [key, ...]), ...] in the order the groups were first seen; safe while a capture adds flows
+        return [(value, list(members)) for value, members in list(self.groups[group_by].items())]
+
+
+class FlowTable:
+    def __init__(self, packet_source=None):
+        self.flows = {}
+        self.groups = FlowGroups()
+        # Called with (key, new) after a flow is added or its counters change, on the thread that changed it
+        self.listeners = []
+        # Held by a writer that changes several flows at once (the capture pipeline's aggregator), so readers
+        # taking it see all of a batch or none of it
+        self.lock = threading.RLock()
+        # Anything indexable by capture position: the live capture's packet list or a loaded file's packets
+        self.packet_source = packet_source if packet_source is not None else []
+
+    def add(self, key, position, length, timestamp, readable, interface=None):
+        record = self.flows.get(key)
+        if record is None:
+            record = FlowRecord(key)
+            record.add(position, length, timestamp, readable, interface)
+            return self.insert(record)
+        record.add(position, length, timestamp, readable, interface)
+        for listener in self.listeners:
+            listener(key, False)
+        return record
+
+    def insert(self, record):
+        # Adds a new flow's record and indexes it
+        self.flows[record.key] = record
+        self.groups.add(record.key)
+        for listener in self.listeners:
+            listener(record.key, True)
+        return record
+
+    def merge(self, other):
+        # Adds another table's records; flows new to this table keep the order the other table saw them in
+        for record in other.flows.values():
+            self.merge_record(record)
+
+    def merge_record(self, record):
+        # Adds a record of one flow's packets from a later part of the capture
+        mine = self.flows.get(record.key)
+        if mine is None:
+            self.insert(record)
+        else:
+            mine.merge(record)
+            for listener in self.listeners:
+                listener(record.key, False)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def group(self, group_by, kind=None):
+        # [(value, [(key, record), ...]), ...]; with a kind only flows that have packets of that kind are kept
+        grouped = []
+        for value, keys in self.groups.get(group_by):
+            members = [(key, self.flows[key]) for key in keys]
+            if kind is not None:
+                members = [(key, record) for key, record in members if getattr(record, kind)]
+            if members:
+                grouped.append((value, members))
+        return grouped
+
+    def snapshot(self):
+        # {key: FlowCounters} copied in one go, consistent with the last batch the writer applied
+        with self.lock:
+            return {key: FlowCounters(record.packets, record.bytes, record.readable, record.encrypted,
+                                      record.first_seen, record.last_seen)
+                    for key, record in list(self.flows.items())}
+
+    def packets(self, record, kind):
+        return [self.packet_source[position] for position in record.positions(kind)]
+
+    def records(self):
+        with self.lock:
+            return list(self.flows.values())
+
+    def items(self):
+        with self.lock:
+            return list(self.flows.items())
+
+    def keys(self):
+        with self.lock:
+            return list(self.flows.keys())
+
+    def get(self, key, default=None):
+        return self.flows.get(key, default)
+
+    def __getitem__(self, key):
+        return self.flows[key]
+
+    def __contains__(self, key):
+        return key in self.flows
+
+    def __len__(self):
+        return len(self.flows)
+
+    def __iter__(self):
+        return iter(list(self.flows))
@@ -1,452 +1,780 @@
-import re
-import os
-import nmap
-import pyshark
-import psutil
-import threading
-import asyncio
-import dns.resolver
-import dns.reversename
-from functools import lru_cache
-import ollama
-from PyQt5.QtWidgets import QMessageBox
-
-
-
-
-
-def list_network_interfaces():
-    interfaces = psutil.net_if_addrs()
-    print("Available network interfaces:")
-    for index, (interface, addresses) in enumerate(interfaces.items()):
-        print(f"{index}. Interface: {interface}")
-    return list(interfaces.keys())
-
-
-@lru_cache(maxsize=1024)  # Cache up to 1024 IP-to-hostname resolutions
-def resolve_ip(ip):
-    try:
-        addr = dns.reversename.from_address(ip)
-        answer = dns.resolver.resolve(addr, "PTR")
-        hostname = str(answer[0])[:-1]  # Remove trailing dot
-    except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.exception.Timeout):
-        hostname = 'Unknown'
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        hostname = 'Unknown'
-    return hostname
-
-
-def return_port(st, packet):
-    if 'TCP' in packet:
-        src_port = packet.tcp.srcport
-        dst_port = packet.tcp.dstport
-    elif 'UDP' in packet:
-        src_port = packet.udp.srcport
-        dst_port = packet.udp.dstport
-
-    if st == "src":
-        return src_port
-    else:
-        return dst_port
-
-
-def is_payload_readable(payload):
-    try:
-        # Attempt to convert payload from hex to ASCII
-        ascii_payload = hex_to_ascii(payload)
-        # Use regex to check if the ASCII conversion consists mainly of readable text
-        # Here we're looking for a substantial portion of the string to be alphanumeric characters,
-        # which suggests the payload is meaningful text.
-        readable_text_ratio = len(re.findall(r'[a-zA-Z0-9\s,.!?;:]', ascii_payload)) / len(ascii_payload)
-        return readable_text_ratio > 0.7  # You can adjust the threshold based on your needs
-    except Exception:
-        return False
-
-
-def sort_by_ip(packet_lists):
-    def get_ip(packet_group):
-        key, packets = packet_group
-        parts = key.split(" ")
-        return parts[0], parts[3]  # source IP, destination IP
-
-    def remove_duplicates(groups):
-        dic = {}
-        new_list = []
-
-        # Convert the list to a dictionary to remove duplicates
-        for group in groups:
-            key = get_ip(group[0])[0]  # Assuming the first element of each group is unique and can be used as a key
-            dic[key] = group
-
-        # Convert the dictionary back to a list
-        for key, value in dic.items():
-            new_list.append(value)
-
-        return new_list
-
-    grouped_packets = []
-
-    for base_packet in packet_lists:
-        base_ip1, _ = get_ip(base_packet)
-        temp = []
-        for packet in packet_lists:
-            packet_ips = get_ip(packet)
-            if base_ip1 == packet_ips[0] or base_ip1 == packet_ips[0]:
-                temp.append(packet)
-
-        grouped_packets.append(temp)
-
-    return remove_duplicates(grouped_packets)
-
-
-def capture_packets(interface, packet_details, stop_event, as_is):
-    print(f"Silently capturing packets on interface: {interface}...")
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    try:
-        os.remove("saveFiles\\SSniffer.pcap")
-    except FileNotFoundError:
-        print("File SSniffer.pcap not found")
-    capture = pyshark.LiveCapture(interface=interface, output_file="saveFiles\\SSniffer.pcap")
-    try:
-        for packet in capture.sniff_continuously():
-            if stop_event.is_set():
-                break
-            as_is.append(packet)
-            if 'IP' in packet:
-                src_ip = packet.ip.src
-                dst_ip = packet.ip.dst
-                payload_present = False
-                payload_readable = False
-
-                if 'TCP' in packet and hasattr(packet.tcp,
-                                               'payload') and packet.tcp.payload and packet.tcp.payload != "00":
-                    payload_present = True
-                    payload_readable = is_payload_readable(packet.tcp.payload)
-
-                elif 'UDP' in packet and hasattr(packet.udp,
-                                                 'payload') and packet.udp.payload and packet.udp.payload != "00":
-                    payload_present = True
-                    payload_readable = is_payload_readable(packet.udp.payload)
-
-                if payload_present:
-                    key = f"{src_ip} ({resolve_ip(src_ip)}) -> {dst_ip} ({resolve_ip(dst_ip)})"
-                    with threading.Lock():
-                        if key not in packet_details:
-                            packet_details[key] = {'readable': [], 'encrypted': []}
-                        if payload_readable:
-                            packet_details[key]['readable'].append(packet)
-                        else:
-                            packet_details[key]['encrypted'].append(packet)
-    finally:
-        print("Stopped capturing packets.")
-        loop.close()
-
-
-def detailed_packet_info(packet_list):
-    for index, packet in enumerate(packet_list, 1):
-        src_host = resolve_ip(packet.ip.src)
-        dst_host = resolve_ip(packet.ip.dst)
-        protocol_info = packet.highest_layer if hasattr(packet, 'highest_layer') else "N/A"
-        length_info = packet.length if hasattr(packet, 'length') else "N/A"
-        print(
-            f"{index}. From {src_host} ({packet.ip.src}) to {dst_host} ({packet.ip.dst}), Protocol: {protocol_info}, Length: {length_info}")
-
-    detail_index = input("\nEnter the packet number to view details or 'exit' to return: ")
-    if detail_index.isdigit():
-        packet_index = int(detail_index) - 1
-        if 0 <= packet_index < len(packet_list):
-            show_packet_content(packet_list[packet_index])
-        else:
-            print("Invalid packet index.")
-    elif detail_index.lower() == 'exit':
-        return
-    else:
-        print("Invalid input. Please enter a number or 'exit'.")
-
-
-def show_packet_content(packet):
-    detail_str = "\nDetailed Packet Information:\n\n"
-
-    try:
-        source_info = f"Source IP: {packet.ip.src} ({resolve_ip(packet.ip.src)})"
-        destination_info = f"Destination IP: {packet.ip.dst} ({resolve_ip(packet.ip.dst)})"
-        detail_str += f"{source_info}\n{destination_info}\n\n"
-    except AttributeError:
-        detail_str += "IP information not available.\n"
-
-    try:
-        protocol = packet.transport_layer
-        layer = packet[protocol.lower()]
-        protocol_info = f"Transport Layer Protocol: {protocol}"
-        detail_str += f"{protocol_info}\n\n"
-    except AttributeError:
-        detail_str += "Unsupported transport layer or transport layer not available.\n"
-        return detail_str
-
-    ip_address = str(packet.ip.src)
-    port_number = str(return_port("src", packet))
-    service = scan_port(ip_address, port_number)
-    detail_str += f"Source Port {port_number} is used for: {service}\n"
-
-    ip_address = str(packet.ip.dst)
-    port_number = str(return_port("dst", packet))
-    service = scan_port(ip_address, port_number)
-    detail_str += f"Destination Port {port_number} is used for: {service}\n\n"
-
-    if hasattr(layer, 'payload'):
-        payload = layer.payload
-        detail_str += f"\nThe payload is {payload}\n"
-        try:
-            translated_payload = hex_to_ascii(payload)
-            detail_str += f"With translation, it is: {translated_payload}\n"
-            temp_str = f"ai says: \n{asko_llama(translated_payload)}\n"
-            detail_str += format_text_with_newlines(temp_str, 100)
-        except Exception as e:
-            detail_str += f"Error decoding payload: {e}\n"
-    else:
-        detail_str += "Payload not available for this packet.\n"
-    return detail_str
-
-
-def format_text_with_newlines(text, chars_per_line):
-    words = text.split()
-    formatted_text = ""
-    current_line = ""
-    current_length = 0
-
-    for word in words:
-        # If adding the next word would exceed the line length, start a new line
-        if current_length + len(word) + 1 > chars_per_line:
-            formatted_text += current_line.strip() + "\n"
-            current_line = word + " "
-            current_length = len(word) + 1
-        else:
-            current_line += word + " "
-            current_length += len(word) + 1
-
-    # Add the last line
-    if current_line:
-        formatted_text += current_line.strip()
-
-    return formatted_text
-
-
-def scan_port(ip, port):
-    try:
-        # Create a scanner object
-        nm = nmap.PortScanner()
-
-        # Scan the specified port
-        nm.scan(ip, str(port), arguments='-sS')
-
-        # Check if the host is up
-        if ip in nm.all_hosts():
-            # Check if the port is in the scan result
-            if port in nm[ip]['tcp']:
-                # Get the result for the specific host and port
-                port_info = nm[ip]['tcp'][port]
-
-                # Extracting the service name
-                service_name = port_info['name']
-                return service_name
-            else:
-                return f"Port {port} not found in scan results."
-        else:
-            return f"Host {ip} not found in scan results."
-
-    except nmap.PortScannerError as e:
-        return f"PortScannerError: {e}"
-    except Exception as e:
-        return f"Error: {e}"
-
-
-def hex_to_ascii(hex_string):
-    # Remove colons from the hex string
-    hex_string = hex_string.replace(":", "")
-    # Convert hex string to bytes
-    bytes_object = bytes.fromhex(hex_string)
-    # Convert bytes to ASCII string
-    ascii_string = bytes_object.decode("ascii", errors="replace")
-    return ascii_string
-
-
-def user_interaction(packet_details, stop_event):
-    while not stop_event.is_set():
-        cmd = input(
-            "Enter 'summary' to see a summary of readable and encrypted packets, 'readable' to view readable packets, "
-            "'encrypted' to view encrypted packets, 'stop' to quit capturing, 'exit' to quit program: ").strip().lower()
-
-        if cmd == 'summary':
-            print_summary(packet_details)
-        elif cmd == 'readable' or cmd == 'encrypted':
-            print_packet_type_summary(packet_details, readable=(cmd == 'readable'))
-        elif cmd == 'stop':
-            stop_event.set()
-        elif cmd == 'exit':
-            stop_event.set()
-            break
-        else:
-            print("Invalid command. Please enter 'summary', 'readable', 'encrypted', 'stop', or 'exit'.")
-
-
-def print_packet_type_summary(packet_details, readable=True):
-    if packet_details:
-        print("Summary of captured packets:")
-        sorted_details = sorted(packet_details.items(),
-                                key=lambda item: len(item[1]['readable' if readable else 'encrypted']), reverse=True)
-        for index, (key, packets) in enumerate(sorted_details, 1):
-            packet_count = len(packets['readable' if readable else 'encrypted'])
-            print(f"{index}. {key}: {packet_count} {'readable' if readable else 'potentially encrypted'} packets")
-
-        # Let user choose which type of packets to view immediately after summary
-        index = int(input("Select the index to view packets: ")) - 1
-        if index >= 0 and index < len(sorted_details):
-            key, packets = sorted_details[index]
-            print(f"Selected stream between {key}:")
-            detailed_packet_info(packets['readable' if readable else 'encrypted'])
-        else:
-            print("Invalid index selected.")
-    else:
-        print("No packets captured.")
-
-
-def print_summary(packet_details):
-    if packet_details:
-        print("Summary of captured packets:")
-        sorted_details = sorted(packet_details.items(),
-                                key=lambda item: len(item[1]['readable']) + len(item[1]['encrypted']), reverse=True)
-        for index, (key, packets) in enumerate(sorted_details, 1):
-            readable_packets = packets['readable']
-            encrypted_packets = packets['encrypted']
-            print(
-                f"{index}. {key}: {len(readable_packets)} readable, {len(encrypted_packets)} potentially encrypted packets")
-        # User selection for details
-        index = int(input("Select the index to view packets: ")) - 1
-        if index >= 0 and index < len(sorted_details):
-            key, packets = sorted_details[index]
-            print(f"Selected stream between {key}:")
-            print("1. View readable packets")
-            print("2. View potentially encrypted packets")
-            sub_choice = input("Choose an option (1 for readable, 2 for encrypted): ")
-            if sub_choice == '1':
-                detailed_packet_info(readable_packets)
-            elif sub_choice == '2':
-                detailed_packet_info(encrypted_packets)
-        else:
-            print("Invalid index selected.")
-    else:
-        print("No packets captured.")
-
-
-def asko_llama(question):
-    preview = "youre used as an ai for a school project of main your answers are straghtly fed to the user so dont add anything more. please describe me the perpose of that packet payload ignore all decrypted parts and answer with 1 line. if you dont know somthing its okay just say you cant undestand the payload at all. the payload is:"
-    response = ollama.generate(model='llama3', prompt=str(preview + question))
-    return (response['response'])
-
-def load_from_pcap_file(file_path="packet.pcap"):
-    try:
-        # Use Pyshark to read the pcap file
-        with pyshark.FileCapture(file_path, use_json=True) as capture:
-            packets = list(capture)
-            return packets
-    except Exception as e:
-        print(f"An error occurred while loading the file: {e}")
-        show_error_message("Load Error", f"An error occurred while loading the file:\n{e}")
-        return None
-
-
-def convert_packet_format(packet_list):
-    import SSniffer_functions
-    try:
-        packet_details = {}
-        for packet in packet_list:
-            if 'IP' in packet:
-                src_ip = packet.ip.src
-                dst_ip = packet.ip.dst
-                payload_present = False
-                payload_readable = False
-
-                if 'TCP' in packet and hasattr(packet.tcp, 'payload') and packet.tcp.payload and packet.tcp.payload != "00":
-                    payload_present = True
-                    payload_readable = SSniffer_functions.is_payload_readable(packet.tcp.payload)
-
-                elif 'UDP' in packet and hasattr(packet.udp, 'payload') and packet.udp.payload and packet.udp.payload != "00":
-                    payload_present = True
-                    payload_readable = SSniffer_functions.is_payload_readable(packet.udp.payload)
-
-                if payload_present:
-                    key = f"{src_ip} ({SSniffer_functions.resolve_ip(src_ip)}) -> {dst_ip} ({SSniffer_functions.resolve_ip(dst_ip)})"
-                    if key not in packet_details:
-                        packet_details[key] = {'readable': [], 'encrypted': []}
-                    if payload_readable:
-                        packet_details[key]['readable'].append(packet)
-                    else:
-                        packet_details[key]['encrypted'].append(packet)
-        return packet_details
-    except Exception as e:
-        print(f"An error occurred while loading the file: {e}")
-
-
-def load_packet_details(file_path="packet.pcap"):
-    try:
-        packets = load_from_pcap_file(file_path)
-        if packets:
-            packets = convert_packet_format(packets)
-            return packets
-    except Exception as e:
-        print(f"while loading: {e}")
-
-def save_packets_to_pcap(dest_file_path=None):
-    try:
-        src_file_path = "saveFiles\\SSniffer.pcap"
-        # Check if the source file exists
-        if not os.path.isfile(src_file_path):
-            raise FileNotFoundError(f"The source file '{src_file_path}' does not exist.")
-        
-        if dest_file_path is None:
-            base, ext = os.path.splitext(src_file_path)
-            dest_file_path = f"{base}_copy{ext}"
-        
-        # Open the source file in binary read mode
-        with open(src_file_path, 'rb') as src_file:
-            # Read the entire content of the source file
-            file_data = src_file.read()
-        
-        # Open the destination file in binary write mode and write the data
-        with open(dest_file_path, 'wb') as dest_file:
-            dest_file.write(file_data)
-        
-        print(f"File duplicated successfully from '{src_file_path}' to '{dest_file_path}'")
-        return dest_file_path
-    
-    except Exception as e:
-        print(f"An error occurred while duplicating the file: {e}")
-        raise
-
-def show_error_message(title, message):
-    QMessageBox.critical(title, message, QMessageBox.Ok)
-
-def run():
-    print("Listing network interfaces...")
-    interfaces = list_network_interfaces()
-    interface_index = int(input("Select the interface index to capture packets: "))
-    selected_interface = interfaces[interface_index]
-
-    packet_details = {}
-    stop_event = threading.Event()
-
-    capture_thread = threading.Thread(target=capture_packets, args=(selected_interface, packet_details, stop_event))
-    interaction_thread = threading.Thread(target=user_interaction, args=(packet_details, stop_event))
-
-    capture_thread.start()
-    interaction_thread.start()
-
-    capture_thread.join()
-    interaction_thread.join()
-
-
-if __name__ == '__main__':
-    run()
+import re
+import os
+import json
+import threading
+import time
+
+import SSniffer_capture
+import SSniffer_classifier
+import SSniffer_flows
+import SSniffer_metrics
+import SSniffer_profiling
+import SSniffer_reassembly
+import SSniffer_segments
+import SSniffer_store
+
+# "pyshark" runs tshark and dissects every packet fully, "raw" reads frames straight from the kernel
+CAPTURE_ENGINES = ("pyshark", "raw")
+CAPTURE_FILE = "saveFiles\\SSniffer.pcap"
+# Captures are kept as a ring of rotating, compressed segments instead of one file per session (None turns that off:
+# every session then overwrites CAPTURE_FILE). The raw engine writes the segments itself; tshark writes one file per
+# session, which joins the ring when the next session starts.
+ROTATION = SSniffer_segments.DEFAULT_ROTATION
+
+# pyshark, psutil, asyncio, Qt and the subsystems behind them (DNS, services, LLM, index, columns, exports) are
+# imported where they are first needed, so the headless CLI never loads Qt, NumPy or SQLite until it uses them.
+# The interfaces found last time, shown while listing
+INTERFACES_FILE = os.path.join("saveFiles", "SSniffer_interfaces.json")
+SCAN_TIMEOUT = 10.0  # Seconds a packet view waits for its nmap scans
+
+
+
+
+
+def list_network_interfaces():
+    import psutil
+    interfaces = psutil.net_if_addrs()
+    print("Available network interfaces:")
+    for index, (interface, addresses) in enumerate(interfaces.items()):
+        print(f"{index}. Interface: {interface}")
+    save_network_interfaces(list(interfaces.keys()))
+    return list(interfaces.keys())
+
+
+def cached_network_interfaces():
+    # The interfaces list_network_interfaces found last time, None before it has ever run
+    try:
+        with open(INTERFACES_FILE, 'r', encoding='utf-8') as interfaces_file:
+            interfaces = json.load(interfaces_file)
+    except (OSError, ValueError):
+        return None
+    return interfaces if isinstance(interfaces, list) else None
+
+
+def save_network_interfaces(interfaces):
+    try:
+        directory = os.path.dirname(INTERFACES_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(INTERFACES_FILE, 'w', encoding='utf-8') as interfaces_file:
+            json.dump(interfaces, interfaces_file)
+    except OSError as e:
+        print(f"Could not remember the network interfaces: {e}")
+
+
+# The shared lookups are made on first use, so importing this module starts no threads and opens no cache
+shared = {}
+shared_lock = threading.Lock()
+
+
+def _shared(name, create):
+    instance = shared.get(name)
+    if instance is None:
+        with shared_lock:
+            instance = shared.get(name)
+            if instance is None:
+                instance = shared[name] = create()
+    return instance
+
+
+def _create_resolver():
+    import SSniffer_dns
+    resolver = SSniffer_dns.ReverseResolver()
+    SSniffer_metrics.registry.add_stats('dns', resolver.stats, 'ssniffer_dns', SSniffer_dns.METRICS)
+    return resolver
+
+
+def get_resolver():
+    # Shared background resolver, capture only queues lookups and the views show whatever has arrived
+    return _shared('dns', _create_resolver)
+
+
+def resolve_ip(ip):
+    # Blocking lookup for the detail views, answered from the resolver's cache when possible
+    return get_resolver().resolve(ip)
+
+
+def host_name(ip):
+    # Never blocks: the cached hostname, or a placeholder while the lookup is still running
+    return get_resolver().lookup(ip) or "resolving..."
+
+
+def flow_key(packet):
+    protocol = packet.transport_layer
+    layer = packet[protocol]
+    return SSniffer_flows.FlowKey(packet.ip.src, packet.ip.dst, int(layer.srcport), int(layer.dstport), protocol)
+
+
+def endpoint_name(ip, port):
+    return f"[{ip}]:{port}" if ":" in ip else f"{ip}:{port}"
+
+
+def flow_name(key):
+    # Hostnames are filled in when the flow is shown, so a late DNS answer shows up on the next render
+    return (f"{endpoint_name(key.src, key.src_port)} ({host_name(key.src)}) -> "
+            f"{endpoint_name(key.dst, key.dst_port)} ({host_name(key.dst)}) {key.proto}")
+
+
+def group_name(group_by, value):
+    if group_by in ('src', 'dst', 'host'):
+        return f"{value} which is {host_name(value)}"
+    if group_by == 'port':
+        service_lookup = get_service_lookup()
+        service = service_lookup.local_service(value, 'tcp') or service_lookup.local_service(value, 'udp')
+        return f"port {value} ({service or 'unknown'})"
+    return str(value)
+
+
+def return_port(st, packet):
+    if 'TCP' in packet:
+        src_port = packet.tcp.srcport
+        dst_port = packet.tcp.dstport
+    elif 'UDP' in packet:
+        src_port = packet.udp.srcport
+        dst_port = packet.udp.dstport
+
+    if st == "src":
+        return src_port
+    else:
+        return dst_port
+
+
+def is_payload_readable(payload):
+    # Accepts the payload as pyshark's colon separated hex string or as raw bytes
+    try:
+        if isinstance(payload, str):
+            payload = bytes.fromhex(payload.replace(":", ""))
+        return SSniffer_classifier.is_readable(payload)
+    except Exception:
+        return False
+
+
+def packet_payload(packet):
+    # Raw bytes of the TCP/UDP payload, or None when the packet carries nothing worth classifying
+    for protocol in ('TCP', 'UDP'):
+        if protocol in packet:
+            layer = packet[protocol]
+            payload = getattr(layer, 'payload_bytes', None)  # The raw engine keeps the bytes, no hex round trip
+            if payload is None and hasattr(layer, 'payload') and layer.payload:
+                try:
+                    payload = bytes.fromhex(layer.payload.replace(":", ""))
+                except ValueError:
+                    payload = b""
+            if payload and payload != b"\x00":
+                return payload
+    return None
+
+
+def tcp_segment(packet):
+    # (sequence number, flags) of a TCP packet, None for anything else. The raw engine and newer tshark give the
+    # absolute sequence number as seq_raw, older tshark only the relative one
+    if 'TCP' not in packet:
+        return None
+    layer = packet['TCP']
+    seq = getattr(layer, 'seq_raw', None)
+    if seq is None:
+        seq = layer.seq
+    flags = layer.flags
+    return int(seq), int(flags, 16) if isinstance(flags, str) else int(flags)
+
+
+def classifiable_payload(packet):
+    # What the loaders batch for a packet: its payload, b"" for a TCP packet without one that starts or ends a
+    # stream (the reassembler needs to see those), None for anything else
+    if 'IP' not in packet:
+        return None
+    payload = packet_payload(packet)
+    if payload is None and 'TCP' in packet and tcp_segment(packet)[1] & SSniffer_reassembly.CONTROL_FLAGS:
+        return b""
+    return payload
+
+
+def capture_file(interface=None, engine="pyshark"):
+    # One pcap per interface when several are captured at once. With rotation either engine writes a ring of
+    # segments, and the file packets are read back from is the ring's catalog.
+    if interface is None:
+        path = CAPTURE_FILE
+    else:
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", interface)
+        path = CAPTURE_FILE[:-len(".pcap")] + f"-{name}.pcap"
+    if ROTATION is not None:
+        return SSniffer_segments.catalog_path(path)
+    return path
+
+
+def sniff(interface, output_file, stop_event, engine, handle_packet, bpf_filter=None, add_offsets=None):
+    # Runs one interface's capture on the calling thread, handing every packet to handle_packet. bpf_filter is a
+    # tcpdump style capture filter applied by the kernel / capture engine, so filtered packets cost no Python work.
+    # add_offsets is the packet store's, for the pyshark engine's ring (SSniffer_segments.TsharkRing)
+    import asyncio
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    if not SSniffer_segments.is_catalog(output_file):
+        # Keep the last session's file in the ring rather than overwriting it
+        try:
+            if ROTATION is not None and SSniffer_segments.archive_capture(output_file, ROTATION) is not None:
+                print(f"Moved the previous capture {os.path.basename(output_file)} to the capture ring")
+        except OSError as e:
+            print(f"Could not keep the previous capture {os.path.basename(output_file)}: {e}")
+        try:
+            os.remove(output_file)
+        except FileNotFoundError:
+            pass
+    rotation = ROTATION if SSniffer_segments.is_catalog(output_file) else None
+    ring = None
+    if engine == "raw":
+        capture = SSniffer_capture.RawCapture(interface, output_file=output_file, bpf_filter=bpf_filter,
+                                              rotation=rotation, stop_event=stop_event)
+    else:
+        import pyshark
+        if rotation is None:
+            capture = pyshark.LiveCapture(interface=interface, output_file=output_file, bpf_filter=bpf_filter or None)
+        else:
+            ring = SSniffer_segments.TsharkRing(output_file, rotation, add_offsets)
+            capture = pyshark.LiveCapture(interface=interface, output_file=ring.output_file,
+                                          bpf_filter=bpf_filter or None, custom_parameters=ring.tshark_parameters())
+    try:
+        for packet in capture.sniff_continuously():
+            if stop_event.is_set():
+                break
+            if ring is not None:
+                if ring.first_offset is not None:
+                    # The ring may hold earlier sessions: the store walks this session's records from here
+                    packet.file_offset, ring.first_offset = ring.first_offset, None
+                ring.poll()
+            handle_packet(packet)
+    finally:
+        if ring is not None:
+            capture.close()  # tshark has to finish the last file before the ring closes it
+            ring.close()
+        loop.close()
+
+
+def capture_packets(interface, packet_details, stop_event, as_is, engine="pyshark", pipeline=None, bpf_filter=None,
+                    column_writer=None):
+    print(f"Silently capturing packets on interface: {interface} ({engine} engine)...")
+    # This thread only stores packets; classifying them and updating packet_details happens in the pipeline
+    if pipeline is None:
+        import SSniffer_pipeline
+        pipeline = SSniffer_pipeline.CapturePipeline(packet_details, column_writer=column_writer)
+    pipeline.start()
+
+    def handle_packet(packet):
+        # as_is is a PacketStore: it keeps the newest packets in memory and finds older ones in the pcap file
+        position = as_is.append(packet, getattr(packet, 'file_offset', None))
+        pipeline.submit(position, packet)
+
+    try:
+        sniff(interface, capture_file(engine=engine), stop_event, engine, handle_packet, bpf_filter, as_is.add_offsets)
+    finally:
+        pipeline.close()
+        print("Stopped capturing packets.")
+
+
+def detailed_packet_info(packet_list):
+    for index, packet in enumerate(packet_list, 1):
+        src_host = resolve_ip(packet.ip.src)
+        dst_host = resolve_ip(packet.ip.dst)
+        protocol_info = packet.highest_layer if hasattr(packet, 'highest_layer') else "N/A"
+        length_info = packet.length if hasattr(packet, 'length') else "N/A"
+        print(
+            f"{index}. From {src_host} ({packet.ip.src}) to {dst_host} ({packet.ip.dst}), Protocol: {protocol_info}, Length: {length_info}")
+
+    detail_index = input("\nEnter the packet number to view details or 'exit' to return: ")
+    if detail_index.isdigit():
+        packet_index = int(detail_index) - 1
+        if 0 <= packet_index < len(packet_list):
+            show_packet_content(packet_list[packet_index])
+        else:
+            print("Invalid packet index.")
+    elif detail_index.lower() == 'exit':
+        return
+    else:
+        print("Invalid input. Please enter a number or 'exit'.")
+
+
+@SSniffer_profiling.profiled
+def show_packet_content(packet):
+    detail_str = "\nDetailed Packet Information:\n\n"
+
+    try:
+        source_info = f"Source IP: {packet.ip.src} ({resolve_ip(packet.ip.src)})"
+        destination_info = f"Destination IP: {packet.ip.dst} ({resolve_ip(packet.ip.dst)})"
+        detail_str += f"{source_info}\n{destination_info}\n\n"
+    except AttributeError:
+        detail_str += "IP information not available.\n"
+
+    try:
+        protocol = packet.transport_layer
+        layer = packet[protocol.lower()]
+        protocol_info = f"Transport Layer Protocol: {protocol}"
+        detail_str += f"{protocol_info}\n\n"
+    except AttributeError:
+        detail_str += "Unsupported transport layer or transport layer not available.\n"
+        return detail_str
+
+    source_port = str(return_port("src", packet))
+    destination_port = str(return_port("dst", packet))
+    source_service, destination_service = scan_ports([(str(packet.ip.src), source_port),
+                                                      (str(packet.ip.dst), destination_port)], protocol.lower())
+    detail_str += f"Source Port {source_port} is used for: {source_service}\n"
+    detail_str += f"Destination Port {destination_port} is used for: {destination_service}\n\n"
+
+    if hasattr(layer, 'payload'):
+        payload = layer.payload
+        detail_str += f"\nThe payload is {payload}\n"
+        try:
+            translated_payload = hex_to_ascii(payload)
+            detail_str += f"With translation, it is: {translated_payload}\n"
+            temp_str = f"ai says: \n{asko_llama(translated_payload)}\n"
+            detail_str += format_text_with_newlines(temp_str, 100)
+        except Exception as e:
+            detail_str += f"Error decoding payload: {e}\n"
+    else:
+        detail_str += "Payload not available for this packet.\n"
+    return detail_str
+
+
+def format_text_with_newlines(text, chars_per_line):
+    words = text.split()
+    formatted_text = ""
+    current_line = ""
+    current_length = 0
+
+    for word in words:
+        # If adding the next word would exceed the line length, start a new line
+        if current_length + len(word) + 1 > chars_per_line:
+            formatted_text += current_line.strip() + "\n"
+            current_line = word + " "
+            current_length = len(word) + 1
+        else:
+            current_line += word + " "
+            current_length += len(word) + 1
+
+    # Add the last line
+    if current_line:
+        formatted_text += current_line.strip()
+
+    return formatted_text
+
+
+def _create_service_lookup():
+    import SSniffer_services
+    service_lookup = SSniffer_services.ServiceLookup()
+    SSniffer_metrics.registry.add_stats('services', service_lookup.stats, 'ssniffer_services',
+                                        SSniffer_services.METRICS)
+    return service_lookup
+
+
+def get_service_lookup():
+    # Shared service lookup, repeated packet views of the same host answer from its cache
+    return _shared('services', _create_service_lookup)
+
+
+def scan_ports(endpoints, proto="tcp", timeout=SCAN_TIMEOUT):
+    # The service on each (ip, port), waiting up to timeout seconds for the scans (0 never waits). The packet views
+    # run on worker threads, so they wait; a scan still running after that gives the services table's guess
+    answers = get_service_lookup().wait_all([(ip, port, proto) for ip, port in endpoints], timeout)
+    return [service if from_scan else f"{service or 'unknown'} (services table, scan pending)"
+            for service, from_scan in answers]
+
+
+def scan_port(ip, port, proto="tcp", timeout=SCAN_TIMEOUT):
+    return scan_ports([(ip, port)], proto, timeout)[0]
+
+
+def hex_to_ascii(hex_string):
+    # Remove colons from the hex string
+    hex_string = hex_string.replace(":", "")
+    # Convert hex string to bytes
+    bytes_object = bytes.fromhex(hex_string)
+    # Convert bytes to ASCII string
+    ascii_string = bytes_object.decode("ascii", errors="replace")
+    return ascii_string
+
+
+def user_interaction(packet_details, stop_event):
+    flow_filter = None
+    while not stop_event.is_set():
+        line = input(
+            "Enter 'summary' to see a summary of readable and encrypted packets, 'readable' to view readable packets, "
+            "'encrypted' to view encrypted packets, 'filter <terms>' to only list matching flows, 'export <file>' to "
+            "write the listed flows to a pcap, 'metrics' to see the pipeline metrics, 'profile' to switch profiling "
+            "on or off, 'stop' to quit capturing, 'exit' to quit program: ").strip()
+        cmd = line.lower()
+
+        if cmd == 'summary':
+            print_summary(packet_details, flow_filter)
+        elif cmd == 'readable' or cmd == 'encrypted':
+            print_packet_type_summary(packet_details, readable=(cmd == 'readable'), flow_filter=flow_filter)
+        elif cmd == 'filter' or cmd.startswith('filter '):
+            try:
+                flow_filter = SSniffer_flows.parse_flow_filter(cmd[len('filter'):], flow_name)
+                print("Showing all flows." if flow_filter is None else "Filter set.")
+            except ValueError as e:
+                print(f"Invalid filter: {e}")
+        elif cmd.startswith('export '):
+            # The file name keeps its case, only the command is lower cased
+            keys = [key for key, _ in filtered_items(packet_details, flow_filter)]
+            try:
+                export_flows_to_pcap(packet_details, keys, line[len('export '):].strip())
+            except Exception:
+                pass  # Already reported
+        elif cmd == 'metrics':
+            print("\n".join(SSniffer_metrics.registry.summary()))
+        elif cmd == 'profile':
+            if SSniffer_profiling.profiler.active:
+                SSniffer_profiling.profiler.stop()
+            else:
+                SSniffer_profiling.profiler.start()
+        elif cmd == 'stop':
+            stop_event.set()
+        elif cmd == 'exit':
+            stop_event.set()
+            break
+        else:
+            print("Invalid command. Please enter 'summary', 'readable', 'encrypted', 'filter', 'export', 'metrics', "
+                  "'profile', 'stop', or 'exit'.")
+
+
+def filtered_items(packet_details, flow_filter=None):
+    items = packet_details.items()
+    if flow_filter is None:
+        return items
+    return [(key, record) for key, record in items if flow_filter(key, record)]
+
+
+def print_packet_type_summary(packet_details, readable=True, flow_filter=None):
+    kind = SSniffer_flows.READABLE if readable else SSniffer_flows.ENCRYPTED
+    if packet_details:
+        print("Summary of captured packets:")
+        sorted_details = sorted(filtered_items(packet_details, flow_filter), key=lambda item: getattr(item[1], kind),
+                                reverse=True)
+        for index, (key, record) in enumerate(sorted_details, 1):
+            packet_count = getattr(record, kind)
+            print(f"{index}. {flow_name(key)}: {packet_count} {'readable' if readable else 'potentially encrypted'} packets")
+
+        # Let user choose which type of packets to view immediately after summary
+        index = int(input("Select the index to view packets: ")) - 1
+        if index >= 0 and index < len(sorted_details):
+            key, record = sorted_details[index]
+            print(f"Selected stream between {flow_name(key)}:")
+            detailed_packet_info(packet_details.packets(record, kind))
+        else:
+            print("Invalid index selected.")
+    else:
+        print("No packets captured.")
+
+
+def print_summary(packet_details, flow_filter=None):
+    if packet_details:
+        print("Summary of captured packets:")
+        sorted_details = sorted(filtered_items(packet_details, flow_filter),
+                                key=lambda item: item[1].readable + item[1].encrypted, reverse=True)
+        for index, (key, record) in enumerate(sorted_details, 1):
+            print(
+                f"{index}. {flow_name(key)}: {record.readable} readable, {record.encrypted} potentially encrypted packets")
+        # User selection for details
+        index = int(input("Select the index to view packets: ")) - 1
+        if index >= 0 and index < len(sorted_details):
+            key, record = sorted_details[index]
+            print(f"Selected stream between {flow_name(key)}:")
+            print("1. View readable packets")
+            print("2. View potentially encrypted packets")
+            sub_choice = input("Choose an option (1 for readable, 2 for encrypted): ")
+            if sub_choice == '1':
+                detailed_packet_info(packet_details.packets(record, SSniffer_flows.READABLE))
+            elif sub_choice == '2':
+                detailed_packet_info(packet_details.packets(record, SSniffer_flows.ENCRYPTED))
+        else:
+            print("Invalid index selected.")
+    else:
+        print("No packets captured.")
+
+
+def _create_analysis_queue():
+    import SSniffer_llm
+    analysis_queue = SSniffer_llm.AnalysisQueue()
+    SSniffer_metrics.registry.add_stats('llm', analysis_queue.stats, 'ssniffer_llm', SSniffer_llm.METRICS)
+    return analysis_queue
+
+
+def get_analysis_queue():
+    # Shared analysis queue, identical payloads are only ever sent to the model once
+    return _shared('llm', _create_analysis_queue)
+
+
+def cancel_pending_analyses():
+    # Nothing to cancel before the first question
+    analysis_queue = shared.get('llm')
+    if analysis_queue is not None:
+        analysis_queue.cancel_pending()
+
+
+def asko_llama(question):
+    preview = "youre used as an ai for a school project of main your answers are straghtly fed to the user so dont add anything more. please describe me the perpose of that packet payload ignore all decrypted parts and answer with 1 line. if you dont know somthing its okay just say you cant undestand the payload at all. the payload is:"
+    return get_analysis_queue().ask(str(preview + question))
+
+def load_from_pcap_file(file_path="packet.pcap", time_range=None):
+    # Generator: reads the file one record at a time, yielding (position, file offset, packet, file size).
+    # time_range (start, end) limits a segment catalog to the segments and packets in between
+    reader = SSniffer_segments.open_reader(file_path, *(time_range or ()))
+    try:
+        file_size = reader.size()
+        for position, (offset, timestamp, frame, original_length, linktype) in enumerate(reader.records()):
+            packet = SSniffer_capture.decode_frame(frame, timestamp, position + 1, original_length, linktype=linktype)
+            yield position, offset, packet, file_size
+    finally:
+        reader.close()
+
+
+def packet_entries(batch, reassemble=True):
+    # batch holds (position, packet, classifiable_payload) tuples. Returns one entry per packet, in order: a packet
+    # classified on its own (UDP, or anything without reassembly) as (position, key, length, timestamp, readable,
+    # entropy), a TCP segment left to the reassembler as (position, key, length, timestamp, seq, flags, payload,
+    # payload length), with the payload cut to what the reassembler may need, a TCP packet without data as
+    # (position, key, timestamp, flags). The payloads are classified together in one go. Plain tuples, so the
+    # parallel loader's workers can hand them back.
+    entries = []
+    unscanned = []
+    for position, packet, payload in batch:
+        if not payload and not reassemble:
+            continue
+        item = (position, flow_key(packet), int(packet.length), float(packet.sniff_timestamp))
+        segment = tcp_segment(packet) if reassemble else None
+        if not payload:
+            entries.append((position, item[1], item[3], segment[1]))
+        elif segment is None:
+            unscanned.append(len(entries))
+            entries.append((item, payload))
+        else:
+            entries.append(item + segment + (payload[:SSniffer_reassembly.CLASSIFY_BYTES], len(payload)))
+    verdicts = SSniffer_classifier.classify_batch([entries[index][1] for index in unscanned])
+    for index, (kind, _, entropy) in zip(unscanned, verdicts):
+        entries[index] = entries[index][0] + (kind == SSniffer_classifier.READABLE, entropy)
+    return entries
+
+
+def add_packet_entries(packet_details, entries, prefetch=True, column_writer=None, reassembler=None, finish=False):
+    # Adds packet_entries() to the flow table. With a reassembler (an ordered one, SSniffer_reassembly) TCP packets
+    # are classified per stream, and every packet is added in capture order once the packets before it have their
+    # verdict, possibly by a later call. finish=True classifies every stream still waiting, for the last call on a
+    # file.
+    if reassembler is None:
+        rows = [entry + (None,) for entry in entries]
+    else:
+        for entry in entries:
+            if len(entry) == 6:
+                reassembler.add_classified(entry[:4], entry[4], entry[5])
+            elif len(entry) == 4:
+                position, key, timestamp, flags = entry
+                reassembler.control(key, flags, timestamp)
+            else:
+                position, key, length, timestamp, seq, flags, payload, payload_length = entry
+                reassembler.add(key, seq, flags, payload, timestamp, (position, key, length, timestamp),
+                                payload_length)
+        rows = [item + (readable, entropy, None)
+                for item, readable, entropy in (reassembler.finish() if finish else reassembler.take())]
+    for position, key, length, timestamp, readable, _, _ in rows:
+        if prefetch and key not in packet_details:
+            resolver = get_resolver()
+            resolver.prefetch(key.src)
+            resolver.prefetch(key.dst)
+        packet_details.add(key, position, length, timestamp, readable)
+    if column_writer is not None and rows:
+        column_writer.add_packets(rows)
+
+
+def add_classified_packets(packet_details, batch, prefetch=True, column_writer=None, reassembler=None,
+                           finish=False):
+    # batch holds (position, packet, payload) tuples; see packet_entries and add_packet_entries
+    add_packet_entries(packet_details, packet_entries(batch, reassembler is not None), prefetch, column_writer,
+                       reassembler, finish)
+
+
+@SSniffer_profiling.profiled
+def convert_packet_format(packet_list):
+    try:
+        # Pull out the payloads first so the classifier can score them all in one batch
+        payload_packets = []
+        for position, packet in enumerate(packet_list):
+            payload = classifiable_payload(packet)
+            if payload is not None:
+                payload_packets.append((position, packet, payload))
+
+        packet_details = SSniffer_flows.FlowTable(packet_list)
+        add_classified_packets(packet_details, payload_packets,
+                               reassembler=SSniffer_reassembly.StreamReassembler(ordered=True), finish=True)
+        return packet_details
+    except Exception as e:
+        print(f"An error occurred while loading the file: {e}")
+
+
+def stream_packet_details(file_path, progress=None, stop_event=None, batch_size=1024, progress_interval=0.5,
+                          memory_budget=SSniffer_store.DEFAULT_MEMORY_BUDGET, time_range=None, column_writer=None):
+    # Builds the flow table while the file is read, so nothing but the flows and a bounded packet ring is ever
+    # in memory. progress(packet_details, bytes read, file size, packets) is called every progress_interval
+    # seconds with the partly filled table. Stops early when stop_event is set. column_writer (SSniffer_columns)
+    # gets every classified packet's header row.
+    # A valid sidecar index means the file was seen before: map it instead of reading the whole file (the index
+    # covers the whole file, so it is neither used nor written for a time range, and it has no payloads to write
+    # columns from)
+    import SSniffer_index
+    use_index = time_range is None and column_writer is None
+    packet_details = SSniffer_index.load_index(file_path) if use_index else None
+    if packet_details is not None:
+        if progress is not None:
+            file_size = os.path.getsize(file_path)
+            progress(packet_details, file_size, file_size, len(packet_details.packet_source))
+        return packet_details
+
+    store = SSniffer_store.PacketStore(file_path, memory_budget, SSniffer_store.PACKET_OVERHEAD['raw'])
+    packet_details = SSniffer_flows.FlowTable(store)
+    reassembler = SSniffer_reassembly.StreamReassembler(ordered=True)
+    stopped = False
+    batch = []
+    bytes_read = file_size = packets = 0
+    last_progress = 0
+    for position, offset, packet, file_size in load_from_pcap_file(file_path, time_range):
+        if stop_event is not None and stop_event.is_set():
+            stopped = True
+            break
+        store.append(packet, offset)
+        packets = position + 1
+        bytes_read = offset
+        payload = classifiable_payload(packet)
+        if payload is not None:
+            batch.append((position, packet, payload))
+        if len(batch) >= batch_size:
+            add_classified_packets(packet_details, batch, column_writer=column_writer, reassembler=reassembler)
+            batch = []
+        if progress is not None and time.monotonic() - last_progress > progress_interval:
+            add_classified_packets(packet_details, batch, column_writer=column_writer, reassembler=reassembler)
+            batch = []
+            last_progress = time.monotonic()
+            progress(packet_details, bytes_read, file_size, packets)
+    add_classified_packets(packet_details, batch, column_writer=column_writer, reassembler=reassembler, finish=True)
+    if not stopped and time_range is None:
+        save_capture_index(file_path, packet_details)
+    if progress is not None:
+        progress(packet_details, file_size if packets else bytes_read, file_size, packets)
+    return packet_details
+
+
+def export_columns(file_path, directory=None, time_range=None):
+    # Reads a capture (or a time range of a capture ring) and writes its packet and flow columns
+    import SSniffer_columns
+    if directory is None:
+        directory = SSniffer_columns.columns_path(file_path)
+    column_writer = SSniffer_columns.ColumnWriter(directory)
+    packet_details = None
+    try:
+        # Nothing needs the decoded packets afterwards, so none are kept in memory
+        packet_details = stream_packet_details(file_path, memory_budget=0, time_range=time_range,
+                                               column_writer=column_writer)
+    finally:
+        column_writer.close(packet_details)
+    return directory
+
+
+def save_capture_index(file_path, packet_details):
+    # Writes the sidecar index for a finished capture or load; failing only costs the fast reopen
+    import SSniffer_index
+    try:
+        offsets = packet_details.packet_source.all_offsets()
+        if offsets is None:
+            print(f"Not indexing {file_path}: the file is missing packets")
+            return None
+        return SSniffer_index.write_index(file_path, packet_details, offsets)
+    except Exception as e:
+        print(f"Could not write the index for {file_path}: {e}")
+        return None
+
+
+def load_packet_details(file_path="packet.pcap"):
+    try:
+        packets = stream_packet_details(file_path)
+        if packets:
+            return packets
+    except Exception as e:
+        print(f"while loading: {e}")
+
+def save_packets_to_pcap(dest_file_path=None, src_file_path=None):
+    import SSniffer_export
+    try:
+        if src_file_path is None:
+            src_file_path = CAPTURE_FILE
+        # Check if the source file exists
+        if not os.path.isfile(src_file_path):
+            raise FileNotFoundError(f"The source file '{src_file_path}' does not exist.")
+        
+        if dest_file_path is None:
+            base = src_file_path[:-len(SSniffer_segments.CATALOG_SUFFIX)] if SSniffer_segments.is_catalog(
+                src_file_path) else os.path.splitext(src_file_path)[0]
+            dest_file_path = f"{base}_copy.pcap"
+        
+        if SSniffer_segments.is_catalog(src_file_path):
+            # A capture ring is saved as one pcap holding all of its segments
+            SSniffer_export.export_time_range(src_file_path, dest_file_path)
+        else:
+            # Copied inside the kernel where it can be, the capture is never read into memory as a whole
+            SSniffer_export.copy_file(src_file_path, dest_file_path)
+        
+        print(f"File duplicated successfully from '{src_file_path}' to '{dest_file_path}'")
+        return dest_file_path
+    
+    except Exception as e:
+        print(f"An error occurred while duplicating the file: {e}")
+        raise
+
+def export_flows_to_pcap(packet_details, keys, dest_file_path):
+    # Only the packets of the given flows, copied out of the capture at their recorded offsets
+    import SSniffer_export
+    try:
+        written = SSniffer_export.export_flows(packet_details, keys, dest_file_path)
+        print(f"Exported {written} packets of {len(keys)} flows to '{dest_file_path}'")
+        return dest_file_path
+    except Exception as e:
+        print(f"An error occurred while exporting the flows: {e}")
+        raise
+
+def show_error_message(title, message):
+    from PyQt5.QtWidgets import QMessageBox
+    QMessageBox.critical(title, message, QMessageBox.Ok)
+
+def run():
+    print("Listing network interfaces...")
+    interfaces = list_network_interfaces()
+    interface_index = int(input("Select the interface index to capture packets: "))
+    selected_interface = interfaces[interface_index]
+    bpf_filter = input("Capture filter, e.g. 'tcp port 80 or udp port 53' (empty to capture everything): ").strip()
+    metrics_target = input("Prometheus metrics: a port to serve them on or a file to write them to (empty for "
+                           "neither): ").strip()
+    metrics_writer = None
+    if metrics_target.isdigit():
+        SSniffer_metrics.serve(int(metrics_target))
+    elif metrics_target:
+        metrics_writer = SSniffer_metrics.MetricsFileWriter(metrics_target).start()
+
+    packet_details = SSniffer_flows.FlowTable(SSniffer_store.PacketStore(capture_file()))
+    stop_event = threading.Event()
+
+    capture_thread = threading.Thread(target=capture_packets, name="capture",
+                                      args=(selected_interface, packet_details, stop_event,
+                                            packet_details.packet_source),
+                                      kwargs={'bpf_filter': bpf_filter or None})
+    interaction_thread = threading.Thread(target=user_interaction, args=(packet_details, stop_event))
+
+    capture_thread.start()
+    interaction_thread.start()
+
+    capture_thread.join()
+    interaction_thread.join()
+    if metrics_writer is not None:
+        metrics_writer.stop()
+    SSniffer_profiling.profiler.stop()
+
+
+if __name__ == '__main__':
+    run()
@@ -1,428 +1,762 @@
-from collections import defaultdict
-import logging
-import sys
-import threading
-from functools import partial
-
-import pyshark
-from PyQt5.QtCore import Qt, QRect, pyqtSlot, QObject, pyqtSignal
-from PyQt5.QtGui import QPixmap, QPalette, QBrush
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QScrollArea, QApplication, QPushButton, QFileDialog, \
-    QMessageBox
-
-import SSniffer_functions
-from Loading_screen import LoadingScreen, CustomTitleBar, BaseWindow  # Ensure this module is correctly implemented
-
-
-class SniffWindow(BaseWindow):
-    def __init__(self):
-        super().__init__("SSniffer", "pictures\\ssniffer_screen.png")
-        self.initUI()
-        self.packet_details = {}
-        self.stop_event = threading.Event()
-        self.capture_thread = None
-
-    def initUI(self):
-        self.windows = {}
-        self.options_button = QPushButton("options", self)
-
-        self.options_button.setStyleSheet("""
-                                        QPushButton {
-                                            font-size: 25px; /* Larger font size */
-                                            color: #EED487; /* Text color */
-                                            background-color: rgba(0, 0, 0, 0); /* Transparent background */
-                                            border: 0px solid white; /* White border for visibility */
-                                        }
-                                        QPushButton:hover {
-                                            background-color: rgba(255, 255, 255, 0.1); /* Slightly visible on hover */
-                                        }
-                                    """)
-        self.options_button.clicked.connect(self.open_option_window)
-        self.options_button.move(75, 90)
-        # Set background image for the entire window
-        self.setAutoFillBackground(True)
-        palette = QPalette()
-        pixmap = QPixmap(self.image_path)
-        palette.setBrush(QPalette.Window, QBrush(pixmap))
-        self.setPalette(palette)
-
-        # Adding custom title bar
-        self.titleBar = CustomTitleBar()
-        self.titleBar.setGeometry(QRect(0, 0, self.width(), 50))
-
-        # Scrollable area setup
-        self.scroll = QScrollArea(self)
-        self.scroll.setGeometry(QRect(80, 141, 1120, 485))  # Set the position and size of the scroll area
-
-        self.widget = QWidget()
-        self.vbox = QVBoxLayout(self.widget)  # Layout for scrollable content
-        self.vbox.setSpacing(0)  # No space between widgets
-        self.vbox.setContentsMargins(0, 0, 0, 0)  # No margins around the layout
-
-        self.widget.setStyleSheet("background-color: #2E3B5B;")
-
-        self.scroll.setWidgetResizable(True)
-        self.scroll.setWidget(self.widget)
-
-        # Scrollbar styling
-        self.scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
-        self.scroll.setStyleSheet("QScrollBar:vertical {background: #2E3B5B;}")
-
-        self.setWindowFlags(Qt.FramelessWindowHint)
-
-        # Initialize the network selection screen
-        self.network_selection_screen()
-
-        self.thread_manager = ThreadManager()
-        self.thread_manager.finished.connect(self.on_thread_finished)
-
-        self.option_window = None
-
-    def add_label(self, text, location, size):
-        label = QLabel(text, self.widget)  # Ensure parent is self.widget
-        label.setStyleSheet("color: white; background-color: #2E3B5B; font-size: 25px;")
-        self.vbox.addWidget(label)  # Add label to the QVBoxLayout
-        return label
-
-    def network_selection_screen(self):
-        # Remove previous widgets from the layout
-        for i in reversed(range(self.vbox.count())):
-            self.vbox.itemAt(i).widget().deleteLater()
-
-        # Get list of available networks
-        interfaces = SSniffer_functions.list_network_interfaces()
-        self.network_buttons = []
-
-        for idx, interface in enumerate(interfaces):
-            button = self.setup_buttons(interface,
-                                        partial(self.on_network_selected, interface), self.vbox)
-            self.network_buttons.append(button)
-
-    @pyqtSlot()
-    def on_network_selected(self, interface):
-        # Perform the network selection logic here
-        print(f"Selected Network Interface: {interface}")
-        self.start_packet_capture(interface)
-
-    def start_packet_capture(self, interface):
-        self.packet_details = {}
-        self.stop_event.clear()
-        self.as_is = []
-        self.capture_thread = threading.Thread(target=SSniffer_functions.capture_packets,
-                                               args=(interface, self.packet_details, self.stop_event, self.as_is))
-        self.capture_thread.start()
-
-        self.second_menu()
-
-    def second_menu(self):
-        self.update_ui()
-
-        # Suggestion 2: Add logging for key actions to improve traceability and debugging.
-        logging.info("Summary button clicked")
-
-        try:
-            summary_button = self.setup_buttons("Show all the packet transactions ", self.show_summary, self.vbox,
-                                                size=(1100, 50))
-        except Exception as e:
-            print(f"Error setting up summary button: {str(e)}")
-
-        try:
-            readable_button = self.setup_buttons("Show all the packet transactions that have readable payloads",
-                                                 self.show_only_readable, self.vbox, size=(1100, 50))
-        except Exception as e:
-            print(f"Error setting up readable button: {str(e)}")
-
-        try:
-            stop_button = self.setup_buttons("Stop Capturing packets without closing the program",
-                                             self.stop_packet_capture, self.vbox, size=(1100, 50))
-        except Exception as e:
-            print(f"Error setting up stop button: {str(e)}")
-
-    @pyqtSlot()
-    def show_only_readable(self):
-
-        # Clear current widgets from the layout
-        self.update_ui()
-        # Create and set up the refresh button
-        refresh_button = self.setup_buttons("Refresh", self.show_only_readable, self.vbox, size=(100, 50))
-        self.vbox.addWidget(refresh_button)  # Add the button to the layout
-        # Add label for the readable packets screen
-        headline = self.add_label(f"", (50, 50), (600, 40))
-        packet_list = []
-        # Display only the readable packets
-        if self.packet_details:
-            readable_count = 0
-            for key, packets in self.packet_details.items():
-                if readable_count == 1:
-                    headline.setText("Readable Packets:")
-                if packets['readable']:
-                    packet_list.append((key, packets))
-                    button = self.setup_buttons(
-                        f"{key}: \n{len(packets['readable'])} readable packets",
-                        partial(self.show_packet_details, key, packets), self.vbox, size=(1110, 30))
-                    readable_count += 1
-
-            if readable_count == 0:
-                self.add_label("No readable packets found.", (50, 150), (600, 40))
-            self.add_label(f"there are {readable_count} groups of readable Packets", (50, 50), (600, 40))
-            sort_button = self.setup_buttons("sort by ip", partial(self.show_packet_groups_of_packet_groups,
-                                                                   SSniffer_functions.sort_by_ip(packet_list)),
-                                             self.vbox, size=(1100, 40))
-        else:
-            self.add_label("No packets captured.", (50, 100), (600, 40))
-
-    def show_packet_groups_of_packet_groups(self, packets_lists):
-        self.update_ui()
-
-        def get_ip(packet_group):
-            key, _ = packet_group
-            parts = key.split(" ")
-            src_ip = parts[0]
-            dst_ip = parts[3]
-            return src_ip, dst_ip
-
-        if packets_lists:
-            for packet_group in packets_lists:
-                src_ip, _ = get_ip(packet_group[0])
-                try:
-                    key, _ = packet_group[0]
-                    resolved_ip = key.split(" ")[1]
-                except Exception as e:
-                    resolved_ip = "Unknown"
-                    print(f"Error resolving IP {src_ip}: {e}")
-
-                self.setup_buttons(
-                    f"there are {len(packet_group)} packet groups that involves:\n {src_ip} which is {resolved_ip}",
-                    partial(self.show_packets_in_order, packet_group),
-                    self.vbox, size=(1100, 60))
-        else:
-            self.add_label("No packets to display.", (50, 100), (600, 40))
-
-    def show_packets_in_order(self, packet_list):
-        self.update_ui()
-        print(packet_list)
-        if packet_list:
-            for key, packets in packet_list:
-                self.setup_buttons(
-                    f"{key}: \n{len(packets['readable'])} readable packets, {len(packets['encrypted'])} potentially encrypted packets",
-                    partial(self.show_packet_details, key, packets),
-                    self.vbox, size=(1100, 60))
-        else:
-            self.add_label("No packets to display.", (50, 100), (600, 40))
-
-    @pyqtSlot()
-    def stop_packet_capture(self):
-        self.stop_event.set()
-        if self.capture_thread:
-            self.capture_thread.join()
-        print("Packet capture stopped.")
-
-    def show_summary(self):
-        # Show the summary
-        self.update_ui()
-
-        packet_list = []
-
-        # Create and set up the refresh button
-        refresh_button = self.setup_buttons("Refresh", self.show_summary, self.vbox, size=(100, 50))
-        sort_button = self.setup_buttons("Sort by ip", partial(self.show_packet_groups_of_packet_groups,
-                                                               SSniffer_functions.sort_by_ip(packet_list)),
-                                         self.vbox,
-                                         size=(123, 50))
-
-        if self.packet_details:
-            self.add_label(
-                f"Summary of the network traffic there are {len(self.packet_details)} packet groups captured:",
-                (50, 50), (600, 40))
-            sorted_details = sorted(self.packet_details.items(),
-                                    key=lambda item: len(item[1]['readable']) + len(item[1]['encrypted']), reverse=True)
-            for idx, (key, packets) in enumerate(sorted_details):
-                packet_list.append((key, packets))
-                summary_text = f"{key}: \n{len(packets['readable'])} readable,{len(packets['encrypted'])} potentially encrypted packets"
-                button = self.setup_buttons(summary_text, partial(self.show_packet_details, key, packets), self.vbox,
-                                            size=(1100, 80))
-            sort_button.pressed.connect(partial(self.show_packet_groups_of_packet_groups,
-                                                SSniffer_functions.sort_by_ip(packet_list)))
-
-        else:
-            self.add_label("No packets captured yet please refresh.", (50, 100), (1100, 40))
-
-    def show_packet_details(self, key, packets):
-        self.update_ui()  # Clear and prepare UI for new data
-        self.add_label(f"Details for {key}:", (50, 50), (600, 40))
-
-        self.list_packets(packets['readable'], "Readable Packets", 100)
-        self.list_packets(packets['encrypted'], "Encrypted Packets", 150 + len(packets['readable']) * 50)
-
-        back_button = self.setup_buttons("Back to Summary", self.show_summary, self.vbox)
-
-    def list_packets(self, packet_list, title, start_y):
-        self.add_label(f"{title} ({len(packet_list)}):", (50, start_y), (600, 40))
-        for idx, packet in enumerate(packet_list):
-            button = self.setup_buttons(f"Packet {idx + 1}", partial(self.show_individual_packet, packet), self.vbox,
-                                        size=(150, 30))
-
-    def show_individual_packet(self, packet):
-        self.update_ui()  # Clear and prepare UI for new data
-        self.display_packet_details(packet)
-        self.setup_buttons("Back to Packet Group", self.show_summary, self.vbox, size=(1100, 50))
-
-    def start_loading_bar(self, duration_ms):
-        self.loading_screen = LoadingScreen(duration_ms)
-        self.loading_screen.show()
-
-    def display_packet_details(self, packet):
-        self.start_loading_bar(0)
-
-        # Starting the thread to process packet details
-        def thread_function():
-            try:
-                packet_details = SSniffer_functions.show_packet_content(packet) 
-                self.thread_manager.finished.emit(packet_details)  # Emit signal with the results
-            except Exception as e:
-                self.thread_manager.finished.emit(f"Error displaying packet details: {str(e)}")
-
-        thread = threading.Thread(target=thread_function)
-        thread.start()
-
-    def on_thread_finished(self, packet_details):
-        # Close the loading screen and update the UI
-        self.loading_screen.close()
-        self.add_label(packet_details, (50, 100), (600, 40))
-        answer = QMessageBox.question(self, 'Save?',
-                                      "do you want to save the results?",
-                                      QMessageBox.Yes | QMessageBox.No,
-                                      QMessageBox.No)
-        if answer == QMessageBox.Yes:
-            self.save_spesific_packet(packet_details)
-
-    def update_ui(self):
-        """Clear all widgets from the QVBoxLayout and prepare for new content."""
-        while self.vbox.count():
-            widget = self.vbox.itemAt(0).widget()
-            if widget is not None:
-                self.vbox.removeWidget(widget)
-                widget.deleteLater()
-
-    def open_option_window(self):
-        self.option_window = OptionWindow(self)
-        self.option_window.move(200, 100)
-        self.option_window.show()
-
-    def load_packet_details(self):
-        options = QFileDialog.Options()
-        options |= QFileDialog.DontUseNativeDialog
-        file_path, _ = QFileDialog.getOpenFileName(
-            None, "Load Packet Details", "", "PCAP Files (*.pcap);;All Files (*)", options=options)
-        packet_details = SSniffer_functions.load_packet_details(file_path)
-        self.display_loaded_packet_details(packet_details)
-    
-    def display_loaded_packet_details(self, packet_details):
-        self.update_ui()
-
-        packet_list = []
-
-        # Create and set up the refresh button
-        refresh_button = self.setup_buttons("Refresh", self.show_summary, self.vbox, size=(100, 50))
-        sort_button = self.setup_buttons("Sort by ip", partial(self.show_packet_groups_of_packet_groups,
-                                                               SSniffer_functions.sort_by_ip(packet_list)),
-                                         self.vbox,
-                                         size=(123, 50))
-
-        if packet_details:
-            self.add_label(
-                f"Summary of the network traffic there are {len(packet_details)} packet groups captured:",
-                (50, 50), (600, 40))
-            sorted_details = sorted(packet_details.items(),
-                                    key=lambda item: len(item[1]['readable']) + len(item[1]['encrypted']), reverse=True)
-            for idx, (key, packets) in enumerate(sorted_details):
-                packet_list.append((key, packets))
-                summary_text = f"{key}: \n{len(packets['readable'])} readable,{len(packets['encrypted'])} potentially encrypted packets"
-                button = self.setup_buttons(summary_text, partial(self.show_packet_details, key, packets), self.vbox,
-                                            size=(1100, 80))
-            sort_button.pressed.connect(partial(self.show_packet_groups_of_packet_groups,
-                                                SSniffer_functions.sort_by_ip(packet_list)))
-
-        else:
-            self.add_label("No packets captured yet please refresh.", (50, 100), (1100, 40))
-    def save_gui(self):
-        options = QFileDialog.Options()
-        options |= QFileDialog.DontUseNativeDialog
-        file_path, _ = QFileDialog.getSaveFileName(
-            None, "Save Packet Details", "", "PCAP Files (*.pcap);;All Files (*)", options=options)
-        return file_path
-    
-    def save_spesific_packet(self, text_to_save):
-        options = QFileDialog.Options()
-        options |= QFileDialog.DontUseNativeDialog
-
-        # Open the save file dialog
-        file_path, _ = QFileDialog.getSaveFileName(
-            None, "Save Text to File", "", "Text Files (*.txt);;All Files (*)", options=options)
-
-        # If the user provided a file path, write the text to that file
-        if file_path:
-            if not file_path.lower().endswith('.txt'):
-                file_path += '.txt'
-            try:
-                # Open the file in write mode
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    file.write(text_to_save)
-                print(f"Text successfully written to {file_path}")
-            except Exception as e:
-                print(f"An error occurred while writing to the file: {e}")
-        else:
-            print("Save operation cancelled by the user.")
-
-
-    def save_packet_details(self):
-        
-        file_path = self.save_gui()
-        if file_path:
-            # Ensure the file has a .pcap extension
-            if not file_path.lower().endswith('.pcap'):
-                file_path += '.pcap'
-        
-        SSniffer_functions.save_packets_to_pcap(file_path)
-
-class ThreadManager(QObject):
-    finished = pyqtSignal(str, name='finished')  # Signal to notify when the thread is done
-
-
-class OptionWindow(BaseWindow):
-    def __init__(self, SniffWindow):
-        super().__init__("Options", "pictures\\options.png")
-        self.initUI(SniffWindow)
-
-    def initUI(self, SniffWindow):
-        WINDOW_LENGTH = 350
-        WINDOW_Hight = int((WINDOW_LENGTH * 800) / 1280) + 50
-        button_hight = int((WINDOW_Hight - 100) / 6)
-        self.setFixedSize(WINDOW_LENGTH, WINDOW_Hight)
-        self.setup_buttons("", SniffWindow.show_summary, self.main_layout, size=(WINDOW_LENGTH, button_hight))
-        self.setup_buttons("", SniffWindow.show_only_readable, self.main_layout, size=(WINDOW_LENGTH, button_hight))
-        self.setup_buttons("", SniffWindow.network_selection_screen, self.main_layout,
-                           size=(WINDOW_LENGTH, button_hight))
-        self.setup_buttons("", SniffWindow.save_packet_details, self.main_layout, size=(WINDOW_LENGTH, button_hight))
-        self.setup_buttons("", SniffWindow.load_packet_details, self.main_layout,
-                           size=(WINDOW_LENGTH, button_hight + 40))
-
-        # close button
-        self.button = QPushButton("X", self)
-        self.button.setStyleSheet(
-            """color: #EED487 ;background-color: #2E3B5B; font-size: 14px;font-weight: 500;border: 0px solid white;}QPushButton:hover {
-                            background-color: rgba(255, 255, 255, 0.1); /* Slightly visible on hover */}""")
-        self.button.setFixedSize(20, 20)
-        self.button.move(WINDOW_LENGTH - 30, 10)
-        self.button.clicked.connect(exit)
-
-
-
-
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    sniff_window = SniffWindow()
-    # window = OptionWindow(sniff_window)
-    # window.show()
-
-    sys.exit(app.exec_())
+from collections import defaultdict
+import logging
+import sys
+import threading
+from functools import partial
+
+from PyQt5.QtCore import Qt, QRect, pyqtSlot, QObject, pyqtSignal, QTimer
+from PyQt5.QtGui import QPixmap, QPalette, QBrush
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QScrollArea, QApplication, QPushButton, QFileDialog, \
+    QMessageBox, QTableView, QListView, QHeaderView, QLineEdit
+
+import SSniffer_bpf
+import SSniffer_columns
+import SSniffer_export
+import SSniffer_flows
+import SSniffer_functions
+import SSniffer_metrics
+import SSniffer_models
+import SSniffer_parallel
+import SSniffer_pipeline
+import SSniffer_profiling
+import SSniffer_segments
+import SSniffer_store
+import SSniffer_timeline
+from Loading_screen import LoadingScreen, CustomTitleBar, BaseWindow  # Ensure this module is correctly implemented
+
+GROUP_BUTTONS = (('src', "Sort by ip"), ('dst', "Group by destination"), ('host', "Group by either host"),
+                 ('port', "Group by port"), ('proto', "Group by protocol"))
+STATS_INTERVAL = 1000  # Milliseconds between refreshes of the stats panel
+
+VIEW_STYLE = """
+    QTableView, QListView, QLineEdit {color: white; background-color: #2E3B5B; font-size: 18px; border: 0px;}
+    QHeaderView::section {color: #EED487; background-color: #2E3B5B; font-size: 18px;}
+"""
+
+
+class SniffWindow(BaseWindow):
+    def __init__(self):
+        super().__init__("SSniffer", "pictures\\ssniffer_screen.png")
+        self.capture_engine = SSniffer_functions.CAPTURE_ENGINES[0]
+        self.capture_filter = ""
+        self.memory_budget = SSniffer_store.DEFAULT_MEMORY_BUDGET
+        self.write_columns = False  # Also write packet and flow columns for offline analysis while capturing
+        self.packet_view = 0  # Changes whenever the screen is cleared, so late packet analyses can be dropped
+        self.load_stop_event = None  # Set while a file is loading, setting it cancels the load
+        self.showing_loaded_summary = False
+        self.flow_model = None  # Model of the flow list on screen, live flow changes are applied to it
+        self.live_labels = []  # (label, function returning its text) refreshed with the flow list
+        self.load_progress_label = None
+        self.initUI()
+        self.packet_details = SSniffer_flows.FlowTable()
+        self.stop_event = threading.Event()
+        self.capture_thread = None
+        self.pipeline = None
+        self.multi_capture = None
+
+    def initUI(self):
+        self.windows = {}
+        self.options_button = QPushButton("options", self)
+
+        self.options_button.setStyleSheet("""
+                                        QPushButton {
+                                            font-size: 25px; /* Larger font size */
+                                            color: #EED487; /* Text color */
+                                            background-color: rgba(0, 0, 0, 0); /* Transparent background */
+                                            border: 0px solid white; /* White border for visibility */
+                                        }
+                                        QPushButton:hover {
+                                            background-color: rgba(255, 255, 255, 0.1); /* Slightly visible on hover */
+                                        }
+                                    """)
+        self.options_button.clicked.connect(self.open_option_window)
+        self.options_button.move(75, 90)
+        # Set background image for the entire window
+        self.setAutoFillBackground(True)
+        palette = QPalette()
+        pixmap = QPixmap(self.image_path)
+        palette.setBrush(QPalette.Window, QBrush(pixmap))
+        self.setPalette(palette)
+
+        # Adding custom title bar
+        self.titleBar = CustomTitleBar()
+        self.titleBar.setGeometry(QRect(0, 0, self.width(), 50))
+
+        # Scrollable area setup
+        self.scroll = QScrollArea(self)
+        self.scroll.setGeometry(QRect(80, 141, 1120, 485))  # Set the position and size of the scroll area
+
+        self.widget = QWidget()
+        self.vbox = QVBoxLayout(self.widget)  # Layout for scrollable content
+        self.vbox.setSpacing(0)  # No space between widgets
+        self.vbox.setContentsMargins(0, 0, 0, 0)  # No margins around the layout
+
+        self.widget.setStyleSheet("background-color: #2E3B5B;")
+
+        self.scroll.setWidgetResizable(True)
+        self.scroll.setWidget(self.widget)
+
+        # Scrollbar styling
+        self.scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.scroll.setStyleSheet("QScrollBar:vertical {background: #2E3B5B;}")
+
+        self.setWindowFlags(Qt.FramelessWindowHint)
+
+        # Initialize the network selection screen
+        self.interface_manager = InterfaceManager()
+        self.interface_manager.listed.connect(self.on_interfaces_listed)
+        self.showing_network_selection = False
+        self.network_selection_screen()
+
+        self.thread_manager = ThreadManager()
+        self.thread_manager.finished.connect(self.on_thread_finished)
+        self.thread_manager.cancelled.connect(self.on_thread_cancelled)
+
+        self.load_manager = LoadManager()
+        self.load_manager.progress.connect(self.on_load_progress)
+        self.load_manager.finished.connect(self.on_load_finished)
+        self.load_manager.failed.connect(self.on_load_failed)
+
+        # Flow changes from the capture (or a file being loaded), applied to the views a few times a second
+        self.flow_deltas = SSniffer_models.FlowDeltaPublisher(parent=self)
+        self.flow_deltas.changed.connect(self.on_flow_deltas)
+
+        # The stats panel refreshes on its own, DNS, nmap and the model keep working when no flow changes
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.refresh_live_labels)
+
+        self.option_window = None
+
+    def add_label(self, text, location, size):
+        label = QLabel(text, self.widget)  # Ensure parent is self.widget
+        label.setStyleSheet("color: white; background-color: #2E3B5B; font-size: 25px;")
+        self.vbox.addWidget(label)  # Add label to the QVBoxLayout
+        return label
+
+    @pyqtSlot()
+    def network_selection_screen(self):
+        # Get list of available networks, any number of them can be captured together. The interfaces found last
+        # time are shown straight away and the list is refreshed in the background.
+        self.selected_interfaces = []
+        interfaces = SSniffer_functions.cached_network_interfaces()
+        if interfaces is None:
+            interfaces = SSniffer_functions.list_network_interfaces()
+        else:
+            threading.Thread(target=self.refresh_network_interfaces, name="interfaces", daemon=True).start()
+        self.draw_network_selection(interfaces)
+
+    def draw_network_selection(self, interfaces):
+        # Remove previous widgets from the layout
+        for i in reversed(range(self.vbox.count())):
+            self.vbox.itemAt(i).widget().deleteLater()
+
+        self.selected_interfaces = [interface for interface in self.selected_interfaces if interface in interfaces]
+        self.showing_network_selection = True
+        self.network_buttons = {}
+
+        for idx, interface in enumerate(interfaces):
+            button = self.setup_buttons(interface,
+                                        partial(self.on_network_selected, interface), self.vbox)
+            self.network_buttons[interface] = button
+
+        self.start_button = self.setup_buttons("Select one or more interfaces", self.on_start_selected, self.vbox)
+        self.show_selected_interfaces()
+        # Applied by the kernel / capture engine, packets it rejects never reach Python
+        self.filter_field = QLineEdit(self.capture_filter, self.widget)
+        self.filter_field.setPlaceholderText("Capture filter (BPF), e.g. tcp port 80 or udp port 53")
+        self.filter_field.setStyleSheet(VIEW_STYLE)
+        self.filter_field.textChanged.connect(self.set_capture_filter)
+        self.vbox.addWidget(self.filter_field)
+        self.engine_button = self.setup_buttons(f"Capture engine: {self.capture_engine}", self.toggle_capture_engine,
+                                                self.vbox)
+        self.columns_button = self.setup_buttons(self.columns_button_text(), self.toggle_write_columns, self.vbox)
+
+    def columns_button_text(self):
+        return f"Write analysis columns: {'on' if self.write_columns else 'off'}"
+
+    @pyqtSlot()
+    def toggle_write_columns(self):
+        self.write_columns = not self.write_columns
+        self.columns_button.setText(self.columns_button_text())
+
+    def profiling_button_text(self):
+        return f"Profiling: {'on' if SSniffer_profiling.profiler.active else 'off'}"
+
+    @pyqtSlot()
+    def toggle_profiling(self):
+        # Profiles whatever runs, a capture included, until it is switched off again
+        if SSniffer_profiling.profiler.active:
+            paths = SSniffer_profiling.profiler.stop()
+            QMessageBox.information(self, "Profiling", "Profile written to:\n" + "\n".join(paths), QMessageBox.Ok)
+        else:
+            SSniffer_profiling.profiler.start()
+        if self.option_window is not None:
+            self.option_window.profiling_button.setText(self.profiling_button_text())
+
+    @pyqtSlot()
+    def toggle_capture_engine(self):
+        engines = SSniffer_functions.CAPTURE_ENGINES
+        self.capture_engine = engines[(engines.index(self.capture_engine) + 1) % len(engines)]
+        self.engine_button.setText(f"Capture engine: {self.capture_engine}")
+
+    @pyqtSlot()
+    def on_network_selected(self, interface):
+        # Clicking an interface selects it (or unselects it), the start button captures everything selected
+        if interface in self.selected_interfaces:
+            self.selected_interfaces.remove(interface)
+        else:
+            print(f"Selected Network Interface: {interface}")
+            self.selected_interfaces.append(interface)
+        self.show_selected_interfaces()
+
+    def show_selected_interfaces(self):
+        for name, button in self.network_buttons.items():
+            button.setText(f"✓ {name}" if name in self.selected_interfaces else name)
+        self.start_button.setText(f"Start capturing on {', '.join(self.selected_interfaces)}"
+                                  if self.selected_interfaces else "Select one or more interfaces")
+
+    def refresh_network_interfaces(self):
+        try:
+            self.interface_manager.listed.emit(SSniffer_functions.list_network_interfaces())
+        except Exception as e:
+            print(f"Could not list the network interfaces: {e}")
+
+    def on_interfaces_listed(self, interfaces):
+        # Only redrawn when the list changed and nobody has moved on to another screen meanwhile
+        if self.showing_network_selection and interfaces != list(self.network_buttons):
+            self.draw_network_selection(interfaces)
+
+    def set_capture_filter(self, text):
+        self.capture_filter = text.strip()
+
+    @pyqtSlot()
+    def on_start_selected(self):
+        if not self.selected_interfaces:
+            return
+        if self.capture_filter and self.capture_engine == "raw":
+            # pyshark hands the filter to tshark, which reports its own errors; ours are checked up front
+            try:
+                SSniffer_bpf.compile_filter(self.capture_filter)
+            except (SSniffer_bpf.FilterError, OSError) as e:
+                QMessageBox.warning(self, "Capture filter", f"The capture filter is not valid:\n{e}", QMessageBox.Ok)
+                return
+        self.start_packet_capture(list(self.selected_interfaces))
+
+    def start_packet_capture(self, interfaces):
+        if isinstance(interfaces, str):
+            interfaces = [interfaces]
+        self.stop_event.clear()
+        self.multi_capture = None
+        # Columns sit next to the capture file (or ring), the pipeline writes them as packets are classified
+        column_writer = None
+        if self.write_columns:
+            column_writer = SSniffer_columns.ColumnWriter(SSniffer_columns.columns_path(
+                SSniffer_functions.capture_file(engine=self.capture_engine)))
+        if len(interfaces) == 1:
+            self.as_is = SSniffer_store.PacketStore(SSniffer_functions.capture_file(engine=self.capture_engine),
+                                                    self.memory_budget,
+                                                    SSniffer_store.PACKET_OVERHEAD[self.capture_engine])
+            self.set_packet_details(SSniffer_flows.FlowTable(self.as_is), live=True)
+            self.pipeline = SSniffer_pipeline.CapturePipeline(self.packet_details, column_writer=column_writer)
+            self.capture_thread = threading.Thread(target=SSniffer_functions.capture_packets, name="capture",
+                                                   args=(interfaces[0], self.packet_details, self.stop_event,
+                                                         self.as_is, self.capture_engine, self.pipeline,
+                                                         self.capture_filter or None))
+        else:
+            # One capture thread and pcap file per interface, merged into one flow table by timestamp
+            self.set_packet_details(SSniffer_flows.FlowTable(), live=True)
+            self.pipeline = SSniffer_pipeline.CapturePipeline(self.packet_details, column_writer=column_writer)
+            self.multi_capture = SSniffer_timeline.MultiCapture(interfaces, self.packet_details, self.stop_event,
+                                                                self.capture_engine, self.memory_budget,
+                                                                self.pipeline, self.capture_filter or None)
+            self.as_is = self.multi_capture.packet_source
+            self.capture_thread = threading.Thread(target=self.multi_capture.run, name="capture")
+        self.capture_thread.start()
+
+        self.second_menu()
+
+    def second_menu(self):
+        self.update_ui()
+
+        # Suggestion 2: Add logging for key actions to improve traceability and debugging.
+        logging.info("Summary button clicked")
+
+        try:
+            summary_button = self.setup_buttons("Show all the packet transactions ", self.show_summary, self.vbox,
+                                                size=(1100, 50))
+        except Exception as e:
+            print(f"Error setting up summary button: {str(e)}")
+
+        try:
+            readable_button = self.setup_buttons("Show all the packet transactions that have readable payloads",
+                                                 self.show_only_readable, self.vbox, size=(1100, 50))
+        except Exception as e:
+            print(f"Error setting up readable button: {str(e)}")
+
+        try:
+            stop_button = self.setup_buttons("Stop Capturing packets without closing the program",
+                                             self.stop_packet_capture, self.vbox, size=(1100, 50))
+        except Exception as e:
+            print(f"Error setting up stop button: {str(e)}")
+
+    @pyqtSlot()
+    def show_only_readable(self):
+
+        # Clear current widgets from the layout
+        self.update_ui()
+        # Add label for the readable packets screen
+        headline = self.add_label(f"", (50, 50), (600, 40))
+        # Display only the readable packets, new ones show up while the capture runs
+        if self.packet_details or self.capture_thread:
+            view = self.add_flow_view(self.packet_details, SSniffer_flows.READABLE)
+            model = view.model()
+            self.add_live_label(lambda: "Readable Packets:" if model.rowCount() else "No readable packets found.",
+                                headline)
+            self.add_live_label(lambda: f"there are {model.rowCount()} groups of readable Packets")
+            self.add_group_buttons(SSniffer_flows.READABLE)
+        else:
+            self.add_label("No packets captured.", (50, 100), (600, 40))
+
+    def add_group_buttons(self, kind=None):
+        # The groups come from the flow table's grouping index, nothing is computed until a button is pressed
+        for group_by, text in GROUP_BUTTONS:
+            self.setup_buttons(text, partial(self.show_flow_groups, group_by, kind), self.vbox, size=(200, 40))
+
+    def show_flow_groups(self, group_by, kind=None):
+        self.update_ui()
+        groups = self.packet_details.group(group_by, kind) if self.packet_details else []
+
+        if groups:
+            # One row per group in a list that only draws (and resolves the names of) the rows on screen
+            model = SSniffer_models.FlowGroupListModel(group_by, groups, self)
+            view = QListView(self.widget)
+            view.setModel(model)
+            view.setUniformItemSizes(True)
+            view.setStyleSheet(VIEW_STYLE)
+            view.setMinimumHeight(350)
+            view.clicked.connect(lambda index: self.show_packets_in_order(model.group(index.row())))
+            self.vbox.addWidget(view)
+        else:
+            self.add_label("No packets to display.", (50, 100), (600, 40))
+
+    def show_packets_in_order(self, packet_list):
+        self.update_ui()
+        if packet_list:
+            keys = [key for key, _ in packet_list]
+            self.add_flow_view(self.packet_details, keys=keys)
+            self.setup_buttons("Export these flows to pcap", partial(self.export_flows, keys), self.vbox,
+                               size=(300, 40))
+        else:
+            self.add_label("No packets to display.", (50, 100), (600, 40))
+
+    @pyqtSlot()
+    def stop_packet_capture(self):
+        self.stop_event.set()
+        if self.capture_thread:
+            self.capture_thread.join()
+            self.capture_thread = None
+            # Index the finished capture so reopening it later is instant (a multi-interface capture has one
+            # file per interface, and a capture ring holds more than this session, so there is nothing to index)
+            capture_path = self.as_is.file_path
+            if self.multi_capture is None and not SSniffer_segments.is_catalog(capture_path):
+                SSniffer_functions.save_capture_index(capture_path, self.packet_details)
+        print("Packet capture stopped.")
+
+    def show_summary(self):
+        # Show the summary, it keeps itself up to date while the capture runs
+        self.update_ui()
+        self.add_group_buttons()
+
+        self.setup_buttons("Pipeline stats", self.show_stats, self.vbox, size=(200, 40))
+
+        if self.packet_details or self.capture_thread:
+            self.add_live_label(self.summary_text)
+            self.add_memory_label()
+            self.add_flow_view(self.packet_details)
+        else:
+            self.add_label("No packets captured yet.", (50, 100), (1100, 40))
+
+    def show_stats(self):
+        # Counters, queue depths, memory and stage latencies from SSniffer_metrics, refreshed every second
+        self.update_ui()
+        self.add_live_label(lambda: "\n".join(SSniffer_metrics.registry.summary()) or "No metrics yet.")
+        self.setup_buttons("Back to Summary", self.show_summary, self.vbox)
+        self.stats_timer.start(STATS_INTERVAL)
+
+    def summary_text(self):
+        return f"Summary of the network traffic there are {len(self.packet_details)} packet groups captured:"
+
+    def add_memory_label(self):
+        packet_source = self.packet_details.packet_source
+        if isinstance(packet_source, (SSniffer_store.PacketStore, SSniffer_timeline.MergedPacketSource)):
+            def memory_text():
+                stats = packet_source.stats()
+                return (f"{stats['packets']} packets captured, {stats['in_memory']} kept in memory "
+                        f"({stats['memory_bytes'] // (1024 * 1024)} MB), {stats['evicted_packets']} read back "
+                        f"from the capture file when needed")
+            self.add_live_label(memory_text)
+        if self.pipeline is not None and self.pipeline.packet_details is self.packet_details:
+            pipeline = self.pipeline
+            def pipeline_text():
+                stats = pipeline.stats()
+                return (f"{stats['packet_queue']} packets waiting for the classifiers, {stats['result_queue']} "
+                        f"batches waiting to be counted, {stats['dropped']} packets too many to classify")
+            self.add_live_label(pipeline_text)
+            if pipeline.column_writer is not None:
+                column_writer = pipeline.column_writer
+                def columns_text():
+                    stats = column_writer.stats()
+                    return (f"{stats['packet_rows']} packet rows and {stats['flows']} flows written to "
+                            f"{column_writer.directory}")
+                self.add_live_label(columns_text)
+        if self.multi_capture is not None and self.multi_capture.packet_details is self.packet_details:
+            multi_capture = self.multi_capture
+            def interfaces_text():
+                return "\n".join(f"{interface}: {stats['packets']} packets, {stats['packets_per_second']:.0f} "
+                                 f"packets/s, {stats['bytes_per_second'] / 1024:.0f} KB/s, {stats['dropped']} dropped"
+                                 for interface, stats in multi_capture.stats().items())
+            self.add_live_label(interfaces_text)
+
+    def add_live_label(self, text_function, label=None):
+        # A label whose text is recomputed whenever flow changes are applied
+        if label is None:
+            label = self.add_label("", (50, 50), (1100, 40))
+        label.setText(text_function())
+        self.live_labels.append((label, text_function))
+        return label
+
+    def set_packet_details(self, packet_details, live=False):
+        # Only the table on screen publishes its changes to the views
+        if self.packet_details is not None:
+            self.packet_details.remove_listener(self.flow_deltas.record)
+        self.packet_details = packet_details
+        if live:
+            packet_details.add_listener(self.flow_deltas.record)
+
+    @SSniffer_profiling.profiled
+    def on_flow_deltas(self, new_keys, changed_keys):
+        if self.flow_model is not None and self.flow_model.packet_details is self.packet_details:
+            self.flow_model.apply_deltas(new_keys, changed_keys)
+        self.refresh_live_labels()
+
+    def refresh_live_labels(self):
+        for label, text_function in self.live_labels:
+            label.setText(text_function())
+
+    def show_packet_details(self, key, record):
+        self.update_ui()  # Clear and prepare UI for new data
+        self.add_label(f"Details for {SSniffer_functions.flow_name(key)}:", (50, 50), (600, 40))
+
+        # The flow only remembers where its packets are, a packet is fetched when it is opened
+        readable_positions = record.positions(SSniffer_flows.READABLE)
+        encrypted_positions = record.positions(SSniffer_flows.ENCRYPTED)
+        self.list_packets(readable_positions, "Readable Packets", 100)
+        self.list_packets(encrypted_positions, "Encrypted Packets", 150 + len(readable_positions) * 50)
+
+        self.setup_buttons("Export this flow to pcap", partial(self.export_flows, [key]), self.vbox, size=(300, 40))
+        back_button = self.setup_buttons("Back to Summary", self.show_summary, self.vbox)
+
+    def list_packets(self, positions, title, start_y):
+        self.add_label(f"{title} ({len(positions)}):", (50, start_y), (600, 40))
+        if not len(positions):
+            return
+        # Rows are fetched a chunk at a time as the list scrolls, a packet is decoded only when it is opened
+        model = SSniffer_models.PacketListModel(positions, self)
+        view = QListView(self.widget)
+        view.setModel(model)
+        view.setUniformItemSizes(True)
+        view.setStyleSheet(VIEW_STYLE)
+        view.setMinimumHeight(200)
+        view.clicked.connect(lambda index: self.show_packet_at(model.position(index.row())))
+        self.vbox.addWidget(view)
+        return view
+
+    def add_flow_view(self, packet_details, kind=None, keys=None):
+        # A filter box and a table of flows that only draws the rows on screen; clicking a row opens the flow
+        model = SSniffer_models.FlowTableModel(packet_details, kind, keys, self)
+        filter_box = QLineEdit(self.widget)
+        filter_box.setPlaceholderText("Filter flows: host, src, dst, port, tcp, udp, iface, readable, encrypted, "
+                                      "not, or any text")
+        filter_box.setStyleSheet(VIEW_STYLE)
+        filter_box.textChanged.connect(model.set_filter)
+        self.vbox.addWidget(filter_box)
+
+        view = QTableView(self.widget)
+        view.setModel(model)
+        # The indicator has to be set first, enabling sorting sorts by whatever it shows
+        view.horizontalHeader().setSortIndicator(model.sort_column, model.sort_order)
+        view.setSortingEnabled(True)
+        view.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        view.verticalHeader().setDefaultSectionSize(30)
+        view.verticalHeader().hide()
+        view.setSelectionBehavior(QTableView.SelectRows)
+        view.setStyleSheet(VIEW_STYLE)
+        view.setMinimumHeight(350)
+        view.clicked.connect(lambda index: self.show_packet_details(*model.row(index.row())))
+        self.vbox.addWidget(view)
+        self.flow_model = model
+        return view
+
+    def show_packet_at(self, position):
+        self.show_individual_packet(self.packet_details.packet_source[position])
+
+    def show_individual_packet(self, packet):
+        self.update_ui()  # Clear and prepare UI for new data
+        self.display_packet_details(packet)
+        self.setup_buttons("Back to Packet Group", self.show_summary, self.vbox, size=(1100, 50))
+
+    def start_loading_bar(self, duration_ms):
+        self.loading_screen = LoadingScreen(duration_ms)
+        self.loading_screen.show()
+
+    def display_packet_details(self, packet):
+        self.start_loading_bar(0)
+
+        view = self.packet_view
+
+        # Starting the thread to process packet details
+        def thread_function():
+            try:
+                packet_details = SSniffer_functions.show_packet_content(packet)
+            except Exception as e:
+                packet_details = f"Error displaying packet details: {str(e)}"
+            if view != self.packet_view:
+                # The user moved on while we were waiting, don't drop this into whatever screen is open now
+                self.thread_manager.cancelled.emit()
+            else:
+                self.thread_manager.finished.emit(packet_details)  # Emit signal with the results
+
+        thread = threading.Thread(target=thread_function)
+        thread.start()
+
+    def on_thread_finished(self, packet_details):
+        # Close the loading screen and update the UI
+        self.loading_screen.close()
+        self.add_label(packet_details, (50, 100), (600, 40))
+        answer = QMessageBox.question(self, 'Save?',
+                                      "do you want to save the results?",
+                                      QMessageBox.Yes | QMessageBox.No,
+                                      QMessageBox.No)
+        if answer == QMessageBox.Yes:
+            self.save_spesific_packet(packet_details)
+
+    def on_thread_cancelled(self):
+        self.loading_screen.close()
+
+    def update_ui(self):
+        """Clear all widgets from the QVBoxLayout and prepare for new content."""
+        # Leaving the current screen, so stop waiting for the AI answer of a packet that is no longer shown
+        self.packet_view += 1
+        self.showing_network_selection = False
+        SSniffer_functions.cancel_pending_analyses()
+        self.stats_timer.stop()
+        # Every screen is rebuilt from here; while profiling, the rebuild is profiled until Qt is idle again
+        profile = SSniffer_profiling.profiler.begin()
+        if profile is not None:
+            QTimer.singleShot(0, partial(SSniffer_profiling.profiler.end, profile))
+        self.showing_loaded_summary = False
+        self.flow_model = None
+        self.live_labels = []
+        self.load_progress_label = None
+        while self.vbox.count():
+            widget = self.vbox.itemAt(0).widget()
+            if widget is not None:
+                self.vbox.removeWidget(widget)
+                widget.deleteLater()
+
+    def open_option_window(self):
+        self.option_window = OptionWindow(self)
+        self.option_window.move(200, 100)
+        self.option_window.show()
+
+    def load_packet_details(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        file_path, _ = QFileDialog.getOpenFileName(
+            None, "Load Packet Details", "", "PCAP Files (*.pcap *.pcapng);;Capture rings (*.segments.json);;All Files (*)",
+            options=options)
+        if not file_path:
+            return
+        self.cancel_loading()
+        self.load_stop_event = threading.Event()
+        stop_event = self.load_stop_event
+
+        # Read the file on a worker thread; the summary fills in as the flows come in
+        def thread_function():
+            def progress(packet_details, bytes_read, file_size, packets):
+                self.load_manager.progress.emit(packet_details, bytes_read, file_size, packets)
+
+            try:
+                if SSniffer_parallel.should_parallelize(file_path):
+                    # Big files are split across one process per core
+                    packet_details = SSniffer_parallel.parallel_packet_details(file_path, progress=progress,
+                                                                               stop_event=stop_event)
+                else:
+                    packet_details = SSniffer_functions.stream_packet_details(file_path, progress, stop_event,
+                                                                              progress_interval=1.0)
+                self.load_manager.finished.emit(packet_details)
+            except Exception as e:
+                self.load_manager.failed.emit(f"An error occurred while loading the file:\n{e}")
+
+        threading.Thread(target=thread_function, daemon=True).start()
+
+    def cancel_loading(self):
+        if self.load_stop_event is not None:
+            self.load_stop_event.set()
+
+    def on_load_progress(self, packet_details, bytes_read, file_size, packets):
+        if self.load_stop_event is None or self.load_stop_event.is_set():
+            return
+        if packet_details is not self.packet_details:
+            # First update: the file becomes the current table and its flows stream into the summary
+            self.display_loaded_packet_details(packet_details, (bytes_read, file_size, packets))
+        elif self.load_progress_label is not None:
+            self.load_progress_label.setText(self.load_progress_text(bytes_read, file_size, packets))
+
+    def load_progress_text(self, bytes_read, file_size, packets):
+        percent = 100 * bytes_read // file_size if file_size else 100
+        return (f"Loading {bytes_read // (1024 * 1024)} of {file_size // (1024 * 1024)} MB ({percent}%), "
+                f"{packets} packets so far")
+
+    def on_load_finished(self, packet_details):
+        self.load_stop_event = None
+        if packet_details is not None:
+            packet_details.remove_listener(self.flow_deltas.record)
+        if self.showing_loaded_summary or packet_details is not self.packet_details:
+            self.display_loaded_packet_details(packet_details)
+
+    def on_load_failed(self, message):
+        self.load_stop_event = None
+        QMessageBox.critical(self, "Load Error", message, QMessageBox.Ok)
+
+    def display_loaded_packet_details(self, packet_details, progress=None):
+        self.update_ui()
+        self.showing_loaded_summary = True
+        if packet_details is not None and packet_details is not self.packet_details:
+            # The flow views look packets up in self.packet_details, so the loaded file becomes the current capture.
+            # While it is still loading its new flows are published like a live capture's.
+            self.set_packet_details(packet_details, live=progress is not None)
+        if progress is not None:
+            self.load_progress_label = self.add_label(self.load_progress_text(*progress), (50, 50), (1100, 40))
+            self.setup_buttons("Cancel loading", self.cancel_loading, self.vbox, size=(200, 50))
+
+        self.add_group_buttons()
+
+        if self.packet_details or progress is not None:
+            self.add_live_label(self.summary_text)
+            self.add_flow_view(self.packet_details)
+        else:
+            self.add_label("No packets captured yet.", (50, 100), (1100, 40))
+
+    def save_gui(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        file_path, _ = QFileDialog.getSaveFileName(
+            None, "Save Packet Details", "", "PCAP Files (*.pcap);;All Files (*)", options=options)
+        return file_path
+    
+    def save_spesific_packet(self, text_to_save):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+
+        # Open the save file dialog
+        file_path, _ = QFileDialog.getSaveFileName(
+            None, "Save Text to File", "", "Text Files (*.txt);;All Files (*)", options=options)
+
+        # If the user provided a file path, write the text to that file
+        if file_path:
+            if not file_path.lower().endswith('.txt'):
+                file_path += '.txt'
+            try:
+                # Open the file in write mode
+                with open(file_path, 'w', encoding='utf-8') as file:
+                    file.write(text_to_save)
+                print(f"Text successfully written to {file_path}")
+            except Exception as e:
+                print(f"An error occurred while writing to the file: {e}")
+        else:
+            print("Save operation cancelled by the user.")
+
+
+    def save_packet_details(self):
+        
+        file_path = self.save_gui()
+        if not file_path:
+            print("Save operation cancelled by the user.")
+            return
+        # Ensure the file has a .pcap extension
+        if not file_path.lower().endswith('.pcap'):
+            file_path += '.pcap'
+        
+        # Whatever the shown packets were read from: the capture (or capture ring) or a loaded file
+        source_path = SSniffer_export.source_file(self.packet_details.packet_source) if self.packet_details else None
+        SSniffer_functions.save_packets_to_pcap(file_path, source_path)
+
+    def export_flows(self, keys):
+        # Writes only these flows' packets to a new pcap, copied from the capture without dissecting it again
+        file_path = self.save_gui()
+        if not file_path:
+            print("Export cancelled by the user.")
+            return
+        if not file_path.lower().endswith('.pcap'):
+            file_path += '.pcap'
+        try:
+            SSniffer_functions.export_flows_to_pcap(self.packet_details, keys, file_path)
+        except Exception as e:
+            QMessageBox.warning(self, "Export failed", str(e), QMessageBox.Ok)
+
+class ThreadManager(QObject):
+    finished = pyqtSignal(str, name='finished')  # Signal to notify when the thread is done
+    cancelled = pyqtSignal(name='cancelled')  # The user navigated away before the thread was done
+
+
+class InterfaceManager(QObject):
+    listed = pyqtSignal(object, name='listed')  # The network interfaces, listed on a worker thread
+
+
+class LoadManager(QObject):
+    progress = pyqtSignal(object, object, object, object, name='progress')  # Flows so far, bytes read, file size, packets
+    finished = pyqtSignal(object, name='finished')
+    failed = pyqtSignal(str, name='failed')
+
+
+class OptionWindow(BaseWindow):
+    def __init__(self, SniffWindow):
+        super().__init__("Options", "pictures\\options.png")
+        self.initUI(SniffWindow)
+
+    def initUI(self, SniffWindow):
+        WINDOW_LENGTH = 350
+        WINDOW_Hight = int((WINDOW_LENGTH * 800) / 1280) + 50
+        button_hight = int((WINDOW_Hight - 100) / 6)
+        self.setFixedSize(WINDOW_LENGTH, WINDOW_Hight + 40)
+        self.setup_buttons("", SniffWindow.show_summary, self.main_layout, size=(WINDOW_LENGTH, button_hight))
+        self.setup_buttons("", SniffWindow.show_only_readable, self.main_layout, size=(WINDOW_LENGTH, button_hight))
+        self.setup_buttons("", SniffWindow.network_selection_screen, self.main_layout,
+                           size=(WINDOW_LENGTH, button_hight))
+        self.setup_buttons("", SniffWindow.save_packet_details, self.main_layout, size=(WINDOW_LENGTH, button_hight))
+        self.setup_buttons("", SniffWindow.load_packet_details, self.main_layout,
+                           size=(WINDOW_LENGTH, button_hight + 40))
+        self.profiling_button = self.setup_buttons(SniffWindow.profiling_button_text(), SniffWindow.toggle_profiling,
+                                                   self.main_layout, size=(WINDOW_LENGTH, 40))
+
+        # close button
+        self.button = QPushButton("X", self)
+        self.button.setStyleSheet(
+            """color: #EED487 ;background-color: #2E3B5B; font-size: 14px;font-weight: 500;border: 0px solid white;}QPushButton:hover {
+                            background-color: rgba(255, 255, 255, 0.1); /* Slightly visible on hover */}""")
+        self.button.setFixedSize(20, 20)
+        self.button.move(WINDOW_LENGTH - 30, 10)
+        self.button.clicked.connect(exit)
+
+
+
+
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    sniff_window = SniffWindow()
+    # window = OptionWindow(sniff_window)
+    # window.show()
+
+    sys.exit(app.exec_())
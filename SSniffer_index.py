@@ -0,0 +1,167 @@
+import mmap
+import os
+import socket
+import struct
+import threading
+from array import array
+
+import SSniffer_flows
+import SSniffer_segments
+
+# Sidecar index written next to every pcap SSniffer captures or loads (<capture>.pcap.ssidx). It holds the flow
+# records (their positions carry the verdicts) and the byte offset of every packet, so reopening a capture only
+# maps the index instead of dissecting the whole file again. Packets are decoded from their offsets when a view asks for them.
+# The index remembers the size and modification time of its pcap and is ignored once the pcap changes.
+
+INDEX_SUFFIX = ".ssidx"
+INDEX_MAGIC = b"SSIDX\0\0\0"
+INDEX_VERSION = 2  # 1 also had a verdict byte per packet
+
+HEADER = struct.Struct("<8sIIQqQQQ")  # magic, version, padding, pcap size, pcap mtime, packets, flows, positions
+FLOW = struct.Struct("<16s16sHHBB2xQQQQddQ")  # src, dst, ports, proto, family, counters, first/last seen, start
+
+PROTOCOLS = {'TCP': 6, 'UDP': 17}
+PROTOCOL_NAMES = {number: name for name, number in PROTOCOLS.items()}
+
+
+def index_path(pcap_path):
+    return pcap_path + INDEX_SUFFIX
+
+
+def _pcap_signature(pcap_path):
+    stat = os.stat(pcap_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _pack_address(ip):
+    if ":" in ip:
+        return socket.inet_pton(socket.AF_INET6, ip), 6
+    return socket.inet_aton(ip), 4
+
+
+def _unpack_address(packed, family):
+    if family == 6:
+        return socket.inet_ntop(socket.AF_INET6, packed)
+    return socket.inet_ntoa(packed[:4])
+
+
+def write_index(pcap_path, packet_details, offsets):
+    # offsets: byte offset of every packet in the pcap, in capture order
+    packet_count = len(offsets)
+    flows = bytearray()
+    positions = array('I')
+    for key, record in packet_details.items():
+        src, family = _pack_address(key.src)
+        dst, _ = _pack_address(key.dst)
+        flows += FLOW.pack(src, dst, key.src_port, key.dst_port, PROTOCOLS.get(key.proto, 0), family,
+                           record.packets, record.bytes, record.readable, record.encrypted,
+                           float('nan') if record.first_seen is None else record.first_seen,
+                           float('nan') if record.last_seen is None else record.last_seen, len(positions))
+        positions.extend(record.readable_positions)
+        positions.extend(record.encrypted_positions)
+
+    pcap_size, pcap_mtime = _pcap_signature(pcap_path)
+    offsets = array('Q', offsets)
+    temporary_path = index_path(pcap_path) + ".tmp"
+    with open(temporary_path, 'wb') as index_file:
+        index_file.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, pcap_size, pcap_mtime, packet_count,
+                                     len(packet_details), len(positions)))
+        index_file.write(offsets.tobytes())
+        index_file.write(flows)
+        index_file.write(positions.tobytes())
+    # Replace the old index in one step so a crash never leaves a half written one behind
+    os.replace(temporary_path, index_path(pcap_path))
+    return index_path(pcap_path)
+
+
+class IndexedPacketSource:
+    # Packet source backed by the mapped index (or any offset array): packets are decoded from the pcap only
+    # when asked for
+    def __init__(self, pcap_path, index_map, offsets):
+        self.pcap_path = pcap_path
+        self.index_map = index_map
+        self.offsets = offsets
+        self.reader = None
+        self.lock = threading.Lock()
+        self.disk_reads = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self.offsets)
+        if not 0 <= position < len(self.offsets):
+            raise IndexError("packet position out of range")
+        with self.lock:
+            if self.reader is None:
+                self.reader = SSniffer_segments.open_reader(self.pcap_path)
+            self.disk_reads += 1
+            return self.reader.read_packet(self.offsets[position], number=position + 1)
+
+    def __iter__(self):
+        for position in range(len(self.offsets)):
+            yield self[position]
+
+    def offset(self, position):
+        return self.offsets[position]
+
+    def all_offsets(self):
+        return self.offsets
+
+    def close(self):
+        with self.lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+
+
+def load_index(pcap_path):
+    # Returns a FlowTable over an IndexedPacketSource, or None when there is no index or it is out of date
+    path = index_path(pcap_path)
+    try:
+        with open(path, 'rb') as index_file:
+            if os.fstat(index_file.fileno()).st_size < HEADER.size:
+                return None
+            index_map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    magic, version, _, pcap_size, pcap_mtime, packet_count, flow_count, position_count = HEADER.unpack_from(
+        index_map, 0)
+    try:
+        current_signature = _pcap_signature(pcap_path)
+    except OSError:
+        current_signature = None
+    expected_size = HEADER.size + packet_count * 8 + flow_count * FLOW.size + position_count * 4
+    if (magic != INDEX_MAGIC or version != INDEX_VERSION or current_signature != (pcap_size, pcap_mtime)
+            or len(index_map) != expected_size):
+        index_map.close()
+        return None
+
+    view = memoryview(index_map)
+    offset = HEADER.size
+    offsets = view[offset:offset + packet_count * 8].cast('Q')
+    offset += packet_count * 8
+    flows_start = offset
+    offset += flow_count * FLOW.size
+    positions = view[offset:offset + position_count * 4].cast('I')
+
+    packet_details = SSniffer_flows.FlowTable(IndexedPacketSource(pcap_path, index_map, offsets))
+    for flow_offset in range(flows_start, flows_start + flow_count * FLOW.size, FLOW.size):
+        (src, dst, src_port, dst_port, proto, family, packets, total_bytes, readable, encrypted, first_seen,
+         last_seen, start) = FLOW.unpack_from(index_map, flow_offset)
+        key = SSniffer_flows.FlowKey(_unpack_address(src, family), _unpack_address(dst, family), src_port, dst_port,
+                                     PROTOCOL_NAMES.get(proto, str(proto)))
+        record = SSniffer_flows.FlowRecord(key)
+        record.packets = packets
+        record.bytes = total_bytes
+        record.readable = readable
+        record.encrypted = encrypted
+        record.first_seen = None if first_seen != first_seen else first_seen  # nan means never seen
+        record.last_seen = None if last_seen != last_seen else last_seen
+        # Slices of the mapped file, nothing is copied until a view walks them
+        record.readable_positions = positions[start:start + readable]
+        record.encrypted_positions = positions[start + readable:start + readable + encrypted]
+        packet_details.insert(record)
+    return packet_details
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError
+
+import SSniffer_metrics
+
+# Payload analysis queue for the local LLM. Requests run on a bounded worker pool, identical prompts share
+# one request, and answers are kept in an on-disk cache keyed by the prompt's hash, so retransmissions,
+# heartbeats and repeated beacons are only ever sent to the model once.
+
+DEFAULT_MODEL = 'llama3'
+DEFAULT_CACHE_FILE = os.path.join("saveFiles", "SSniffer_llm_cache.sqlite3")
+
+METRICS = {
+    'hits': (SSniffer_metrics.COUNTER, "Payload analyses answered from the cache"),
+    'misses': (SSniffer_metrics.COUNTER, "Payload analyses not in the cache"),
+    'requests': (SSniffer_metrics.COUNTER, "Requests sent to the model"),
+    'in_flight': (SSniffer_metrics.GAUGE, "Payload analyses waiting for the model"),
+}
+
+
+class AnalysisQueue:
+    def __init__(self, model=DEFAULT_MODEL, host=None, max_workers=2, timeout=60, cache_file=DEFAULT_CACHE_FILE):
+        self.model = model
+        self.host = host
+        self.timeout = timeout
+        self.cache_file = cache_file
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self.in_flight = {}  # prompt hash -> Future
+        self.lock = threading.Lock()
+        self.db = None
+        self.client = None
+        # Bumped by cancel_pending, anyone still waiting on an older generation gives up
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+
+    def digest(self, prompt):
+        return hashlib.sha256(f"{self.model}\0{prompt}".encode('utf-8', errors='replace')).hexdigest()
+
+    def submit(self, prompt):
+        # Returns a Future with the model's answer; cached and in-flight prompts don't start a new request
+        digest = self.digest(prompt)
+        with self.lock:
+            answer = self._cached(digest)
+            if answer is not None:
+                self.hits += 1
+                future = Future()
+                future.set_result(answer)
+                return future
+            future = self.in_flight.get(digest)
+            if future is not None and not future.cancelled():
+                self.hits += 1
+                return future
+            self.misses += 1
+            future = self.executor.submit(self._generate, digest, prompt)
+            self.in_flight[digest] = future
+        future.add_done_callback(lambda _: self._forget(digest, future))
+        return future
+
+    def ask(self, prompt, timeout=None):
+        # Blocking helper: the answer, or a short explanation when it timed out or the user moved on
+        timeout = self.timeout if timeout is None else timeout
+        generation = self.generation
+        future = self.submit(prompt)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return future.result(timeout=0.2)
+            except TimeoutError:
+                if generation != self.generation:
+                    return "analysis cancelled"
+                if time.monotonic() > deadline:
+                    return f"the ai did not answer within {timeout} seconds"
+            except CancelledError:
+                return "analysis cancelled"
+            except Exception as e:
+                return f"the ai could not be reached: {e}"
+
+    def cancel_pending(self):
+        # Called when the user navigates away: queued requests are dropped and waiters stop waiting.
+        # A request the model is already working on still finishes and lands in the cache.
+        with self.lock:
+            self.generation += 1
+            futures = list(self.in_flight.values())
+        # Outside the lock: cancel() runs _forget, which takes it
+        for future in futures:
+            future.cancel()
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'requests': self.requests,
+                    'in_flight': len(self.in_flight)}
+
+    def _forget(self, digest, future):
+        with self.lock:
+            if self.in_flight.get(digest) is future:
+                del self.in_flight[digest]
+
+    def _generate(self, digest, prompt):
+        if self.client is None:
+            import ollama
+            self.client = ollama.Client(host=self.host, timeout=self.timeout)
+        with self.lock:
+            self.requests += 1
+        with SSniffer_metrics.STAGE_SECONDS.time('llm'):
+            response = self.client.generate(model=self.model, prompt=prompt)
+        answer = response['response']
+        with self.lock:
+            self._store(digest, answer)
+        return answer
+
+    def _open(self):
+        if self.db is None:
+            directory = os.path.dirname(self.cache_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.db = sqlite3.connect(self.cache_file, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS answers (digest TEXT PRIMARY KEY, answer TEXT, created REAL)")
+        return self.db
+
+    def _cached(self, digest):
+        try:
+            row = self._open().execute("SELECT answer FROM answers WHERE digest = ?", (digest,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"LLM cache unavailable: {e}")
+            return None
+        return row[0] if row else None
+
+    def _store(self, digest, answer):
+        try:
+            self._open().execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?)", (digest, answer, time.time()))
+            self.db.commit()
+        except sqlite3.Error as e:
+            print(f"LLM cache unavailable: {e}")
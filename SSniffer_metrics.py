@@ -0,0 +1,277 @@
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Metrics for finding out where SSniffer falls behind. Stage latencies (classifying, DNS, nmap, the LLM) are timed
+# where the work happens and kept in fixed bucket histograms. Counts, queue depths and memory are not counted a
+# second time: the parts already keep them in their stats(), and those are read when the metrics are rendered.
+# render() gives the Prometheus text format, which serve() answers over HTTP and MetricsFileWriter writes to a
+# file (for node_exporter's textfile collector) when SSniffer runs headless. summary() is the same numbers as
+# readable lines for the stats panel.
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                   120.0)  # Seconds, from a classifier batch up to a slow nmap scan
+DEFAULT_PORT = 9464
+DEFAULT_WRITE_INTERVAL = 15  # Seconds between writes of the metrics file
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def ratio(part, other):
+    # part / (part + other), 0 before anything was counted
+    total = part + other
+    return part / total if total else 0.0
+
+
+class Histogram:
+    # One histogram per label value (the stage), all with the same buckets
+    def __init__(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.series = {}  # Label value -> [bucket counts with +Inf last, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect.bisect_left(self.buckets, value)  # Buckets count values up to and including their bound
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, label_value):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - started)
+
+    def snapshot(self):
+        # {label value: (bucket counts, sum)}
+        with self.lock:
+            return {label_value: (list(counts), total) for label_value, (counts, total) in self.series.items()}
+
+    def quantile(self, counts, q):
+        # Estimated from the buckets, interpolating inside the one the quantile falls in
+        count = sum(counts)
+        if not count:
+            return float('nan')
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]  # Beyond the last bound, all that is known is that it is bigger
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels({self.label: label_value, 'le': _format_value(float(bound))})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels({self.label: label_value})
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms = []
+        self.collectors = {}  # Name -> function returning (metric, type, help, labels, value) samples
+        self.lock = threading.Lock()
+
+    def histogram(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        histogram = Histogram(name, help_text, label, buckets)
+        with self.lock:
+            self.histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, name, function):
+        # A collector under the same name is replaced, e.g. the pipeline of the previous capture by the next one
+        with self.lock:
+            self.collectors[name] = function
+
+    def remove_collector(self, name):
+        with self.lock:
+            self.collectors.pop(name, None)
+
+    def add_stats(self, name, stats_function, prefix, metrics, label=None):
+        # Publishes a stats() dict. metrics maps a stats key (or a new name) to (type, help) or (type, help,
+        # function of the stats dict). With a label, stats_function returns {label value: stats dict}.
+        def collect():
+            stats = stats_function()
+            per_label = stats.items() if label is not None else [(None, stats)]
+            samples = []
+            for label_value, values in per_label:
+                labels = {label: label_value} if label is not None else {}
+                for key, (kind, help_text, *function) in metrics.items():
+                    value = function[0](values) if function else values.get(key)
+                    if value is None:
+                        continue
+                    metric = f"{prefix}_{key}_total" if kind == COUNTER else f"{prefix}_{key}"
+                    samples.append((metric, kind, help_text, labels, value))
+            return samples
+        self.add_collector(name, collect)
+
+    def samples(self):
+        with self.lock:
+            collectors = list(self.collectors.items())
+        samples = []
+        for name, function in collectors:
+            try:
+                samples.extend(function())
+            except Exception as e:
+                print(f"Metrics from {name} unavailable: {e}")
+        return samples
+
+    def render(self):
+        # Prometheus text exposition format
+        families = {}
+        for metric, kind, help_text, labels, value in self.samples():
+            family = families.setdefault(metric, (kind, help_text, []))
+            family[2].append((labels, value))
+        lines = []
+        for metric, (kind, help_text, values) in families.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(f"{metric}{_format_labels(labels)} {_format_value(value)}" for labels, value in values)
+        with self.lock:
+            histograms = list(self.histograms)
+        for histogram in histograms:
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        # The same numbers as readable lines: "<help>: <value>" and one line per timed stage
+        lines = []
+        for metric, kind, help_text, labels, value in self.samples():
+            where = f" ({', '.join(str(label_value) for label_value in labels.values())})" if labels else ""
+            shown = f"{value:.2f}" if isinstance(value, float) else str(value)
+            lines.append(f"{help_text}{where}: {shown}")
+        with self.lock:
+            histograms = list(self.histograms)
+        for histogram in histograms:
+            for label_value, (counts, total) in sorted(histogram.snapshot().items()):
+                count = sum(counts)
+                lines.append(f"{label_value}: {count} timed, average {1000 * total / count:.1f} ms, "
+                             f"p50 {1000 * histogram.quantile(counts, 0.5):.1f} ms, "
+                             f"p95 {1000 * histogram.quantile(counts, 0.95):.1f} ms")
+        return lines
+
+    def write(self, path):
+        # Written next to the target and renamed over it, so a reader never sees half a file
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(temporary_path, path)
+        return path
+
+
+registry = MetricsRegistry()
+STAGE_SECONDS = registry.histogram('ssniffer_stage_seconds', "Time spent in each processing stage", 'stage')
+
+
+def process_samples():
+    samples = [('ssniffer_threads', GAUGE, "Threads running", {}, threading.active_count())]
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        samples.append(('ssniffer_resident_memory_bytes', GAUGE, "Memory in use by SSniffer", {}, memory.rss))
+    except Exception:
+        pass  # Without psutil there is no memory figure
+    return samples
+
+
+registry.add_collector('process', process_samples)
+
+
+def serve(port=DEFAULT_PORT, host="127.0.0.1"):
+    # Answers /metrics on a background thread; call shutdown() on the returned server to stop it.
+    # http.server pulls in half the email package, so it is only imported when metrics are served.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would drown the console
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+class MetricsFileWriter:
+    # Rewrites the metrics file every interval seconds until stopped, and once more when stopping
+    def __init__(self, path, interval=DEFAULT_WRITE_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            stopping = self.stop_event.is_set()
+            try:
+                registry.write(self.path)
+            except OSError as e:
+                print(f"Could not write the metrics to {self.path}: {e}")
+            if stopping:
+                return
+            self.stop_event.wait(self.interval)
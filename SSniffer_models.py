@@ -0,0 +1,250 @@
+import threading
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QAbstractListModel, QModelIndex, QObject, QTimer, pyqtSignal
+
+import SSniffer_flows
+import SSniffer_functions
+
+# Qt item models for the flow and packet lists. The views only ask for the rows that are on screen, so a capture
+# with 100k flows or a flow with 100k packets costs one view widget instead of one button per row.
+
+FLOW_COLUMNS = ("Flow", "Readable", "Encrypted", "Packets", "Bytes", "Interfaces")
+PACKET_FETCH_SIZE = 1000  # Packet rows handed to the view per fetchMore
+GROUP_FETCH_SIZE = 1000  # Group rows handed to the view per fetchMore
+FRAME_INTERVAL_MS = 100  # Live views are updated at most ten times a second
+
+# Old summary order: busiest flows first (every packet of a flow is either readable or encrypted)
+DEFAULT_SORT_COLUMN = 3
+DEFAULT_SORT_ORDER = Qt.DescendingOrder
+
+
+def _interfaces(record):
+    return ", ".join(record.interfaces) if record.interfaces else ""
+
+
+# Each column sorts by what it shows
+SORT_KEYS = (
+    lambda key, record: SSniffer_functions.flow_name(key),
+    lambda key, record: record.readable,
+    lambda key, record: record.encrypted,
+    lambda key, record: record.packets,
+    lambda key, record: record.bytes,
+    lambda key, record: _interfaces(record),
+)
+
+
+class FlowTableModel(QAbstractTableModel):
+    # Rows are flows of a FlowTable: all of them, only those with packets of one kind, or a fixed list of keys
+    def __init__(self, packet_details, kind=None, keys=None, parent=None):
+        super().__init__(parent)
+        self.packet_details = packet_details
+        self.kind = kind
+        self.fixed_keys = keys
+        self.fixed_key_set = set(keys) if keys is not None else None
+        self.flow_filter = None
+        self.sort_column = DEFAULT_SORT_COLUMN
+        self.sort_order = DEFAULT_SORT_ORDER
+        self.rows = []
+        self.row_of = {}  # key -> row
+        self._build_rows()
+
+    def _accepts(self, key, record):
+        if record is None or (self.kind is not None and not getattr(record, self.kind)):
+            return False
+        return self.flow_filter is None or self.flow_filter(key, record)
+
+    def _build_rows(self):
+        keys = self.fixed_keys if self.fixed_keys is not None else self.packet_details.keys()
+        rows = []
+        for key in keys:
+            record = self.packet_details.get(key)
+            if self._accepts(key, record):
+                rows.append((key, record))
+        sort_key = SORT_KEYS[self.sort_column]
+        rows.sort(key=lambda row: sort_key(*row), reverse=self.sort_order == Qt.DescendingOrder)
+        self.rows = rows
+        self.row_of = {key: row for row, (key, _) in enumerate(rows)}
+
+    def refresh(self):
+        # Picks up flows added since the last refresh, counters of existing rows are live anyway
+        self.beginResetModel()
+        self._build_rows()
+        self.endResetModel()
+
+    def apply_deltas(self, new_keys, changed_keys):
+        # Live update without re-sorting: flows that just showed up (or just started matching) are added at the
+        # bottom, rows whose counters changed are repainted. Sorting again puts everything in order.
+        appended = []
+        for key in list(new_keys) + [key for key in changed_keys if key not in self.row_of]:
+            if key in self.row_of or (self.fixed_key_set is not None and key not in self.fixed_key_set):
+                continue
+            record = self.packet_details.get(key)
+            if self._accepts(key, record):
+                self.row_of[key] = len(self.rows) + len(appended)
+                appended.append((key, record))
+        changed_rows = [self.row_of[key] for key in changed_keys if key in self.row_of]
+        if appended:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(appended) - 1)
+            self.rows.extend(appended)
+            self.endInsertRows()
+        if changed_rows:
+            self.dataChanged.emit(self.index(min(changed_rows), 1),
+                                  self.index(max(changed_rows), len(FLOW_COLUMNS) - 1))
+
+    def set_filter(self, text):
+        # See SSniffer_flows.parse_flow_filter; a half typed filter that doesn't parse yet keeps the old one
+        try:
+            self.flow_filter = SSniffer_flows.parse_flow_filter(text, SSniffer_functions.flow_name)
+        except ValueError:
+            return
+        self.refresh()
+
+    def row(self, row):
+        return self.rows[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(FLOW_COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.TextAlignmentRole):
+            return None
+        key, record = self.rows[index.row()]
+        column = index.column()
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignLeft | Qt.AlignVCenter) if column == 0 else int(Qt.AlignRight | Qt.AlignVCenter)
+        if column == 0:
+            return SSniffer_functions.flow_name(key)
+        if column == 5:
+            return _interfaces(record)
+        return (None, record.readable, record.encrypted, record.packets, record.bytes)[column]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return FLOW_COLUMNS[section]
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.refresh()
+
+
+class PacketListModel(QAbstractListModel):
+    # Rows are packet positions; they are handed to the view a chunk at a time as it scrolls down
+    def __init__(self, positions, parent=None):
+        super().__init__(parent)
+        self.positions = positions
+        self.loaded = min(len(positions), PACKET_FETCH_SIZE)
+
+    def position(self, row):
+        return self.positions[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        return f"Packet {index.row() + 1} (#{self.positions[index.row()] + 1} in the capture)"
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.positions)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(PACKET_FETCH_SIZE, len(self.positions) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+
+class FlowGroupListModel(QAbstractListModel):
+    # Rows are (value, [(key, record)]) from FlowTable.group; a group's name is only looked up when its row is drawn
+    def __init__(self, group_by, groups, parent=None):
+        super().__init__(parent)
+        self.group_by = group_by
+        self.groups = groups
+        self.loaded = min(len(groups), GROUP_FETCH_SIZE)
+
+    def group(self, row):
+        return self.groups[row][1]
+
+    def name(self, row):
+        # Not cached: a host name shows up once its background lookup is done
+        value = self.groups[row][0]
+        try:
+            return SSniffer_functions.group_name(self.group_by, value)
+        except Exception as e:
+            print(f"Error resolving {value}: {e}")
+            return f"{value} which is Unknown"
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        row = index.row()
+        return f"there are {len(self.groups[row][1])} packet groups that involves:\n {self.name(row)}"
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.groups)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(GROUP_FETCH_SIZE, len(self.groups) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+
+class FlowDeltaPublisher(QObject):
+    # Collects flow changes from the capture thread and hands them to the GUI thread in batches: the first change
+    # after a quiet period starts a timer, and everything that changed until it fires is sent as one delta
+    pending = pyqtSignal()
+    changed = pyqtSignal(object, object)  # New keys in the order they appeared, keys whose counters changed
+
+    def __init__(self, interval_ms=FRAME_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.lock = threading.Lock()
+        self.new_keys = {}
+        self.changed_keys = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.flush)
+        # Emitted from the capture thread, so this is a queued connection into the GUI thread
+        self.pending.connect(self._schedule)
+
+    def record(self, key, new):
+        # FlowTable listener, runs on whatever thread changed the table
+        with self.lock:
+            first = not self.new_keys and not self.changed_keys
+            if new:
+                self.new_keys[key] = None
+            else:
+                self.changed_keys.add(key)
+        if first:
+            self.pending.emit()
+
+    def _schedule(self):
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            new_keys, changed_keys = list(self.new_keys), self.changed_keys
+            self.new_keys = {}
+            self.changed_keys = set()
+        changed_keys.difference_update(new_keys)
+        if new_keys or changed_keys:
+            self.changed.emit(new_keys, changed_keys)
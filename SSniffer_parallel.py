@@ -0,0 +1,284 @@
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import SSniffer_capture
+import SSniffer_flows
+import SSniffer_functions
+import SSniffer_index
+import SSniffer_reassembly
+import SSniffer_segments
+
+# Parallel ingestion of big pcap files. The file is cut into record-aligned byte ranges, every range is parsed,
+# reassembled and classified in its own process, and the partial flow tables are merged back in file order.
+# Only the TCP streams running over a shard edge come back packet by packet, to be stitched in one reassembler,
+# so the result is what the serial loader (stream_packet_details) builds.
+
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024  # Smaller files load faster than the process pool starts
+SHARDS_PER_WORKER = 4  # More shards than workers so one slow shard doesn't hold everything up
+
+
+def should_parallelize(file_path):
+    if SSniffer_segments.is_catalog(file_path):
+        return False  # A capture ring is read segment by segment
+    try:
+        return (os.cpu_count() or 1) > 1 and os.path.getsize(file_path) >= PARALLEL_MIN_BYTES
+    except OSError:
+        return False
+
+
+def plan_shards(file_path, shard_count):
+    # Walks the record headers only and returns [(start offset, end offset, first packet position), ...]
+    reader = SSniffer_capture.PcapReader(file_path)
+    try:
+        file_size = reader.size()
+        data_size = max(file_size - reader.data_start, 1)
+        shards = []
+        start, first_position = None, 0
+        position = 0
+        for offset in reader.record_offsets():
+            if start is None:
+                start = offset
+            elif offset - reader.data_start >= data_size * (len(shards) + 1) // shard_count:
+                shards.append((start, offset, first_position))
+                start, first_position = offset, position
+            position += 1
+        if start is not None:
+            shards.append((start, file_size, first_position))
+        return shards
+    finally:
+        reader.close()
+
+
+class ShardEdges:
+    # Picks out the packets of a shard whose verdict depends on the shards before. Until a flow's stream surely
+    # starts over (a SYN, a FIN or RST, a pause of IDLE_TIMEOUT) its packets may belong to a stream, or take a
+    # verdict, from earlier on: they go back to the parent as entries, and the worker only classifies what follows.
+    # Past MAX_WAITING_PACKETS such packets the stream can't be taking data any more, so the rest of them only need
+    # its verdict and go back as one following record (every packet filled in as encrypted until then).
+    def __init__(self, first_position):
+        self.first_position = first_position
+        self.entries = []  # For the parent, in file order per flow: packet entries, (position, key) where the
+        # stream so far ends, (position, key, record) following records
+        self.settled = set()
+        self.heads = {}  # FlowKey -> [entries sent, last position, last timestamp, following record]
+
+    def split(self, entries):
+        # Returns the entries the worker classifies itself
+        mine = []
+        for entry in entries:
+            key = entry[1]
+            if len(entry) == 6 or key in self.settled:
+                mine.append(entry)
+            elif len(entry) == 4:
+                self.entries.append(entry)  # A SYN, FIN or RST without data ends the stream in the parent too
+                self._settle(key, False)
+            elif not self._head(entry):
+                mine.append(entry)
+        return mine
+
+    def _head(self, entry):
+        # False when the packet starts the flow over, and so is the worker's
+        position, key, length, timestamp, seq, flags, payload, payload_length = entry
+        head = self.heads.get(key)
+        if flags & SSniffer_reassembly.SYN or (head is not None and
+                                               timestamp - head[2] > SSniffer_reassembly.IDLE_TIMEOUT):
+            self._settle(key, True)
+            return False
+        if head is None:
+            head = self.heads[key] = [0, position, timestamp, None]
+        closing = flags & (SSniffer_reassembly.FIN | SSniffer_reassembly.RST)
+        if head[0] < SSniffer_reassembly.MAX_WAITING_PACKETS:
+            self.entries.append(entry)
+            head[0] += 1
+        elif closing:
+            self.entries.append(entry[:6] + (b"", 0))
+        else:
+            if head[3] is None:
+                head[3] = SSniffer_flows.FlowRecord(key)
+                self.entries.append((position, key, head[3]))
+            head[3].add(position, length, timestamp, False)
+        head[1], head[2] = position, timestamp
+        if closing:
+            self._settle(key, False)
+        return True
+
+    def _settle(self, key, end):
+        head = self.heads.pop(key, None)
+        if end:
+            self.entries.append((self.first_position - 1 if head is None else head[1], key))
+        self.settled.add(key)
+
+
+def _add_entries(packet_details, reassembler, entries):
+    # The worker's part: entries are the reassembler's items, so the streams still waiting at the end can be sent on
+    for entry in entries:
+        if len(entry) == 6:
+            reassembler.add_classified(entry, entry[4], entry[5])
+        elif len(entry) == 4:
+            reassembler.control(entry[1], entry[3], entry[2])
+        else:
+            position, key, length, timestamp, seq, flags, payload, payload_length = entry
+            reassembler.add(key, seq, flags, payload, timestamp, entry, payload_length)
+    for entry, readable, _ in reassembler.take():
+        packet_details.add(entry[1], entry[0], entry[2], entry[3], readable)
+
+
+def ingest_shard(file_path, start, end, first_position, batch_size=1024):
+    # Runs in a worker process: parses one byte range and returns its flows, its packet offsets, the entries the
+    # parent reassembles (ShardEdges, then the streams still waiting at the end) and the verdicts that carry on
+    reader = SSniffer_capture.PcapReader(file_path)
+    packet_details = SSniffer_flows.FlowTable()
+    offsets = array('Q')
+    reassembler = SSniffer_reassembly.StreamReassembler(ordered=True)
+    edges = ShardEdges(first_position)
+    batch = []
+    position = first_position
+    try:
+        for offset, timestamp, frame, original_length, linktype in reader.records(start):
+            if offset >= end:
+                break
+            offsets.append(offset)
+            packet = SSniffer_capture.decode_frame(frame, timestamp, position + 1, original_length, linktype=linktype)
+            payload = SSniffer_functions.classifiable_payload(packet)
+            if payload is not None:
+                batch.append((position, packet, payload))
+            if len(batch) >= batch_size:
+                _add_entries(packet_details, reassembler, edges.split(SSniffer_functions.packet_entries(batch)))
+                batch = []
+            position += 1
+        _add_entries(packet_details, reassembler, edges.split(SSniffer_functions.packet_entries(batch)))
+    finally:
+        reader.close()
+    entries = edges.entries
+    for key, waiting in reassembler.unfinished():
+        entries.extend(waiting)
+    _add_entries(packet_details, reassembler, [])
+    return packet_details.flows, offsets, entries, reassembler.remembered()
+
+
+def _stitch(packet_details, reassembler, flows, entries, verdicts):
+    # Puts a shard's edge entries through the parent's reassembler, each of its flows in the place of its first
+    # packet, so flows are added in the order the serial loader adds them
+    events = [(entry[0], 0, entry) for entry in entries]
+    for record in flows.values():
+        events.append((min(record.readable_positions[:1] + record.encrypted_positions[:1]), 1, record))
+    events.sort(key=lambda event: event[:2])
+    for _, merged, entry in events:
+        if merged:
+            reassembler.add_classified(entry, None, None)
+        elif len(entry) == 2:
+            reassembler.end(entry[1])
+        elif len(entry) == 3:
+            record = entry[2]
+            reassembler.add_following(entry[1], record, record.first_seen, record.last_seen)
+        elif len(entry) == 4:
+            reassembler.control(entry[1], entry[3], entry[2])
+        else:
+            position, key, length, timestamp, seq, flags, payload, payload_length = entry
+            reassembler.add(key, seq, flags, payload, timestamp, entry[:4], payload_length)
+    for key, (verdict, last_seen) in verdicts.items():
+        reassembler.remember(key, verdict, last_seen)
+    _apply(packet_details, reassembler.take())
+
+
+def _apply(packet_details, rows):
+    for item, readable, _ in rows:
+        if not isinstance(item, SSniffer_flows.FlowRecord):
+            position, key, length, timestamp = item
+            packet_details.add(key, position, length, timestamp, readable)
+            continue
+        if readable:
+            # A following record, filled in as encrypted
+            item.readable, item.encrypted = item.encrypted, 0
+            item.readable_positions, item.encrypted_positions = item.encrypted_positions, array('I')
+        packet_details.merge_record(item)
+
+
+def parallel_packet_details(file_path, workers=None, progress=None, stop_event=None, batch_size=1024):
+    # Same contract as SSniffer_functions.stream_packet_details, progress is reported as shards are merged
+    packet_details = SSniffer_index.load_index(file_path)
+    if packet_details is not None:
+        if progress is not None:
+            file_size = os.path.getsize(file_path)
+            progress(packet_details, file_size, file_size, len(packet_details.packet_source))
+        return packet_details
+
+    workers = workers or os.cpu_count() or 1
+    file_size = os.path.getsize(file_path)
+    shards = plan_shards(file_path, workers * SHARDS_PER_WORKER)
+    offsets = array('Q')
+    packet_details = SSniffer_flows.FlowTable(SSniffer_index.IndexedPacketSource(file_path, None, offsets))
+    reassembler = SSniffer_reassembly.StreamReassembler(ordered=True)
+    stopped = False
+
+    # No with block: leaving it waits for every shard, and a stopped load returns as soon as the queued shards are
+    # cancelled (the running ones finish in the background)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(ingest_shard, file_path, *shard, batch_size): number
+                   for number, shard in enumerate(shards)}
+        finished = {}
+        next_shard = 0
+        for future in as_completed(futures):
+            if stop_event is not None and stop_event.is_set():
+                stopped = True
+                for waiting in futures:
+                    waiting.cancel()
+                break
+            finished[futures[future]] = future.result()
+            # Merge strictly in file order, so flow order, packet positions and verdicts match the serial loader
+            while next_shard in finished:
+                flows, shard_offsets, entries, verdicts = finished.pop(next_shard)
+                offsets.extend(shard_offsets)
+                _stitch(packet_details, reassembler, flows, entries, verdicts)
+                next_shard += 1
+            if progress is not None and next_shard:
+                progress(packet_details, shards[next_shard - 1][1], file_size, len(offsets))
+    finally:
+        pool.shutdown(wait=not stopped)
+
+    if not stopped:
+        _apply(packet_details, reassembler.finish())
+    resolver = SSniffer_functions.get_resolver()
+    for key in packet_details.keys():
+        resolver.prefetch(key.src)
+        resolver.prefetch(key.dst)
+    if not stopped:
+        SSniffer_functions.save_capture_index(file_path, packet_details)
+    return packet_details
+
+
+def measure_scaling(file_path, worker_counts=None):
+    # Times the serial loader against the process pool; the index is removed first so every run parses
+    worker_counts = worker_counts or sorted({1, 2, 4, os.cpu_count() or 1})
+    results = {}
+
+    def run(loader):
+        try:
+            os.remove(SSniffer_index.index_path(file_path))
+        except FileNotFoundError:
+            pass
+        start = time.perf_counter()
+        packet_details = loader()
+        return time.perf_counter() - start, packet_details
+
+    serial_time, serial = run(lambda: SSniffer_functions.stream_packet_details(file_path))
+    results['serial'] = serial_time
+    expected = [(key, record.readable, record.encrypted, list(record.readable_positions),
+                 list(record.encrypted_positions)) for key, record in serial.items()]
+    for workers in worker_counts:
+        elapsed, packet_details = run(lambda: parallel_packet_details(file_path, workers))
+        got = [(key, record.readable, record.encrypted, list(record.readable_positions),
+                list(record.encrypted_positions)) for key, record in packet_details.items()]
+        if got != expected:
+            raise AssertionError(f"{workers} workers built a different flow table than the serial loader")
+        results[workers] = elapsed
+        print(f"{workers} workers: {elapsed:.2f}s ({serial_time / elapsed:.2f}x the serial loader)")
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    measure_scaling(sys.argv[1])
@@ -0,0 +1,246 @@
+import queue
+import threading
+
+import SSniffer_classifier
+import SSniffer_functions
+import SSniffer_metrics
+import SSniffer_reassembly
+import SSniffer_store
+
+# Live capture pipeline: capture -> packet queue -> classifier workers -> result queue -> aggregator -> FlowTable.
+# The aggregator is the only thread that writes the flow table, and it applies the batches in capture order.
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 10000  # Packets waiting for a classifier
+DEFAULT_BATCH_SIZE = 256  # Packets a classifier takes in one go
+REASSEMBLY_TICK = 1.0  # Seconds the aggregator waits for results before it looks for idle streams
+
+METRICS = {
+    'captured': (SSniffer_metrics.COUNTER, "Packets seen by the capture"),
+    'dropped': (SSniffer_metrics.COUNTER, "Packets the classifiers had no room for"),
+    'parsed': (SSniffer_metrics.COUNTER, "Packets with an IP payload to classify"),
+    'classified': (SSniffer_metrics.COUNTER, "Packets through the classifiers"),
+    'aggregated': (SSniffer_metrics.COUNTER, "Packets counted in the flow table"),
+    'errors': (SSniffer_metrics.COUNTER, "Packets that could not be read"),
+    'packet_queue': (SSniffer_metrics.GAUGE, "Packets waiting for a classifier"),
+    'result_queue': (SSniffer_metrics.GAUGE, "Batches waiting for the aggregator"),
+    'reorder': (SSniffer_metrics.GAUGE, "Batches waiting for an earlier batch"),
+}
+
+
+class CapturePipeline:
+    def __init__(self, packet_details, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE, column_writer=None, reassemble=True):
+        self.packet_details = packet_details
+        self.column_writer = column_writer  # SSniffer_columns: gets every packet's row, and the flows on close()
+        self.reassembler = SSniffer_reassembly.StreamReassembler() if reassemble else None  # Aggregator only
+        self.workers = workers
+        self.batch_size = batch_size
+
+        self.packet_queue = queue.Queue(maxsize=queue_size)  # (position, packet, interface), None stops a worker
+        # (batch number, results, TCP segments waiting for their stream's verdict)
+        self.result_queue = queue.Queue(maxsize=max(4, queue_size // batch_size))
+        self.take_lock = threading.Lock()  # A worker takes a batch and its number together
+        self.next_batch = 0
+        self.reorder = {}  # Batches that finished before an earlier one, by batch number (aggregator only)
+
+        self.lock = threading.Lock()
+        self.captured = 0
+        self.dropped = 0
+        self.parsed = 0
+        self.classified = 0
+        self.aggregated = 0
+        self.errors = 0
+
+        self.threads = [threading.Thread(target=self._classify, name=f"classifier-{number}", daemon=True)
+                        for number in range(workers)]
+        self.threads.append(threading.Thread(target=self._aggregate, name="aggregator", daemon=True))
+        self.started = False
+        self.closed = False
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            # Replaces the previous capture's counters in the metrics registry
+            SSniffer_metrics.registry.add_stats('pipeline', self.stats, 'ssniffer_pipeline', METRICS)
+            packet_source = self.packet_details.packet_source
+            if hasattr(packet_source, 'stats'):
+                SSniffer_metrics.registry.add_stats('store', packet_source.stats, 'ssniffer_store',
+                                                    SSniffer_store.METRICS)
+            if self.reassembler is not None:
+                SSniffer_metrics.registry.add_stats('reassembly', self.reassembler.stats, 'ssniffer_reassembly',
+                                                    SSniffer_reassembly.METRICS)
+            for thread in self.threads:
+                thread.start()
+        return self
+
+    def submit(self, position, packet, interface=None):
+        # Capture stage: never blocks. A packet the queue has no room for is still stored and saved, it is only left
+        # out of the flows and counted as dropped. interface tags the flows when several interfaces feed one pipeline
+        with self.lock:
+            self.captured += 1
+        try:
+            self.packet_queue.put_nowait((position, packet, interface))
+            return True
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+
+    def close(self, timeout=None):
+        # Lets the workers finish what is queued, then stops them; the flow table is complete once this returns
+        if self.closed:
+            return
+        self.closed = True
+        if self.started:
+            for _ in range(self.workers):
+                self.packet_queue.put(None)
+            for thread in self.threads:
+                thread.join(timeout)
+        if self.column_writer is not None:
+            self.column_writer.close(self.packet_details)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'captured': self.captured,
+                'dropped': self.dropped,
+                'parsed': self.parsed,
+                'classified': self.classified,
+                'aggregated': self.aggregated,
+                'errors': self.errors,
+                'packet_queue': self.packet_queue.qsize(),
+                'result_queue': self.result_queue.qsize(),
+                'reorder': len(self.reorder),
+            }
+
+    def snapshot(self):
+        return self.packet_details.snapshot()
+
+    def _take_batch(self):
+        # Returns (batch number, [(position, packet, interface), ...], stop)
+        with self.take_lock:
+            item = self.packet_queue.get()
+            if item is None:
+                return None, [], True
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.packet_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            number = self.next_batch
+            self.next_batch += 1
+        return number, batch, stop
+
+    def _classify(self):
+        while True:
+            number, batch, stop = self._take_batch()
+            if number is not None:
+                with SSniffer_metrics.STAGE_SECONDS.time('classify'):
+                    results, segments = self._classify_batch(batch)
+                self.result_queue.put((number, results, segments))
+            if stop:
+                self.result_queue.put(None)
+                return
+
+    def _classify_batch(self, batch):
+        candidates = []
+        segments = []
+        errors = 0
+        for position, packet, interface in batch:
+            try:
+                payload = SSniffer_functions.classifiable_payload(packet)
+                if payload is None or not payload and self.reassembler is None:
+                    continue
+                candidate = (position, SSniffer_functions.flow_key(packet), int(packet.length),
+                             float(packet.sniff_timestamp), interface, payload)
+                segment = SSniffer_functions.tcp_segment(packet) if self.reassembler is not None else None
+                if segment is None:
+                    candidates.append(candidate)
+                else:
+                    segments.append(candidate + segment)
+            except Exception as e:
+                errors += 1
+                print(f"Error reading packet {position + 1}: {e}")
+        verdicts = SSniffer_classifier.classify_batch([payload for *_, payload in candidates])
+        results = [(position, key, length, timestamp, kind == SSniffer_classifier.READABLE, entropy, interface)
+                   for (position, key, length, timestamp, interface, _), (kind, _, entropy) in zip(candidates,
+                                                                                                  verdicts)]
+        with self.lock:
+            self.classified += len(batch)
+            self.parsed += len(candidates) + sum(1 for segment in segments if segment[5])
+            self.errors += errors
+        return results, segments
+
+    def _aggregate(self):
+        next_number = 0
+        running = self.workers
+        latest = None  # Capture time of the newest packet, the reassembler's clock
+        waited = 0.0
+        while running:
+            try:
+                item = self.result_queue.get(timeout=REASSEMBLY_TICK if self.reassembler is not None else None)
+            except queue.Empty:
+                # Nothing captured for a while: capture time stands still, so it is moved on by the time waited
+                waited += REASSEMBLY_TICK
+                if latest is not None:
+                    self._apply(self._verdict_rows(sorted(self.reassembler.take(latest + waited))))
+                continue
+            if item is None:
+                running -= 1
+                continue
+            number, results, segments = item
+            self.reorder[number] = (results, segments)
+            # Apply in capture order so every flow's positions stay sorted
+            while next_number in self.reorder:
+                results, segments = self.reorder.pop(next_number)
+                if self.reassembler is not None and (results or segments):
+                    latest = max(row[3] for row in results[-1:] + segments[-1:])
+                    waited = 0.0
+                    # TCP packets come back once their stream has a verdict, maybe batches later; sorting keeps
+                    # every flow's positions in order
+                    with SSniffer_metrics.STAGE_SECONDS.time('reassemble'):
+                        results = sorted(results + self._reassemble(segments))
+                with SSniffer_metrics.STAGE_SECONDS.time('aggregate'):
+                    self._apply(results)
+                next_number += 1
+        if self.reassembler is not None:
+            # The capture is over, every stream still waiting is classified with what it has
+            self._apply(self._verdict_rows(sorted(self.reassembler.finish())))
+
+    def _reassemble(self, segments):
+        rows = []
+        for position, key, length, timestamp, interface, payload, seq, flags in segments:
+            if not payload:
+                self.reassembler.control(key, flags, timestamp)  # SYN, FIN or RST without data
+                continue
+            rows.extend(self.reassembler.add(key, seq, flags, payload, timestamp,
+                                             (position, key, length, timestamp, interface)))
+        rows.extend(self.reassembler.take())
+        return self._verdict_rows(rows)
+
+    def _verdict_rows(self, verdicts):
+        return [(position, key, length, timestamp, readable, entropy, interface)
+                for (position, key, length, timestamp, interface), readable, entropy in verdicts]
+
+    def _apply(self, results):
+        if not results:
+            return
+        packet_details = self.packet_details
+        with packet_details.lock:
+            for position, key, length, timestamp, readable, _, interface in results:
+                if key not in packet_details:
+                    resolver = SSniffer_functions.get_resolver()
+                    resolver.prefetch(key.src)
+                    resolver.prefetch(key.dst)
+                packet_details.add(key, position, length, timestamp, readable, interface)
+        if self.column_writer is not None:
+            self.column_writer.add_packets(results)
+        with self.lock:
+            self.aggregated += len(results)
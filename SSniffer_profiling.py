@@ -0,0 +1,174 @@
+import cProfile
+import functools
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Profiling that can be switched on and off while SSniffer runs (options window, CLI 'profile', main.py --profile).
+# Off, it costs one attribute check per @profiled call.
+
+PROFILE_DIRECTORY = os.path.join("saveFiles", "profiles")
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+MEMORY_FRAMES = 32  # Frames tracemalloc keeps per allocation
+
+
+def _frame_name(code):
+    # Semicolons separate the frames of a folded stack
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def write_folded(path, stacks):
+    # stacks: Counter of folded stack -> samples (or bytes); flamegraph.pl, inferno or speedscope draw the file
+    with open(path, 'w', encoding='utf-8') as folded_file:
+        for stack, count in stacks.most_common():
+            folded_file.write(f"{stack} {count}\n")
+    return path
+
+
+class Profiler:
+    def __init__(self):
+        self.active = False
+        self.lock = threading.Lock()
+        self.local = threading.local()  # Whether this thread is already inside a cProfile region
+        self.directory = PROFILE_DIRECTORY
+        self.interval = SAMPLE_INTERVAL
+        self.name = None
+        self.memory = False
+        self.stacks = Counter()
+        self.samples = 0
+        self.profile_stats = None
+        self.snapshots = 0
+        self.stop_event = threading.Event()
+        self.sampler = None
+
+    def start(self, directory=PROFILE_DIRECTORY, interval=SAMPLE_INTERVAL, memory=True):
+        with self.lock:
+            if self.active:
+                return False
+            self.directory = directory
+            self.interval = interval
+            self.name = time.strftime("ssniffer-%Y%m%d-%H%M%S")
+            self.stacks = Counter()
+            self.samples = 0
+            self.profile_stats = None
+            self.snapshots = 0
+            # Somebody else tracing allocations (the benchmarks) keeps their tracemalloc to themselves
+            self.memory = memory and not tracemalloc.is_tracing()
+            if self.memory:
+                tracemalloc.start(MEMORY_FRAMES)
+            self.stop_event = threading.Event()
+            self.sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+            self.active = True
+            self.sampler.start()
+        print(f"Profiling started, the results will be written to {directory}")
+        return True
+
+    def stop(self):
+        # Writes the results, returns their paths: the sampled stacks (.folded), the @profiled functions and screen
+        # rebuilds (.pstats) and, with memory, the allocations (.tracemalloc plus a folded graph sized in bytes)
+        with self.lock:
+            if not self.active:
+                return []
+            self.active = False
+            self.stop_event.set()
+        self.sampler.join()
+        os.makedirs(self.directory, exist_ok=True)
+        paths = [write_folded(self._path(".folded"), self.stacks)]
+        with self.lock:
+            profile_stats, self.profile_stats = self.profile_stats, None
+        if profile_stats is not None:
+            profile_stats.dump_stats(self._path(".pstats"))
+            paths.append(self._path(".pstats"))
+        if self.memory:
+            paths.extend(self._write_snapshot())
+            tracemalloc.stop()
+        print(f"Profiling stopped after {self.samples} samples, results written to {', '.join(paths)}")
+        return paths
+
+    def snapshot(self):
+        # Writes what is allocated right now, while profiling goes on
+        if not self.active:
+            return []
+        os.makedirs(self.directory, exist_ok=True)
+        return self._write_snapshot()
+
+    def begin(self):
+        # Starts a cProfile region on this thread; returns the token for end(), None when there is nothing to end
+        if not self.active or getattr(self.local, 'profile', None) is not None:
+            return None  # Off, or already inside a region on this thread
+        profile = cProfile.Profile()
+        self.local.profile = profile
+        profile.enable()
+        return profile
+
+    def end(self, profile):
+        if profile is None:
+            return
+        profile.disable()
+        self.local.profile = None
+        with self.lock:
+            if not self.active:
+                return  # Profiling was switched off in the meantime, this region missed the results
+            if self.profile_stats is None:
+                self.profile_stats = pstats.Stats(profile)
+            else:
+                self.profile_stats.add(profile)
+
+    def _path(self, suffix):
+        return os.path.join(self.directory, self.name + suffix)
+
+    def _write_snapshot(self):
+        snapshot = tracemalloc.take_snapshot()
+        self.snapshots += 1
+        dump_path = self._path(f"-memory{self.snapshots}.tracemalloc")
+        snapshot.dump(dump_path)
+        sizes = Counter()
+        for statistic in snapshot.statistics('traceback'):
+            # tracemalloc frames go from the oldest to the most recent, like a folded stack
+            stack = ";".join(f"{os.path.basename(frame.filename)}:{frame.lineno}".replace(";", ":")
+                             for frame in statistic.traceback)
+            sizes[stack] += statistic.size
+        return [dump_path, write_folded(self._path(f"-memory{self.snapshots}.folded"), sizes)]
+
+    def _sample(self):
+        # Every thread's stack, every interval: that covers the loops that run a whole capture too
+        own_thread = threading.get_ident()
+        frame_names = {}  # Code object -> frame name, most stacks repeat the same frames
+        while not self.stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    name = frame_names.get(code)
+                    if name is None:
+                        name = frame_names[code] = _frame_name(code)
+                    stack.append(name)
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, "thread").replace(";", ":"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+profiler = Profiler()
+
+
+def profiled(function):
+    # Runs the function under cProfile while profiling is on. Not for Qt slots: the extra signal arguments Qt
+    # leaves out for a plain method would be passed through this wrapper.
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not profiler.active:
+            return function(*args, **kwargs)
+        profile = profiler.begin()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.end(profile)
+    return wrapper
@@ -0,0 +1,296 @@
+from collections import deque
+
+import SSniffer_classifier
+import SSniffer_metrics
+
+# TCP stream reassembly: each direction of a connection is put back in sequence order and classified once, from its
+# first CLASSIFY_BYTES bytes, and that verdict holds for the rest of the stream. One thread feeds a reassembler.
+
+CLASSIFY_BYTES = 2048  # Reassembled bytes a stream is classified on
+MAX_OUT_OF_ORDER = 64 * 1024  # Bytes a stream may hold beyond a gap in the sequence numbers
+MAX_WAITING_PACKETS = 256  # Packets a stream may hold back (a stream of tiny segments is classified early)
+STREAM_TIMEOUT = 5.0  # Seconds of capture time a stream's first packet waits for its verdict at most
+MAX_STREAMS = 10000  # Streams waiting for a verdict at once
+MAX_VERDICTS = 65536  # Classified streams whose verdict is remembered, least recently used are forgotten
+MAX_HELD_PACKETS = 65536  # Packets an ordered reassembler holds back behind a waiting stream
+IDLE_TIMEOUT = 60.0  # Seconds of capture time without a packet after which a stream's verdict is forgotten
+
+FIN = 0x01
+SYN = 0x02
+RST = 0x04
+CONTROL_FLAGS = SYN | FIN | RST  # A packet with one of these starts or ends a stream, with or without data
+SEQUENCE_SPACE = 1 << 32
+
+METRICS = {
+    'waiting_streams': (SSniffer_metrics.GAUGE, "TCP streams waiting for enough data to classify"),
+    'waiting_packets': (SSniffer_metrics.GAUGE, "Packets waiting for their stream's verdict"),
+    'held_packets': (SSniffer_metrics.GAUGE, "Packets held back behind a packet waiting for its verdict"),
+    'classified_streams': (SSniffer_metrics.COUNTER, "TCP streams classified"),
+    'scanned_bytes': (SSniffer_metrics.COUNTER, "Reassembled bytes the classifier scanned"),
+    'reused_verdicts': (SSniffer_metrics.COUNTER, "TCP packets that took their stream's verdict unscanned"),
+}
+
+
+def _distance(seq, base):
+    # seq - base in sequence space, negative when seq comes before base
+    distance = (seq - base) % SEQUENCE_SPACE
+    return distance - SEQUENCE_SPACE if distance >= SEQUENCE_SPACE // 2 else distance
+
+
+class Stream:
+    __slots__ = ('start_seq', 'length', 'data', 'gaps', 'gap_bytes', 'items', 'first_seen', 'last_seen',
+                 'first_index', 'ready', 'closed')
+
+    def __init__(self, first_seen, first_index):
+        # The bytes seen so far without a gap run from start_seq for length bytes; the first data segment starts
+        # them, segments that fit before or after it extend them
+        self.start_seq = None
+        self.length = 0
+        self.data = bytearray()  # The first of those bytes, up to the classify limit
+        self.gaps = {}  # Sequence number -> (payload, length), for segments that don't touch them yet
+        self.gap_bytes = 0
+        self.items = []  # [item, verdict, key] per packet, the verdict filled in when the stream is classified
+        self.first_seen = first_seen
+        self.last_seen = first_seen
+        self.first_index = first_index  # How many packets the reassembler had been given before this stream's first
+        self.ready = False
+        self.closed = False  # Ended with FIN or RST: its verdict isn't kept for later packets
+
+    def add(self, seq, payload, length, limit):
+        # payload may be cut short to the classify limit, length is what the segment carried
+        if self.start_seq is None:
+            self.start_seq = seq
+        if not self._extend(seq, payload, length, limit):
+            gap_length = self.gaps.get(seq, (b"", 0))[1]
+            if length <= gap_length:
+                return
+            if self.gap_bytes + length - gap_length > MAX_OUT_OF_ORDER:
+                self.ready = True  # The gap won't be filled in time, classify what there is
+                return
+            self.gap_bytes += length - gap_length
+            self.gaps[seq] = (payload, length)
+            return
+        # Segments that were waiting for this one
+        extended = True
+        while extended and self.gaps:
+            extended = False
+            for gap_seq in list(self.gaps):
+                if self._extend(gap_seq, *self.gaps[gap_seq], limit):
+                    self.gap_bytes -= self.gaps.pop(gap_seq)[1]
+                    extended = True
+
+    def _extend(self, seq, payload, length, limit):
+        # Adds what the segment has before or after the bytes without a gap, False when it doesn't touch them.
+        # Bytes seen before win over a retransmission that differs. While fewer than limit bytes are together, the
+        # ones needed from a segment are within its first limit bytes.
+        start = _distance(seq, self.start_seq)
+        end = start + length
+        if start > self.length or end < 0:
+            return False
+        if start < 0:
+            self.data[:0] = payload[:-start]
+            del self.data[limit:]
+            self.start_seq = seq
+            self.length -= start
+            start, end = 0, end - start
+        if end > self.length:
+            if len(self.data) < limit:
+                self.data += payload[self.length - start:][:limit - len(self.data)]
+            self.length = end
+        if len(self.data) >= limit:
+            self.ready = True
+        return True
+
+
+class StreamReassembler:
+    # add() takes an opaque item per packet and take() hands the items back with their verdicts. An ordered one (the
+    # file loaders) hands every packet back in the order it was added, add_classified ones included.
+    def __init__(self, ordered=False, classify_bytes=CLASSIFY_BYTES, timeout=STREAM_TIMEOUT,
+                 max_streams=MAX_STREAMS, max_verdicts=MAX_VERDICTS, max_held=MAX_HELD_PACKETS,
+                 idle_timeout=IDLE_TIMEOUT):
+        self.classify_bytes = classify_bytes
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_streams = max_streams
+        self.max_verdicts = max_verdicts
+        self.max_held = max_held
+        self.streams = {}  # FlowKey -> Stream still taking data, oldest first
+        self.ready = []  # (FlowKey, Stream) to classify on the next take(), in the order they became ready
+        self.joining = {}  # FlowKey -> ready Stream not closed yet, the packets of its flow join it until take()
+        self.verdicts = {}  # FlowKey -> ((readable, entropy), last seen), least recently used first
+        self.held = deque() if ordered else None  # Every packet's [item, verdict, key] until it is handed back
+        self.added = 0
+        self.waiting_packets = 0
+        self.classified_streams = 0
+        self.scanned_bytes = 0
+        self.reused_verdicts = 0
+
+    def add(self, key, seq, flags, payload, timestamp, item, length=None):
+        # Returns [(item, readable, entropy)] right away when the stream already has a verdict, [] while it waits
+        # (always [] when ordered: take() hands back every packet). length is the segment's when payload is cut short.
+        # Which bytes a stream is classified on is decided here, from the packets alone, never by when take() runs.
+        self._expire(timestamp)
+        self.added += 1
+        if flags & SYN:
+            self.end(key)  # A new connection on the same 5-tuple
+        closing = flags & (FIN | RST)
+        remembered = self.verdicts.pop(key, None)
+        if remembered is not None and timestamp - remembered[1] <= self.idle_timeout:
+            verdict = remembered[0]
+            if not closing:
+                # Back at the end, the most recently used; a closed stream's goes
+                self.verdicts[key] = (verdict, max(remembered[1], timestamp))
+            self.reused_verdicts += 1
+            if self.held is None:
+                return [(item,) + verdict]
+            self.held.append([item, verdict, key])
+            return []
+        stream = self.joining.get(key) or self.streams.get(key)
+        if stream is not None and timestamp - stream.last_seen > self.idle_timeout:
+            self.end(key)
+            stream = None
+        if stream is None:
+            stream = self.streams[key] = Stream(timestamp, self.added)
+            if len(self.streams) > self.max_streams:
+                self._make_ready(next(iter(self.streams)))  # Make room: the oldest is classified with what it has
+        if not stream.ready:
+            stream.add(seq, payload, len(payload) if length is None else length, self.classify_bytes)
+        stream.last_seen = max(stream.last_seen, timestamp)
+        slot = [item, None, key]
+        stream.items.append(slot)
+        if self.held is not None:
+            self.held.append(slot)
+        self.waiting_packets += 1
+        if closing:
+            stream.closed = True
+            if self.joining.get(key) is stream:
+                del self.joining[key]
+        if self.streams.get(key) is stream and (stream.ready or closing or len(stream.items) >= MAX_WAITING_PACKETS):
+            self._make_ready(key)
+        if self.held is not None and self.streams:
+            oldest_key, oldest = next(iter(self.streams.items()))
+            if self.added - oldest.first_index >= self.max_held:
+                self._make_ready(oldest_key)
+        return []
+
+    def control(self, key, flags, timestamp):
+        # A TCP packet without data: a SYN, FIN or RST ends the stream so far
+        self._expire(timestamp)
+        if flags & CONTROL_FLAGS:
+            self.end(key)
+
+    def end(self, key):
+        # Forgets key's verdict, and a waiting stream is classified with what it has; the next packet starts over
+        self.verdicts.pop(key, None)
+        stream = self.joining.pop(key, None)
+        if stream is not None:
+            stream.closed = True
+        elif key in self.streams:
+            self.streams[key].closed = True
+            self._make_ready(key)
+
+    def add_following(self, key, item, timestamp, last_timestamp):
+        # Packets seen from timestamp to last_timestamp, as one item, of a stream that takes no more data: they get
+        # its verdict (the parallel loader sends the middle of a long stream like this)
+        self.add(key, 0, 0, b"", timestamp, item)
+        remembered = self.verdicts.get(key)
+        if remembered is not None:
+            self.verdicts[key] = (remembered[0], max(remembered[1], last_timestamp))
+        stream = self.joining.get(key) or self.streams.get(key)
+        if stream is not None:
+            stream.last_seen = max(stream.last_seen, last_timestamp)
+
+    def add_classified(self, item, readable, entropy):
+        # Ordered only: a packet classified elsewhere, handed back in its place
+        self.added += 1
+        self.held.append([item, (readable, entropy), None])
+
+    def remember(self, key, verdict, last_seen):
+        # A verdict found elsewhere, as if key's stream had been classified here
+        self.verdicts.pop(key, None)
+        self.verdicts[key] = (verdict, last_seen)
+        if len(self.verdicts) > self.max_verdicts:
+            del self.verdicts[next(iter(self.verdicts))]
+
+    def remembered(self):
+        # {FlowKey: ((readable, entropy), last seen)} of the streams whose verdict holds for their next packets
+        return dict(self.verdicts)
+
+    def unfinished(self):
+        # Takes out the streams still taking data, [(FlowKey, [item, ...])], for the caller to carry on elsewhere
+        streams, self.streams = self.streams, {}
+        taken = set()
+        for stream in streams.values():
+            taken.update(id(slot) for slot in stream.items)
+            self.waiting_packets -= len(stream.items)
+        if self.held is not None and taken:
+            self.held = deque(slot for slot in self.held if id(slot) not in taken)
+        return [(key, [slot[0] for slot in stream.items]) for key, stream in streams.items()]
+
+    def take(self, now=None):
+        # Classifies every stream that is ready, and with now (capture time, when no packets come in to tell) every
+        # stream whose first packet came before now - timeout. Returns [(item, readable, entropy)]: unordered, the
+        # packets of the streams just classified in their order; ordered, every packet that can be handed back.
+        if now is not None:
+            self._expire(now)
+        classified = self._classify()
+        if self.held is None:
+            return classified
+        released = []
+        held = self.held
+        while held and held[0][1] is not None:
+            item, verdict, _ = held.popleft()
+            released.append((item,) + verdict)
+        return released
+
+    def finish(self):
+        # Classifies every waiting stream, e.g. once a file has been read
+        for key in list(self.streams):
+            self._make_ready(key)
+        return self.take()
+
+    def _make_ready(self, key):
+        stream = self.streams.pop(key)
+        stream.ready = True
+        self.ready.append((key, stream))
+        if not stream.closed:
+            self.joining[key] = stream
+
+    def _expire(self, now):
+        # Streams are kept oldest first, so only the ones at the front are looked at
+        expired = []
+        for key, stream in self.streams.items():
+            if stream.first_seen > now - self.timeout:
+                break
+            expired.append(key)
+        for key in expired:
+            self._make_ready(key)
+
+    def _classify(self):
+        if not self.ready:
+            return []
+        ready, self.ready = self.ready, []
+        prefixes = [bytes(stream.data) for _, stream in ready]
+        results = []
+        for (key, stream), prefix, (kind, _, entropy) in zip(ready, prefixes,
+                                                             SSniffer_classifier.classify_batch(prefixes)):
+            verdict = (kind == SSniffer_classifier.READABLE, entropy)
+            if not stream.closed:
+                self.verdicts[key] = (verdict, stream.last_seen)
+                del self.joining[key]
+            for slot in stream.items:
+                slot[1] = verdict
+            if self.held is None:
+                results.extend((item,) + verdict for item, _, _ in stream.items)
+            self.waiting_packets -= len(stream.items)
+            self.classified_streams += 1
+            self.scanned_bytes += len(prefix)
+        while len(self.verdicts) > self.max_verdicts:
+            del self.verdicts[next(iter(self.verdicts))]
+        return results
+
+    def stats(self):
+        return {'waiting_streams': len(self.streams) + len(self.ready), 'waiting_packets': self.waiting_packets,
+                'held_packets': len(self.held) if self.held is not None else 0,
+                'classified_streams': self.classified_streams, 'scanned_bytes': self.scanned_bytes,
+                'reused_verdicts': self.reused_verdicts}
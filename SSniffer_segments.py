@@ -0,0 +1,569 @@
+import gzip
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict, namedtuple
+
+import SSniffer_capture
+
+# Rotating capture files. Instead of one pcap that grows without limit and is thrown away by the next session, a
+# capture is written as a ring of segment files next to a catalog (<capture>.segments.json). A segment is closed once
+# it reaches a size or an age, closed segments are compressed in the background, and the oldest ones are deleted
+# when the ring is full.
+# Packets are addressed by one offset across the whole ring: every segment starts where the previous one ended, so
+# SegmentedReader can stand in for a PcapReader and the packet store, the index and the exports work unchanged.
+# The catalog keeps each segment's time range, so a time range is read without touching (or decompressing) the
+# segments outside it.
+
+CATALOG_SUFFIX = ".segments.json"
+CATALOG_VERSION = 1
+COMPRESSED_SUFFIXES = {'gzip': ".gz", 'zstd': ".zst"}
+OPEN_SEGMENTS = 2  # Decompressed segments a reader keeps around
+RING_POLL_INTERVAL = 1.0  # Seconds between looks for the next file of a tshark ring
+PCAP_HEADER_SIZE = 24  # tshark writes its ring as classic pcap (-F pcap)
+
+Rotation = namedtuple('Rotation', ['max_bytes', 'max_seconds', 'max_files', 'compression'])
+DEFAULT_ROTATION = Rotation(max_bytes=64 * 1024 * 1024, max_seconds=15 * 60, max_files=16, compression='gzip')
+
+
+def catalog_path(pcap_path):
+    return (pcap_path[:-len(".pcap")] if pcap_path.endswith(".pcap") else pcap_path) + CATALOG_SUFFIX
+
+
+def is_catalog(path):
+    return path.endswith(CATALOG_SUFFIX)
+
+
+def open_reader(path, start=None, end=None):
+    # A reader for either a single pcap/pcapng file or a segment catalog
+    if is_catalog(path):
+        return SegmentedReader(path, start, end)
+    return SSniffer_capture.PcapReader(path)
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def _open_compressed(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    zstandard = _zstd()
+    if zstandard is None:
+        raise ValueError(f"{path} is zstd compressed, install the zstandard package to read it")
+    return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+
+
+def compress_file(path, compression):
+    # Writes <path>.gz or <path>.zst next to path and returns its name; path itself is left alone
+    compressed_path = path + COMPRESSED_SUFFIXES[compression]
+    temporary_path = compressed_path + ".tmp"
+    with open(path, 'rb') as source:
+        if compression == 'gzip':
+            with gzip.open(temporary_path, 'wb', compresslevel=6) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+        else:
+            with open(temporary_path, 'wb') as target:
+                _zstd().ZstdCompressor(level=3).copy_stream(source, target)
+    os.replace(temporary_path, compressed_path)
+    return compressed_path
+
+
+class SegmentCatalog:
+    # The list of segments of one ring, saved as JSON after every change. Segment entries are dicts:
+    #   file, compression (None while the file is a plain pcap), base (ring offset of the file's first byte),
+    #   size (uncompressed bytes, None while the segment is written), data_start, packets, first_ts, last_ts, closed
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.segments = []
+        self.next_number = 0
+        self.next_base = 0
+        self.loaded_mtime = None
+        self.load()
+
+    def load(self):
+        with self.lock:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as catalog_file:
+                    self.loaded_mtime = os.fstat(catalog_file.fileno()).st_mtime_ns
+                    saved = json.load(catalog_file)
+            except FileNotFoundError:
+                return
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable segment catalog {self.path}: {e}")
+                return
+            if saved.get('version') != CATALOG_VERSION:
+                print(f"Ignoring segment catalog {self.path}: unknown version {saved.get('version')}")
+                return
+            self.segments = saved['segments']
+            self.next_number = saved['next_number']
+            self.next_base = saved['next_base']
+
+    def refresh(self):
+        # Reloads the catalog if another writer (or this process' writer) saved it since it was read
+        try:
+            changed = os.stat(self.path).st_mtime_ns != self.loaded_mtime
+        except OSError:
+            return
+        if changed:
+            self.load()
+
+    def save(self):
+        with self.lock:
+            saved = {'version': CATALOG_VERSION, 'next_number': self.next_number, 'next_base': self.next_base,
+                     'segments': self.segments}
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, 'w', encoding='utf-8') as catalog_file:
+                json.dump(saved, catalog_file, indent=1)
+            # Readers never see a half written catalog
+            os.replace(temporary_path, self.path)
+
+    def new_segment_path(self):
+        with self.lock:
+            number = self.next_number
+            self.next_number += 1
+        return self.path[:-len(CATALOG_SUFFIX)] + f"-{number:06d}.pcap"
+
+    def add(self, file_path, data_start, size=None, packets=0, first_ts=None, last_ts=None, closed=False):
+        with self.lock:
+            segment = {'file': file_path, 'compression': None, 'base': self.next_base, 'size': size,
+                       'data_start': data_start, 'packets': packets, 'first_ts': first_ts, 'last_ts': last_ts,
+                       'closed': closed}
+            self.segments.append(segment)
+            if size is not None:
+                self.next_base += size
+            self.save()
+            return segment
+
+    def close_segment(self, segment, size):
+        with self.lock:
+            segment['size'] = size
+            segment['closed'] = True
+            self.next_base = segment['base'] + size
+            self.save()
+
+    def set_compressed(self, segment, compressed_path, compression):
+        # False when the segment left the ring while it was being compressed
+        with self.lock:
+            if not any(current is segment for current in self.segments):
+                return False
+            segment['file'] = compressed_path
+            segment['compression'] = compression
+            self.save()
+            return True
+
+    def trim(self, max_files):
+        # Drops the oldest closed segments until at most max_files are left; returns them so their files can go
+        with self.lock:
+            dropped = []
+            while len(self.segments) > max_files and self.segments[0]['closed']:
+                dropped.append(self.segments.pop(0))
+            if dropped:
+                self.save()
+            return dropped
+
+    def find(self, offset):
+        with self.lock:
+            for segment in self.segments:
+                if offset < segment['base']:
+                    return None  # In a segment the ring already dropped
+                if segment['size'] is None or offset < segment['base'] + segment['size']:
+                    return segment
+            return None
+
+    def between(self, start=None, end=None):
+        # Segments that can hold packets from start to end (seconds since the epoch, None is open ended)
+        with self.lock:
+            selected = []
+            for segment in self.segments:
+                first_ts, last_ts = segment['first_ts'], segment['last_ts']
+                if not segment['closed']:
+                    last_ts = None  # Still being written, anything after its first packet can turn up
+                if end is not None and first_ts is not None and first_ts > end:
+                    continue
+                if start is not None and last_ts is not None and last_ts < start:
+                    continue
+                selected.append(segment)
+            return selected
+
+
+def _remove_segment_files(segment):
+    for path in {segment['file'], segment['file'].rsplit(".pcap", 1)[0] + ".pcap"}:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not remove old capture segment {path}: {e}")
+
+
+class SegmentCompressor:
+    # One background thread that compresses closed segments; the plain file is used until the compressed one
+    # is complete, so stopping half way never loses anything
+    def __init__(self, catalog, compression):
+        if compression == 'zstd' and _zstd() is None:
+            print("zstd compression needs the zstandard package, compressing capture segments with gzip instead")
+            compression = 'gzip'
+        self.catalog = catalog
+        self.compression = compression
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def submit_leftovers(self):
+        # Closed segments an earlier session didn't get to compress
+        for segment in list(self.catalog.segments):
+            if segment['closed'] and segment['compression'] is None:
+                self.submit(segment)
+
+    def submit(self, segment):
+        if self.compression is None:
+            return
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="segment-compressor", daemon=True)
+            self.thread.start()
+        self.queue.put(segment)
+
+    def close(self, timeout=None):
+        # Waits for the queued segments; with a timeout the rest is finished by the next session
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            segment = self.queue.get()
+            if segment is None:
+                return
+            plain_path = segment['file']
+            if segment['compression'] is not None or not os.path.exists(plain_path):
+                continue  # Already compressed, or dropped from the ring meanwhile
+            try:
+                compressed_path = compress_file(plain_path, self.compression)
+            except Exception as e:
+                print(f"Could not compress capture segment {plain_path}: {e}")
+                continue
+            if not self.catalog.set_compressed(segment, compressed_path, self.compression):
+                os.remove(compressed_path)
+                continue
+            try:
+                os.remove(plain_path)
+            except OSError as e:
+                print(f"Could not remove {plain_path} after compressing it: {e}")
+
+
+class SegmentedPcapWriter:
+    # Same interface as PcapWriter; write returns the packet's offset in the ring
+    def __init__(self, path, rotation=DEFAULT_ROTATION, linktype=SSniffer_capture.LINKTYPE_ETHERNET,
+                 snaplen=SSniffer_capture.SNAPLEN):
+        self.file_path = path
+        self.rotation = rotation
+        self.linktype = linktype
+        self.snaplen = snaplen
+        self.catalog = SegmentCatalog(path)
+        self.compressor = SegmentCompressor(self.catalog, rotation.compression)
+        self.writer = None
+        self.segment = None
+        self.packet_count = 0
+        self.compressor.submit_leftovers()
+
+    def write(self, frame, timestamp, original_length=None):
+        if self.writer is None or self._full(timestamp):
+            self._rotate()
+        offset = self.writer.write(frame, timestamp, original_length)
+        segment = self.segment
+        if segment['first_ts'] is None:
+            segment['first_ts'] = timestamp
+        segment['last_ts'] = timestamp
+        segment['packets'] += 1
+        self.packet_count += 1
+        return segment['base'] + offset
+
+    def _full(self, timestamp):
+        return (self.writer.file.tell() >= self.rotation.max_bytes
+                or (self.segment['first_ts'] is not None
+                    and timestamp - self.segment['first_ts'] >= self.rotation.max_seconds))
+
+    def _rotate(self):
+        self._close_segment()
+        self.writer = SSniffer_capture.PcapWriter(self.catalog.new_segment_path(), self.linktype, self.snaplen)
+        self.segment = self.catalog.add(self.writer.file_path, self.writer.file.tell())
+        for segment in self.catalog.trim(self.rotation.max_files):
+            _remove_segment_files(segment)
+
+    def _close_segment(self):
+        if self.writer is None:
+            return
+        size = self.writer.file.tell()
+        self.writer.close()
+        self.catalog.close_segment(self.segment, size)
+        self.compressor.submit(self.segment)
+        self.writer = None
+        self.segment = None
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        self._close_segment()
+        self.compressor.close(timeout=0)
+
+
+def _describe_capture(pcap_path):
+    # (size, data_start, record offsets, first_ts, last_ts) of a finished pcap file, None when it holds no packets
+    try:
+        reader = SSniffer_capture.PcapReader(pcap_path)
+    except (OSError, ValueError):
+        return None  # Nothing (or nothing readable) there
+    try:
+        offsets = array('Q', reader.record_offsets())
+        if not offsets:
+            return None
+        return (reader.size(), reader.data_start, offsets, reader.read_record(offsets[0])[1],
+                reader.read_record(offsets[-1])[1])
+    finally:
+        reader.close()
+
+
+def archive_capture(pcap_path, rotation=DEFAULT_ROTATION):
+    # Moves a finished single file capture into its ring (as one closed segment) instead of deleting it
+    path = catalog_path(pcap_path)
+    described = _describe_capture(pcap_path)
+    if described is None:
+        return None
+    size, data_start, offsets, first_ts, last_ts = described
+    catalog = SegmentCatalog(path)
+    segment_path = catalog.new_segment_path()
+    os.replace(pcap_path, segment_path)
+    segment = catalog.add(segment_path, data_start, size, len(offsets), first_ts, last_ts, closed=True)
+    for dropped in catalog.trim(rotation.max_files):
+        _remove_segment_files(dropped)
+    compressor = SegmentCompressor(catalog, rotation.compression)
+    compressor.submit_leftovers()
+    compressor.close(timeout=0)
+    return segment
+
+
+class TsharkRing:
+    # The pyshark engine's ring: tshark switches files itself (-b filesize:/duration:) and names them
+    # <prefix>_<number>_<time>.pcap; poll() adds each new one to the catalog and closes the one before, so the ring
+    # reads like the raw engine's. Old files are trimmed here, tshark is never given -b files:
+    def __init__(self, path, rotation=DEFAULT_ROTATION, add_offsets=None):
+        # add_offsets(first position, ring offsets) gets every closed file's records, so the packet store can still
+        # find the packets after the ones trimmed away
+        self.rotation = rotation
+        self.add_offsets = add_offsets
+        self.packets = 0  # Packets in the files closed so far
+        self.catalog = SegmentCatalog(path)
+        self.compressor = SegmentCompressor(self.catalog, rotation.compression)
+        self.output_file = self.catalog.new_segment_path()  # What tshark is told to write, never written itself
+        self.first_offset = self.catalog.next_base + PCAP_HEADER_SIZE  # Ring offset of the capture's first packet
+        self.files = set()
+        self.segment = None
+        self.last_poll = 0.0
+        self.compressor.submit_leftovers()
+
+    def tshark_parameters(self):
+        # tshark counts filesize in kB
+        return ["-F", "pcap", "-b", f"filesize:{max(self.rotation.max_bytes // 1000, 1)}",
+                "-b", f"duration:{max(int(self.rotation.max_seconds), 1)}"]
+
+    def poll(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_poll < RING_POLL_INTERVAL:
+            return
+        self.last_poll = now
+        directory, name = os.path.split(self.output_file[:-len(".pcap")])
+        try:
+            started = sorted(file for file in os.listdir(directory or ".")
+                             if file.startswith(name + "_") and file.endswith(".pcap") and file not in self.files)
+        except OSError as e:
+            print(f"Could not look for new capture segments: {e}")
+            return
+        # The file number is zero padded, so name order is tshark's order
+        for file in started:
+            self.files.add(file)
+            self._close_segment()
+            self.segment = self.catalog.add(os.path.join(directory, file), PCAP_HEADER_SIZE)
+            for segment in self.catalog.trim(self.rotation.max_files):
+                _remove_segment_files(segment)
+
+    def _close_segment(self):
+        # tshark is done with a file once it has started the next one (or has stopped)
+        segment = self.segment
+        if segment is None:
+            return
+        self.segment = None
+        described = _describe_capture(segment['file'])
+        if described is None:
+            size = os.path.getsize(segment['file']) if os.path.exists(segment['file']) else PCAP_HEADER_SIZE
+        else:
+            size, _, offsets, segment['first_ts'], segment['last_ts'] = described
+            segment['packets'] = len(offsets)
+            if self.add_offsets is not None:
+                self.add_offsets(self.packets, array('Q', (segment['base'] + offset for offset in offsets)))
+            self.packets += len(offsets)
+        self.catalog.close_segment(segment, size)
+        self.compressor.submit(segment)
+
+    def close(self):
+        self.poll(force=True)
+        self._close_segment()
+        self.compressor.close(timeout=0)
+
+
+class SegmentedReader:
+    # PcapReader over every segment of a ring (or the ones overlapping start..end). Offsets are ring offsets.
+    pcapng = False
+    endian = "<"
+
+    def __init__(self, path, start=None, end=None):
+        self.file_path = path
+        self.start = start
+        self.end = end
+        self.catalog = SegmentCatalog(path)
+        if not self.catalog.segments:
+            raise ValueError(f"{path} has no capture segments")
+        self.readers = OrderedDict()  # file -> PcapReader, newest last; compressed ones are temporary copies
+        self.linktypes = []
+
+    def _segments(self):
+        return self.catalog.between(self.start, self.end)
+
+    @property
+    def data_start(self):
+        segments = self._segments()
+        return segments[0]['base'] + segments[0]['data_start'] if segments else self.catalog.next_base
+
+    @property
+    def linktype(self):
+        segments = self._segments()
+        return self._reader(segments[0]).linktype if segments else SSniffer_capture.LINKTYPE_ETHERNET
+
+    def size(self):
+        # The offset just past the last segment, so it compares with the offsets the reader returns
+        segments = self._segments()
+        if not segments:
+            return self.catalog.next_base
+        last = segments[-1]
+        if last['size'] is not None:
+            return last['base'] + last['size']
+        try:
+            return last['base'] + os.path.getsize(last['file'])
+        except OSError:
+            return last['base']
+
+    def _reader(self, segment):
+        path = segment['file']
+        reader = self.readers.get(path)
+        if reader is not None:
+            self.readers.move_to_end(path)
+            return reader
+        try:
+            reader = self._open(segment)
+        except FileNotFoundError:
+            # Compressed (or dropped) since the catalog was read
+            self.catalog.refresh()
+            current = self.catalog.find(segment['base'])
+            if current is None or current['file'] == path:
+                raise
+            return self._reader(current)
+        self.readers[path] = reader
+        while len(self.readers) > OPEN_SEGMENTS + 1:
+            self.readers.popitem(last=False)[1].close()
+        return reader
+
+    def _open(self, segment):
+        if segment['compression'] is None:
+            return SSniffer_capture.PcapReader(segment['file'])
+        # Compressed segments are unpacked once into a temporary file that is deleted when it is closed
+        unpacked = tempfile.TemporaryFile(prefix="ssniffer-segment-")
+        with _open_compressed(segment['file'], segment['compression']) as source:
+            shutil.copyfileobj(source, unpacked, 1024 * 1024)
+        unpacked.seek(0)
+        return SSniffer_capture.PcapReader(segment['file'], file=unpacked)
+
+    def _find(self, offset):
+        segment = self.catalog.find(offset)
+        if segment is None and offset >= self.catalog.next_base:
+            self.catalog.refresh()  # The writer may have started a new segment since
+            segment = self.catalog.find(offset)
+        return segment
+
+    def read_record(self, offset):
+        # Records past the end of a segment continue at the start of the next one
+        while True:
+            segment = self._find(offset)
+            if segment is None:
+                return None
+            local_offset = max(offset - segment['base'], segment['data_start'])
+            try:
+                record = self._reader(segment).read_record(local_offset)
+            except (OSError, ValueError) as e:
+                print(f"Could not read capture segment {segment['file']}: {e}")
+                record = None
+            if record is not None:
+                record_offset, timestamp, frame, original_length, linktype, next_offset = record
+                return (segment['base'] + record_offset, timestamp, frame, original_length, linktype,
+                        segment['base'] + next_offset)
+            if not segment['closed']:
+                self.catalog.refresh()
+                current = self.catalog.find(segment['base'])
+                if current is None or not current['closed']:
+                    return None  # The writer hasn't finished this record yet
+                continue
+            offset = segment['base'] + segment['size']
+
+    def read_packet(self, offset, number=None):
+        record = self.read_record(offset)
+        if record is None:
+            return None
+        _, timestamp, frame, original_length, linktype, _ = record
+        return SSniffer_capture.decode_frame(frame, timestamp, number, original_length, linktype=linktype)
+
+    def records(self, offset=None):
+        # Like PcapReader.records, limited to start..end when the reader was given a time range
+        segments = self._segments()
+        if not segments:
+            return
+        selected = {segment['base'] for segment in segments}
+        offset = self.data_start if offset is None else offset
+        end_offset = segments[-1]['base'] + segments[-1]['size'] if segments[-1]['size'] is not None else None
+        while True:
+            if end_offset is not None and offset >= end_offset:
+                return
+            segment = self._find(offset)
+            if segment is not None and segment['base'] not in selected:
+                # Skip segments outside the time range without opening them
+                later = [candidate for candidate in segments if candidate['base'] > segment['base']]
+                if not later:
+                    return
+                offset = later[0]['base'] + later[0]['data_start']
+                continue
+            record = self.read_record(offset)
+            if record is None:
+                return
+            timestamp = record[1]
+            if (self.start is None or timestamp >= self.start) and (self.end is None or timestamp <= self.end):
+                yield record[:5]
+            offset = record[5]
+
+    def segment_files(self):
+        # (segment, PcapReader) of every selected segment, for copying them out whole
+        for segment in self._segments():
+            yield segment, self._reader(segment)
+
+    def close(self):
+        for reader in self.readers.values():
+            reader.close()
+        self.readers.clear()
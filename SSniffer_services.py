@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import SSniffer_metrics
+
+# Service lookup for (ip, port, protocol). Active nmap scans run on a small worker pool, requests for the
+# same host that arrive close together are merged into one multi-port scan, and results are cached for a
+# while. Until a scan has answered, the local services table gives an instant best guess.
+
+METRICS = {
+    'scans': (SSniffer_metrics.COUNTER, "nmap scans run"),
+    'hits': (SSniffer_metrics.COUNTER, "Service lookups answered from the cache"),
+    'misses': (SSniffer_metrics.COUNTER, "Service lookups that needed a scan"),
+    'evictions': (SSniffer_metrics.COUNTER, "Services dropped from the full cache"),
+    'cached': (SSniffer_metrics.GAUGE, "Services in the cache"),
+    'pending_hosts': (SSniffer_metrics.GAUGE, "Hosts waiting for a scan"),
+}
+
+SERVICES_FILES = ("/etc/services", "C:\\Windows\\System32\\drivers\\etc\\services")
+
+# Used when no services file can be read
+BUILTIN_SERVICES = {
+    (20, 'tcp'): 'ftp-data', (21, 'tcp'): 'ftp', (22, 'tcp'): 'ssh', (23, 'tcp'): 'telnet', (25, 'tcp'): 'smtp',
+    (53, 'tcp'): 'domain', (53, 'udp'): 'domain', (67, 'udp'): 'bootps', (68, 'udp'): 'bootpc',
+    (80, 'tcp'): 'http', (110, 'tcp'): 'pop3', (123, 'udp'): 'ntp', (137, 'udp'): 'netbios-ns',
+    (143, 'tcp'): 'imap', (161, 'udp'): 'snmp', (443, 'tcp'): 'https', (443, 'udp'): 'https',
+    (445, 'tcp'): 'microsoft-ds', (993, 'tcp'): 'imaps', (995, 'tcp'): 'pop3s', (1900, 'udp'): 'ssdp',
+    (3306, 'tcp'): 'mysql', (3389, 'tcp'): 'ms-wbt-server', (5353, 'udp'): 'mdns', (8080, 'tcp'): 'http-alt',
+}
+
+
+def load_services_table(paths=SERVICES_FILES):
+    table = {}
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8', errors='replace') as services_file:
+                for line in services_file:
+                    fields = line.split('#', 1)[0].split()
+                    if len(fields) < 2 or '/' not in fields[1]:
+                        continue
+                    port, proto = fields[1].split('/', 1)
+                    if port.isdigit():
+                        table.setdefault((int(port), proto.lower()), fields[0])
+        except OSError:
+            continue
+        if table:
+            break
+    return table or dict(BUILTIN_SERVICES)
+
+
+def nmap_scanner():
+    import nmap
+    return nmap.PortScanner()
+
+
+class ServiceLookup:
+    def __init__(self, scanner_factory=nmap_scanner, ttl=3600, error_ttl=60, max_workers=4, coalesce_delay=0.2,
+                 services=None, cache_size=4096):
+        self.scanner_factory = scanner_factory
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.coalesce_delay = coalesce_delay
+        self.services = load_services_table() if services is None else services
+
+        self.cache = OrderedDict()  # (ip, port, proto) -> (service, expires at), least recently used first
+        self.pending = {}  # ip -> set of (port, proto) waiting for that host's next scan
+        self.events = {}  # (ip, port, proto) -> threading.Event set once the scan has answered
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nmap")
+
+        self.scans = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def local_service(self, port, proto='tcp'):
+        return self.services.get((int(port), proto.lower()))
+
+    def lookup(self, ip, port, proto='tcp'):
+        # Never blocks. Returns (service, from_scan): the scanned service when it is cached, otherwise the
+        # services table's guess (or None) while a scan is queued
+        key = (ip, int(port), proto.lower())
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return entry[0], True
+            self.misses += 1
+            self._schedule(key)
+        return self.local_service(port, proto), False
+
+    def wait(self, ip, port, proto='tcp', timeout=None):
+        # Blocking version of lookup, for callers that can wait for the scan
+        return self.wait_all([(ip, port, proto)], timeout)[0][0]
+
+    def wait_all(self, requests, timeout=None):
+        # Blocking lookup of several (ip, port, proto) for a worker thread: every scan is queued before any is
+        # waited for, so they run side by side. Returns [(service, from_scan), ...], the guess where timeout ran out
+        answers = [self.lookup(*request) for request in requests]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for index, ((ip, port, proto), (_, from_scan)) in enumerate(zip(requests, answers)):
+            if from_scan:
+                continue
+            key = (ip, int(port), proto.lower())
+            with self.lock:
+                event = self.events.get(key)
+            if event is not None:
+                event.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+            with self.lock:
+                entry = self.cache.get(key)
+            if entry is not None:
+                answers[index] = (entry[0], True)
+        return answers
+
+    def stats(self):
+        with self.lock:
+            return {'scans': self.scans, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'cached': len(self.cache), 'pending_hosts': len(self.pending)}
+
+    def _schedule(self, key):
+        ip, port, proto = key
+        if key in self.events:
+            return  # Already waiting for a scan
+        self.events[key] = threading.Event()
+        host_ports = self.pending.get(ip)
+        if host_ports is None:
+            # First request for this host: the scan starts after a short delay so more ports can join it
+            host_ports = self.pending[ip] = set()
+            self.executor.submit(self._scan_host, ip)
+        host_ports.add((port, proto))
+
+    def _scan_host(self, ip):
+        time.sleep(self.coalesce_delay)
+        with self.lock:
+            host_ports = self.pending.pop(ip, set())
+            self.scans += 1
+        if not host_ports:
+            return
+        results = self._run_scan(ip, sorted(host_ports))
+        events = []
+        with self.lock:
+            for (port, proto), (service, ttl) in results.items():
+                self.cache[(ip, port, proto)] = (service, time.monotonic() + ttl)
+                self.cache.move_to_end((ip, port, proto))
+                events.append(self.events.pop((ip, port, proto), None))
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+        for event in events:
+            if event is not None:
+                event.set()
+
+    def _run_scan(self, ip, ports):
+        tcp_ports = sorted(port for port, proto in ports if proto == 'tcp')
+        udp_ports = sorted(port for port, proto in ports if proto == 'udp')
+        port_spec = ",".join([f"T:{port}" for port in tcp_ports] + [f"U:{port}" for port in udp_ports])
+        arguments = " ".join(argument for argument, wanted in (('-sS', tcp_ports), ('-sU', udp_ports)) if wanted)
+        results = {}
+        try:
+            scanner = self.scanner_factory()
+            with SSniffer_metrics.STAGE_SECONDS.time('nmap'):
+                scanner.scan(ip, port_spec, arguments=arguments)
+            host_up = ip in scanner.all_hosts()
+            for port, proto in ports:
+                if not host_up:
+                    results[(port, proto)] = (f"Host {ip} not found in scan results.", self.error_ttl)
+                elif port in scanner[ip].get(proto, {}):
+                    results[(port, proto)] = (scanner[ip][proto][port]['name'], self.ttl)
+                else:
+                    results[(port, proto)] = (f"Port {port} not found in scan results.", self.error_ttl)
+        except Exception as e:
+            for key in ports:
+                results[key] = (f"Error: {e}", self.error_ttl)
+        return results
@@ -0,0 +1,184 @@
+import threading
+from array import array
+from collections import deque
+
+import SSniffer_metrics
+import SSniffer_segments
+
+# Bounded packet storage for a capture. The newest packets stay in memory in a ring; once the ring goes over
+# its memory budget the oldest packets are dropped and, when a view asks for them again, decoded back from
+# the pcap file the capture is writing. Positions are the packet numbers in that file (starting at 0).
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024  # Bytes
+# A dissected packet costs a lot more than its frame: pyshark keeps every field of every layer as objects
+PACKET_OVERHEAD = {'pyshark': 16 * 1024, 'raw': 512}
+
+METRICS = {
+    'packets': (SSniffer_metrics.GAUGE, "Packets in the capture"),
+    'in_memory': (SSniffer_metrics.GAUGE, "Packets kept in memory"),
+    'memory_bytes': (SSniffer_metrics.GAUGE, "Memory used by the packets kept in memory"),
+    'memory_budget': (SSniffer_metrics.GAUGE, "Memory budget for the packets kept in memory"),
+    'evicted_packets': (SSniffer_metrics.COUNTER, "Packets dropped from memory"),
+    'disk_reads': (SSniffer_metrics.COUNTER, "Packets read back from the capture file"),
+}
+
+
+class PacketStore:
+    def __init__(self, file_path, memory_budget=DEFAULT_MEMORY_BUDGET, packet_overhead=PACKET_OVERHEAD['pyshark']):
+        self.file_path = file_path
+        self.memory_budget = memory_budget
+        self.packet_overhead = packet_overhead
+
+        self.ring = deque()  # (packet, estimated size) for positions first_in_memory .. count - 1
+        self.first_in_memory = 0
+        self.count = 0
+        self.memory_bytes = 0
+        self.lock = threading.Lock()  # The ring, the counters and the offsets; never held while the file is read
+
+        # Byte offsets of the records in the pcap file, filled in lazily as far as anyone has asked
+        self.reader = None
+        self.reader_lock = threading.Lock()  # The reader and next_offset
+        self.offsets = array('Q')
+        self.next_offset = None
+
+        self.evicted_packets = 0
+        self.evicted_bytes = 0
+        self.disk_reads = 0
+
+    def append(self, packet, offset=None):
+        # offset is the packet's record offset in the file when the caller already knows it
+        size = self._estimate(packet)
+        with self.lock:
+            position = self.count
+            if offset is not None and len(self.offsets) == position:
+                self.offsets.append(offset)
+            self.ring.append((packet, size))
+            self.count += 1
+            self.memory_bytes += size
+            # Always keep the newest packet, even if it alone is over the budget
+            while self.memory_bytes > self.memory_budget and len(self.ring) > 1:
+                _, evicted_size = self.ring.popleft()
+                self.first_in_memory += 1
+                self.memory_bytes -= evicted_size
+                self.evicted_packets += 1
+                self.evicted_bytes += evicted_size
+        return position
+
+    def _estimate(self, packet):
+        try:
+            return int(packet.length) + self.packet_overhead
+        except (AttributeError, TypeError, ValueError):
+            return self.packet_overhead
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self.count
+        with self.lock:
+            if position < 0 or position >= self.count:
+                raise IndexError("packet position out of range")
+            if position >= self.first_in_memory:
+                return self.ring[position - self.first_in_memory][0]
+        # Read without holding the lock, so scrolling through spilled packets never stalls the capture's append()
+        packet = self._read_from_disk(position)
+        if packet is None:
+            raise IndexError(f"packet {position} is not in {self.file_path} (not written yet, or rotated out)")
+        return packet
+
+    def __iter__(self):
+        for position in range(self.count):
+            yield self[position]
+
+    def offset(self, position):
+        # Byte offset of a packet's record in the pcap file, or None if it hasn't been written yet
+        with self.reader_lock:
+            return self._find_offset(position)
+
+    def all_offsets(self):
+        # Offsets of every packet so far, or None while the file is still behind the capture
+        count = self.count
+        with self.reader_lock:
+            if count and self._find_offset(count - 1) is None:
+                return None
+        with self.lock:
+            return self.offsets[:count]
+
+    def add_offsets(self, position, offsets):
+        # Record offsets from position on, from a capture that learns them after the packets were appended
+        with self.reader_lock:
+            with self.lock:
+                known = len(self.offsets)
+                if position <= known < position + len(offsets):
+                    self.offsets.extend(offsets[known - position:])
+                    if self.reader is not None:
+                        self.next_offset = self.reader.data_start  # Carry on after the last offset given
+
+    def _open_reader(self):
+        if self.reader is None:
+            try:
+                self.reader = SSniffer_segments.open_reader(self.file_path)
+            except (OSError, ValueError):
+                return False  # Not written yet (or the header is still being written)
+            self.next_offset = self.reader.data_start
+        return True
+
+    def _find_offset(self, position):
+        # Called with reader_lock held; self.lock is only taken to look at and extend the offsets
+        with self.lock:
+            if position < len(self.offsets):
+                return self.offsets[position]
+            known = len(self.offsets)
+            last_known = self.offsets[-1] if known else None
+        if not self._open_reader():
+            return None
+        if known and self.next_offset == self.reader.data_start:
+            # Offsets handed to append: carry on after the last known record
+            record = self.reader.read_record(last_known)
+            if record is None:
+                return None
+            self.next_offset = record[5]
+        # Walk the record headers from where we stopped last time
+        found = array('Q')
+        next_offset = self.next_offset
+        while known + len(found) <= position:
+            record = self.reader.read_record(next_offset)
+            if record is None:
+                break
+            found.append(record[0])
+            next_offset = record[5]
+        with self.lock:
+            if len(self.offsets) == known:
+                self.offsets.extend(found)
+                self.next_offset = next_offset
+            else:
+                self.next_offset = self.reader.data_start  # append() got there first, pick up after its offsets
+            return self.offsets[position] if position < len(self.offsets) else None
+
+    def _read_from_disk(self, position):
+        with self.reader_lock:
+            offset = self._find_offset(position)
+            # Offsets handed to append don't need the reader, so it may not be open yet
+            if offset is None or not self._open_reader():
+                return None
+            self.disk_reads += 1
+            return self.reader.read_packet(offset, number=position + 1)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'packets': self.count,
+                'in_memory': len(self.ring),
+                'memory_bytes': self.memory_bytes,
+                'memory_budget': self.memory_budget,
+                'evicted_packets': self.evicted_packets,
+                'evicted_bytes': self.evicted_bytes,
+                'disk_reads': self.disk_reads,
+            }
+
+    def close(self):
+        with self.reader_lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
@@ -0,0 +1,217 @@
+import threading
+import time
+from array import array
+from collections import deque
+
+import SSniffer_functions
+import SSniffer_metrics
+import SSniffer_pipeline
+import SSniffer_store
+
+# Capture on several interfaces at once. Every interface is sniffed on its own thread into its own pcap file and
+# PacketStore. A merger thread puts their packets on one timeline ordered by timestamp and hands them to a single
+# capture pipeline, so there is one flow table whose flows are tagged with the interfaces they were seen on.
+
+MAX_MERGE_DELAY = 0.5  # Seconds a packet waits for a quiet interface before it is merged anyway
+INTERFACE_QUEUE_SIZE = 10000  # Packets per interface waiting to be merged
+
+METRICS = {
+    'packets': (SSniffer_metrics.COUNTER, "Packets captured"),
+    'bytes': (SSniffer_metrics.COUNTER, "Bytes captured"),
+    'dropped': (SSniffer_metrics.COUNTER, "Packets the merger or the classifiers had no room for"),
+    'packets_per_second': (SSniffer_metrics.GAUGE, "Packets per second"),
+    'bytes_per_second': (SSniffer_metrics.GAUGE, "Bytes per second"),
+}
+
+
+class MergedPacketSource:
+    # Packet source over several PacketStores: capture position -> (interface, position in that interface's store)
+    def __init__(self, stores):
+        self.interfaces = list(stores)
+        self.stores = [stores[interface] for interface in self.interfaces]
+        self.owners = array('B')
+        self.local_positions = array('I')
+        self.lock = threading.Lock()
+
+    def add(self, interface_index, local_position):
+        with self.lock:
+            self.owners.append(interface_index)
+            self.local_positions.append(local_position)
+            return len(self.owners) - 1
+
+    def __len__(self):
+        return len(self.owners)
+
+    def __getitem__(self, position):
+        with self.lock:
+            owner = self.owners[position]
+            local_position = self.local_positions[position]
+        return self.stores[owner][local_position]
+
+    def __iter__(self):
+        for position in range(len(self.owners)):
+            yield self[position]
+
+    def interface(self, position):
+        return self.interfaces[self.owners[position]]
+
+    def all_offsets(self):
+        return None  # The packets are spread over one file per interface, there is no single file to index
+
+    def stats(self):
+        # Same keys as PacketStore.stats, summed over the interfaces
+        totals = {}
+        for store in self.stores:
+            for name, value in store.stats().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def close(self):
+        for store in self.stores:
+            store.close()
+
+
+class InterfaceCounters:
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.dropped = 0  # Packets the merger or the classifiers had no room for
+        self.rate_time = time.monotonic()
+        self.rate_packets = 0
+        self.rate_bytes = 0
+        self.packets_per_second = 0.0
+        self.bytes_per_second = 0.0
+
+    def sample(self):
+        # Throughput over the last second or so
+        now = time.monotonic()
+        elapsed = now - self.rate_time
+        if elapsed >= 1.0:
+            self.packets_per_second = (self.packets - self.rate_packets) / elapsed
+            self.bytes_per_second = (self.bytes - self.rate_bytes) / elapsed
+            self.rate_time, self.rate_packets, self.rate_bytes = now, self.packets, self.bytes
+        return {'packets': self.packets, 'bytes': self.bytes, 'dropped': self.dropped,
+                'packets_per_second': self.packets_per_second, 'bytes_per_second': self.bytes_per_second}
+
+
+class TimelineMerger:
+    # Each interface's packets arrive in timestamp order; the merger always releases the oldest head. A packet is
+    # only released once every interface that is still capturing has something queued (so nothing older can turn
+    # up), or once it has waited MAX_MERGE_DELAY for a quiet interface.
+    def __init__(self, interfaces, deliver, max_delay=MAX_MERGE_DELAY, queue_size=INTERFACE_QUEUE_SIZE):
+        self.deliver = deliver
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self.queues = {interface: deque() for interface in interfaces}
+        self.finished = set()
+        self.condition = threading.Condition()
+
+    def put(self, interface, timestamp, item):
+        with self.condition:
+            waiting = self.queues[interface]
+            if len(waiting) >= self.queue_size:
+                return False
+            waiting.append((timestamp, time.monotonic(), item))
+            self.condition.notify()
+        return True
+
+    def finish(self, interface):
+        with self.condition:
+            self.finished.add(interface)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    ready = self._pop_ready()
+                    if ready is not None:
+                        break
+                    if len(self.finished) == len(self.queues) and not any(self.queues.values()):
+                        return
+                    self.condition.wait(self.max_delay / 5)
+            self.deliver(*ready)
+
+    def _pop_ready(self):
+        heads = [(waiting[0][0], interface) for interface, waiting in self.queues.items() if waiting]
+        if not heads:
+            return None
+        timestamp, interface = min(heads)
+        quiet = any(not waiting and interface not in self.finished for interface, waiting in self.queues.items())
+        # The wait is measured from when the packet arrived, so replayed or clock skewed timestamps don't matter
+        if quiet and time.monotonic() - self.queues[interface][0][1] < self.max_delay:
+            return None
+        _, _, item = self.queues[interface].popleft()
+        return (interface, timestamp, item)
+
+
+class MultiCapture:
+    def __init__(self, interfaces, packet_details, stop_event, engine="pyshark",
+                 memory_budget=SSniffer_store.DEFAULT_MEMORY_BUDGET, pipeline=None, bpf_filter=None):
+        self.interfaces = list(interfaces)
+        self.interface_index = {interface: index for index, interface in enumerate(self.interfaces)}
+        self.stop_event = stop_event
+        self.engine = engine
+        self.bpf_filter = bpf_filter
+        # The memory budget is shared between the interfaces
+        stores = {interface: SSniffer_store.PacketStore(SSniffer_functions.capture_file(interface, engine),
+                                                        memory_budget // len(self.interfaces),
+                                                        SSniffer_store.PACKET_OVERHEAD[engine])
+                  for interface in self.interfaces}
+        self.packet_source = MergedPacketSource(stores)
+        self.packet_details = packet_details
+        packet_details.packet_source = self.packet_source
+        self.pipeline = pipeline if pipeline is not None else SSniffer_pipeline.CapturePipeline(packet_details)
+        self.merger = TimelineMerger(self.interfaces, self._deliver)
+        self.counters = {interface: InterfaceCounters() for interface in self.interfaces}
+        self.lock = threading.Lock()
+
+    def run(self):
+        # Blocks until every interface has stopped and everything captured is in the flow table
+        print(f"Silently capturing packets on interfaces: {', '.join(self.interfaces)} ({self.engine} engine)...")
+        self.pipeline.start()
+        SSniffer_metrics.registry.add_stats('interfaces', self.stats, 'ssniffer_interface', METRICS, label='interface')
+        threads = [threading.Thread(target=self._sniff, args=(interface,), name=f"capture-{interface}", daemon=True)
+                   for interface in self.interfaces]
+        merger_thread = threading.Thread(target=self.merger.run, name="merger", daemon=True)
+        for thread in threads:
+            thread.start()
+        merger_thread.start()
+        for thread in threads:
+            thread.join()
+        merger_thread.join()
+        self.pipeline.close()
+        print("Stopped capturing packets.")
+
+    def _sniff(self, interface):
+        store = self.packet_source.stores[self.interface_index[interface]]
+        counters = self.counters[interface]
+
+        def handle_packet(packet):
+            local_position = store.append(packet, getattr(packet, 'file_offset', None))
+            with self.lock:
+                counters.packets += 1
+                counters.bytes += int(packet.length)
+            if not self.merger.put(interface, float(packet.sniff_timestamp), (local_position, packet)):
+                with self.lock:
+                    counters.dropped += 1
+
+        try:
+            SSniffer_functions.sniff(interface, SSniffer_functions.capture_file(interface, self.engine),
+                                     self.stop_event, self.engine, handle_packet, self.bpf_filter, store.add_offsets)
+        except Exception as e:
+            print(f"Capture on {interface} stopped: {e}")
+        finally:
+            self.merger.finish(interface)
+
+    def _deliver(self, interface, timestamp, item):
+        local_position, packet = item
+        position = self.packet_source.add(self.interface_index[interface], local_position)
+        if not self.pipeline.submit(position, packet, interface):
+            with self.lock:
+                self.counters[interface].dropped += 1
+
+    def stats(self):
+        with self.lock:
+            return {interface: counters.sample() for interface, counters in self.counters.items()}
+
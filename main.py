@@ -1,11 +1,17 @@
-import sys
-
-from PyQt5.QtWidgets import QApplication
-
-import SSniffer_gui
-
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    sniff_window = SSniffer_gui.SniffWindow()
-    sniff_window.show()
-    sys.exit(app.exec_())
+import sys
+
+from PyQt5.QtWidgets import QApplication
+
+import SSniffer_gui
+import SSniffer_profiling
+
+if __name__ == '__main__':
+    # --profile profiles from the start; it can also be switched on and off in the options window
+    if '--profile' in sys.argv:
+        SSniffer_profiling.profiler.start()
+    app = QApplication(sys.argv)
+    sniff_window = SSniffer_gui.SniffWindow()
+    sniff_window.show()
+    exit_code = app.exec_()
+    SSniffer_profiling.profiler.stop()
+    sys.exit(exit_code)
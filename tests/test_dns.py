@@ -0,0 +1,114 @@
+import socket
+import threading
+import time
+
+import pytest
+
+dns_message = pytest.importorskip("dns.message")
+import dns.rcode
+import dns.rdata
+import dns.rdataclass
+import dns.rdatatype
+import dns.reversename
+
+import SSniffer_dns
+
+
+class StubDnsServer:
+    # Answers PTR queries on a local UDP port from records (ip -> (hostname, ttl)), NXDOMAIN for anything else
+    def __init__(self, records):
+        self.records = records
+        self.queries = {}  # ip -> how many times it was asked for
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, address = self.socket.recvfrom(4096)
+            except OSError:
+                return
+            query = dns_message.from_wire(data)
+            question = query.question[0]
+            ip = dns.reversename.to_address(question.name)
+            self.queries[ip] = self.queries.get(ip, 0) + 1
+            response = dns_message.make_response(query)
+            if ip in self.records:
+                hostname, ttl = self.records[ip]
+                rrset = response.find_rrset(response.answer, question.name, dns.rdataclass.IN, dns.rdatatype.PTR,
+                                            create=True)
+                rrset.add(dns.rdata.from_text(dns.rdataclass.IN, dns.rdatatype.PTR, hostname), ttl)
+            else:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            self.socket.sendto(response.to_wire(), address)
+
+    def close(self):
+        self.socket.close()
+
+
+@pytest.fixture
+def server():
+    server = StubDnsServer({'10.0.0.1': ("host-a.example.", 1), '10.0.0.2': ("host-b.example.", 100000),
+                            '10.0.0.3': ("host-c.example.", 300)})
+    yield server
+    server.close()
+
+
+def make_resolver(server, **options):
+    return SSniffer_dns.ReverseResolver(nameservers=["127.0.0.1"], port=server.port, timeout=1.0, **options)
+
+
+def test_answer_is_cached_for_its_ttl(server):
+    resolver = make_resolver(server, min_ttl=0)
+    assert resolver.resolve('10.0.0.1') == "host-a.example"
+    assert resolver.resolve('10.0.0.1') == "host-a.example"
+    assert server.queries['10.0.0.1'] == 1
+    assert resolver.stats()['hits'] == 1
+
+    time.sleep(1.2)  # The record's TTL is 1 second
+    assert resolver.resolve('10.0.0.1') == "host-a.example"
+    assert server.queries['10.0.0.1'] == 2
+
+
+def test_ttl_is_clamped(server):
+    resolver = make_resolver(server, max_ttl=50)
+    assert resolver.resolve('10.0.0.2') == "host-b.example"
+    assert resolver.cache['10.0.0.2'][1] - time.monotonic() <= 50
+
+    resolver = make_resolver(server, min_ttl=30)
+    assert resolver.resolve('10.0.0.1') == "host-a.example"
+    assert resolver.cache['10.0.0.1'][1] - time.monotonic() > 20
+
+
+def test_failure_is_cached_for_the_negative_ttl(server):
+    resolver = make_resolver(server, negative_ttl=0.5)
+    assert resolver.resolve('10.0.0.9') == SSniffer_dns.UNKNOWN
+    assert resolver.resolve('10.0.0.9') == SSniffer_dns.UNKNOWN
+    assert server.queries['10.0.0.9'] == 1
+    assert resolver.stats()['failures'] == 1
+
+    time.sleep(0.6)
+    assert resolver.resolve('10.0.0.9') == SSniffer_dns.UNKNOWN
+    assert server.queries['10.0.0.9'] == 2
+
+
+def test_least_recently_used_name_is_evicted(server):
+    resolver = make_resolver(server, cache_size=2)
+    resolver.resolve('10.0.0.1')
+    resolver.resolve('10.0.0.2')
+    assert resolver.lookup('10.0.0.1') == "host-a.example"  # Now the most recently used
+    resolver.resolve('10.0.0.3')
+    assert list(resolver.cache) == ['10.0.0.1', '10.0.0.3']
+    assert resolver.stats()['evictions'] == 1
+
+
+def test_lookup_never_blocks(server):
+    resolver = make_resolver(server)
+    answered = threading.Event()
+    resolver.add_listener(lambda ip, hostname: answered.set())
+    assert resolver.lookup('10.0.0.3') is None
+    assert answered.wait(2)
+    assert resolver.lookup('10.0.0.3') == "host-c.example"
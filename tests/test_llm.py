@@ -0,0 +1,119 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("ollama")
+
+import SSniffer_llm
+
+
+class StubModelServer:
+    # Answers ollama's /api/generate locally. While gate is clear every request waits for it to be set.
+    def __init__(self):
+        self.prompts = []
+        self.gate = threading.Event()
+        self.gate.set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.prompts.append(request['prompt'])
+                server.gate.wait(5)
+                body = json.dumps({'model': request['model'], 'created_at': "2024-01-01T00:00:00Z",
+                                   'response': f"answer to {request['prompt']}", 'done': True}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', "application/json")
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.host = f"http://127.0.0.1:{self.http.server_address[1]}"
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.gate.set()
+        self.http.shutdown()
+        self.http.server_close()
+
+
+@pytest.fixture
+def server():
+    server = StubModelServer()
+    yield server
+    server.close()
+
+
+def make_queue(server, tmp_path, **options):
+    return SSniffer_llm.AnalysisQueue(host=server.host, cache_file=str(tmp_path / "answers.sqlite3"), **options)
+
+
+def test_identical_prompts_share_one_request(server, tmp_path):
+    analysis_queue = make_queue(server, tmp_path)
+    server.gate.clear()
+    first = analysis_queue.submit("GET / HTTP/1.1")
+    second = analysis_queue.submit("GET / HTTP/1.1")
+    assert second is first
+    server.gate.set()
+    assert first.result(5) == "answer to GET / HTTP/1.1"
+    assert server.prompts == ["GET / HTTP/1.1"]
+    assert analysis_queue.stats()['requests'] == 1
+    assert analysis_queue.stats()['hits'] == 1
+
+
+def test_prompt_hash_includes_the_model(server, tmp_path):
+    llama = make_queue(server, tmp_path)
+    mistral = make_queue(server, tmp_path, model='mistral')
+    assert llama.digest("ping") != mistral.digest("ping")
+    assert llama.ask("ping") == mistral.ask("ping") == "answer to ping"
+    assert server.prompts == ["ping", "ping"]
+
+
+def test_answers_survive_a_restart(server, tmp_path):
+    assert make_queue(server, tmp_path).ask("beacon") == "answer to beacon"
+    restarted = make_queue(server, tmp_path)
+    assert restarted.ask("beacon") == "answer to beacon"
+    assert server.prompts == ["beacon"]
+    assert restarted.stats() == {'hits': 1, 'misses': 0, 'requests': 0, 'in_flight': 0}
+
+
+def test_ask_gives_up_after_the_timeout(server, tmp_path):
+    analysis_queue = make_queue(server, tmp_path)
+    server.gate.clear()
+    assert analysis_queue.ask("slow", timeout=0.3) == "the ai did not answer within 0.3 seconds"
+    server.gate.set()
+    # The request still finishes and is cached for the next ask
+    assert analysis_queue.submit("slow").result(5) == "answer to slow"
+    assert analysis_queue.ask("slow") == "answer to slow"
+    assert server.prompts == ["slow"]
+
+
+def test_cancel_pending_stops_the_waiters(server, tmp_path):
+    analysis_queue = make_queue(server, tmp_path, max_workers=1)
+    server.gate.clear()
+    running = analysis_queue.submit("running")
+    answers = []
+    waiter = threading.Thread(target=lambda: answers.append(analysis_queue.ask("queued")))
+    waiter.start()
+    while analysis_queue.stats()['in_flight'] < 2:
+        threading.Event().wait(0.01)
+    analysis_queue.cancel_pending()
+    waiter.join(5)
+    assert answers == ["analysis cancelled"]
+
+    # The request the model was already working on still lands in the cache, the queued one never ran
+    server.gate.set()
+    assert running.result(5) == "answer to running"
+    assert analysis_queue.ask("running") == "answer to running"
+    assert server.prompts == ["running"]
+
+
+def test_unreachable_model(tmp_path):
+    analysis_queue = SSniffer_llm.AnalysisQueue(host="http://127.0.0.1:9", cache_file=str(tmp_path / "a.sqlite3"))
+    assert analysis_queue.ask("hello", timeout=5).startswith("the ai could not be reached")
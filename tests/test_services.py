@@ -0,0 +1,120 @@
+import threading
+import time
+
+import SSniffer_services
+
+
+class FakeScanner:
+    # Stands in for nmap.PortScanner: records every scan and reports the ports in services as open
+    def __init__(self, scans, services, fail=False, hosts_up=True):
+        self.scans = scans
+        self.services = services
+        self.fail = fail
+        self.hosts_up = hosts_up
+        self.ip = None
+        self.port_spec = ""
+
+    def scan(self, ip, port_spec, arguments):
+        self.scans.append((ip, port_spec, arguments))
+        if self.fail:
+            raise RuntimeError("nmap is not installed")
+        self.ip = ip
+        self.port_spec = port_spec
+
+    def all_hosts(self):
+        return [self.ip] if self.hosts_up else []
+
+    def __getitem__(self, ip):
+        found = {}
+        for spec in self.port_spec.split(","):
+            proto = {'T': 'tcp', 'U': 'udp'}[spec[0]]
+            port = int(spec[2:])
+            if (port, proto) in self.services:
+                found.setdefault(proto, {})[port] = {'name': self.services[(port, proto)]}
+        return found
+
+
+def make_lookup(scans, services=None, **options):
+    services = {(80, 'tcp'): "http", (53, 'udp'): "domain", (443, 'tcp'): "https"} if services is None else services
+    fail = options.pop('fail', False)
+    hosts_up = options.pop('hosts_up', True)
+    options.setdefault('coalesce_delay', 0.1)
+    return SSniffer_services.ServiceLookup(scanner_factory=lambda: FakeScanner(scans, services, fail, hosts_up),
+                                           services={(80, 'tcp'): "www"}, **options)
+
+
+def test_lookup_guesses_until_the_scan_answers():
+    scans = []
+    lookup = make_lookup(scans)
+    assert lookup.lookup('10.0.0.1', 80) == ("www", False)
+    assert lookup.wait('10.0.0.1', 80, timeout=2) == "http"
+    assert lookup.lookup('10.0.0.1', 80) == ("http", True)
+    assert len(scans) == 1
+
+
+def test_requests_for_one_host_share_a_scan():
+    scans = []
+    lookup = make_lookup(scans)
+    answers = lookup.wait_all([('10.0.0.1', 80, 'tcp'), ('10.0.0.1', 443, 'tcp'), ('10.0.0.2', 80, 'tcp')], 2)
+    assert answers == [("http", True), ("https", True), ("http", True)]
+    assert sorted(scans) == [('10.0.0.1', "T:80,T:443", "-sS"), ('10.0.0.2', "T:80", "-sS")]
+    assert lookup.stats()['scans'] == 2
+
+
+def test_tcp_and_udp_ports_in_one_scan():
+    scans = []
+    lookup = make_lookup(scans)
+    answers = lookup.wait_all([('10.0.0.1', 53, 'udp'), ('10.0.0.1', 80, 'tcp'), ('10.0.0.1', 53, 'tcp')], 2)
+    assert scans == [('10.0.0.1', "T:53,T:80,U:53", "-sS -sU")]
+    assert answers[:2] == [("domain", True), ("http", True)]
+    assert answers[2] == ("Port 53 not found in scan results.", True)
+
+
+def test_answers_expire_after_the_ttl():
+    scans = []
+    lookup = make_lookup(scans, ttl=0.3)
+    assert lookup.wait('10.0.0.1', 80, timeout=2) == "http"
+    time.sleep(0.4)
+    assert lookup.lookup('10.0.0.1', 80) == ("www", False)
+    assert lookup.wait('10.0.0.1', 80, timeout=2) == "http"
+    assert len(scans) == 2
+
+
+def test_errors_expire_after_the_error_ttl():
+    scans = []
+    lookup = make_lookup(scans, fail=True, ttl=3600, error_ttl=0.3)
+    assert lookup.wait('10.0.0.1', 80, timeout=2) == "Error: nmap is not installed"
+    assert lookup.lookup('10.0.0.1', 80) == ("Error: nmap is not installed", True)
+    time.sleep(0.4)
+    assert lookup.lookup('10.0.0.1', 80)[1] is False
+    assert lookup.wait('10.0.0.1', 80, timeout=2) == "Error: nmap is not installed"
+    assert len(scans) == 2
+
+
+def test_host_down_uses_the_error_ttl():
+    scans = []
+    lookup = make_lookup(scans, hosts_up=False, error_ttl=0.3)
+    assert lookup.wait('10.0.0.1', 80, timeout=2) == "Host 10.0.0.1 not found in scan results."
+    time.sleep(0.4)
+    assert lookup.lookup('10.0.0.1', 80)[1] is False
+
+
+def test_cache_keeps_the_most_recently_used():
+    scans = []
+    lookup = make_lookup(scans, cache_size=2, coalesce_delay=0)
+    lookup.wait('10.0.0.1', 80, timeout=2)
+    lookup.wait('10.0.0.2', 80, timeout=2)
+    assert lookup.lookup('10.0.0.1', 80)[1]
+    lookup.wait('10.0.0.3', 80, timeout=2)
+    assert list(lookup.cache) == [('10.0.0.1', 80, 'tcp'), ('10.0.0.3', 80, 'tcp')]
+    assert lookup.stats()['evictions'] == 1
+
+
+def test_wait_gives_the_guess_when_the_scan_is_late():
+    scans = []
+    release = threading.Event()
+    lookup = make_lookup(scans)
+    lookup.scanner_factory = lambda: release.wait(2) and FakeScanner(scans, {(80, 'tcp'): "http"})
+    assert lookup.wait('10.0.0.1', 80, timeout=0.2) == "www"
+    release.set()
+    assert lookup.wait('10.0.0.1', 80, timeout=2) == "http"